@@ -0,0 +1,102 @@
+import os, sys, time, resource, subprocess, tempfile, argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from cue import cue_mesh_file as mesh_file
+
+# == mesh load benchmark ==
+
+# compares loading a large mesh from a `.npz` archive and from a raw `.cmesh` file
+#
+# each load runs in a fresh child process, so the reported peak rss is per-format and not polluted by the page cache of the
+# other run. without a gl context the upload is approximated by a single copy of every buffer into a preallocated staging
+# buffer (what glBufferData does with client memory), the copy is the same for both formats
+#
+# note: the touched pages of a memory-mapped `.cmesh` count into the rss too, but unlike the `.npz` arrays they're clean
+# page cache pages shared with the os, so they can be reclaimed without swapping once the upload is done
+#
+# usage: python benchmarks/mesh_load_bench.py [--verts N] [--runs N]
+
+def gen_mesh(vert_count: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(0)
+
+    pos = rng.random(vert_count * 3, dtype=np.float32)
+    norm = rng.random(vert_count * 3, dtype=np.float32)
+    uv = rng.random(vert_count * 2, dtype=np.float32)
+    elem = rng.integers(0, vert_count, vert_count * 3, dtype=np.uint32)
+
+    return (pos, norm, uv, elem)
+
+# peak rss in KiB, VmHWM is per address space (unlike ru_maxrss, which is inherited from the parent process on linux)
+def peak_rss() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for l in f:
+                if l.startswith("VmHWM:"):
+                    return int(l.split()[1])
+    except OSError:
+        pass
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def child_load(path: str) -> None:
+    t = time.perf_counter()
+
+    bufs = [b for b in mesh_file.read_mesh_file(path) if b is not None]
+    staging = np.empty(max(b.nbytes for b in bufs), dtype=np.uint8)
+
+    for b in bufs:
+        staging[:b.nbytes] = b.view(np.uint8)
+
+    dt = time.perf_counter() - t
+
+    print(f"{dt} {peak_rss()}")
+
+def run_child(path: str) -> tuple[float, int]:
+    out = subprocess.run([sys.executable, __file__, "--child", path], check=True, capture_output=True, text=True).stdout.split()
+    return (float(out[-2]), int(out[-1]))
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--verts", type=int, default=2_000_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", type=str, default=None)
+    parser.add_argument("--baseline", action="store_true")
+    args = parser.parse_args()
+
+    if args.baseline:
+        print(peak_rss())
+        return
+
+    if args.child is not None:
+        child_load(args.child)
+        return
+
+    pos, norm, uv, elem = gen_mesh(args.verts)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        npz_path = os.path.join(tmp_dir, "bench.npz")
+        cmesh_path = os.path.join(tmp_dir, "bench" + mesh_file.CMESH_EXT)
+
+        np.savez(npz_path, vert_data=pos, norm_data=norm, uv_data=uv, elem_data=elem)
+        mesh_file.write_cmesh(cmesh_path, pos, norm, uv, elem)
+
+        mesh_size = sum(b.nbytes for b in (pos, norm, uv, elem)) / (1024 * 1024)
+        print(f"mesh: {args.verts} vertices, {mesh_size:.1f} MiB of vertex and element data, {args.runs} runs\n")
+
+        # the empty interpreter baseline
+        base_rss = int(subprocess.run([sys.executable, __file__, "--baseline"], check=True, capture_output=True, text=True).stdout)
+
+        print(f"{'format':<8} {'load (best)':>12} {'load (avg)':>12} {'peak rss':>12} {'over baseline':>14}")
+
+        for name, path in (("npz", npz_path), ("cmesh", cmesh_path)):
+            results = [run_child(path) for _ in range(args.runs)]
+
+            times = [r[0] for r in results]
+            max_rss = max(r[1] for r in results)
+
+            print(f"{name:<8} {min(times) * 1000:10.2f}ms {sum(times) / len(times) * 1000:10.2f}ms {max_rss / 1024:9.1f}MiB {(max_rss - base_rss) / 1024:11.1f}MiB")
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ from ..rendering import cue_scene as sc
 from .. import cue_utils as utils
 
 from ..rendering.cue_batch import DrawInstance, UniformBindTypes, UniformBind
+from ..rendering.cue_resources import GPUMesh
 from ..cue_state import GameState
 from .cue_transform import Transform
 
@@ -12,22 +13,51 @@ from pygame.math import Vector3 as Vec3, Vector2 as Vec2
 # a generic model rendering component shared between entities
 
 class ModelRenderer:
-    def __init__(self, en_data: dict, en_trans: Transform | None, target_scene: 'sc.RenderScene | None' = None) -> None:
-        # load assets from preload or disk
-        
-        self.mesh = GameState.asset_manager.load_mesh(en_data["a_model_mesh"])
-        self.pipeline = GameState.asset_manager.load_shader(en_data["a_model_vshader"], en_data["a_model_fshader"])
+    def __init__(self, en_data: dict, en_trans: Transform | None, target_scene: 'sc.RenderScene | None' = None, mesh: GPUMesh | None = None, pvs_mask: int | None = None) -> None:
+        self.asset_refs = []
+
+        # load assets from preload or disk (or use a mesh provided by the caller)
+        # with `a_model_async` set, the mesh and texture are loaded in the background and the model shows placeholders until they're uploaded
+        #
+        # with `a_model_texture_array` set, the albedo is loaded as a layer of a shared texture array (see AssetManager.load_texture_layer),
+        # so models differing only by their albedo share a DrawState and get instanced together. the shader must then sample
+        # a `sampler2DArray` with the layer from the per-instance `uniform int cue_albedo_layer[]` (indexed by gl_InstanceID)
+        # or the `in int cue_albedo_layer` attribute (with instance buffers, see cue_batch.py)
+        # note: texture array layers are always loaded synchronously
+
+        # each asset is acquired right after it's load, so it's not evicted by the trims of the following loads
+
+        asset_mgr = GameState.asset_manager
+        load_async = en_data.get("a_model_async", False)
+
+        if mesh is None:
+            mesh = asset_mgr.load_mesh_async(en_data["a_model_mesh"]) if load_async else asset_mgr.load_mesh(en_data["a_model_mesh"])
+            self.asset_refs.append(asset_mgr.acquire(en_data["a_model_mesh"]))
+
+        self.mesh = mesh
+
+        self.pipeline = asset_mgr.load_shader(en_data["a_model_vshader"], en_data["a_model_fshader"])
+        self.asset_refs.append(asset_mgr.acquire(asset_mgr.shader_key(en_data["a_model_vshader"], en_data["a_model_fshader"])))
 
         self.model_textures = tuple()
+        self.albedo_layer = None
+
         if "a_model_albedo" in en_data:
-            self.model_textures = (GameState.asset_manager.load_texture(en_data["a_model_albedo"]),)
+            if en_data.get("a_model_texture_array", False):
+                self.albedo_layer = asset_mgr.load_texture_layer(en_data["a_model_albedo"])
+                self.model_textures = (self.albedo_layer.texture_array,)
+                self.asset_refs.append(asset_mgr.acquire(asset_mgr.texture_layer_key(en_data["a_model_albedo"])))
+            else:
+                self.model_textures = (asset_mgr.load_texture_async(en_data["a_model_albedo"]) if load_async else asset_mgr.load_texture(en_data["a_model_albedo"]),)
+                self.asset_refs.append(asset_mgr.acquire(en_data["a_model_albedo"]))
 
         self.shader_uniform_data = []
         if "a_model_uniforms" in en_data:
             for n, v in en_data["a_model_uniforms"].items():
                 loc = gl.glGetUniformLocation(self.pipeline.shader_program, n)
+                attrib = gl.glGetAttribLocation(self.pipeline.shader_program, n) # per-instance attribute (see cue_batch.py)
 
-                if loc == -1:
+                if loc == -1 and attrib == -1:
                     utils.warn(f"[ModelRenderer] failed to get uniform \"{n}\"")
 
                 if isinstance(v, float):
@@ -46,7 +76,16 @@ class ModelRenderer:
                     utils.error(f"[ModelRenderer] value \"{v}\" cannot be used for a gl uniform")
                     continue
 
-                self.shader_uniform_data.append(UniformBind(t, loc, v))
+                self.shader_uniform_data.append(UniformBind(t, loc, v, attrib))
+
+        if self.albedo_layer is not None:
+            loc = gl.glGetUniformLocation(self.pipeline.shader_program, "cue_albedo_layer")
+            attrib = gl.glGetAttribLocation(self.pipeline.shader_program, "cue_albedo_layer")
+
+            if loc == -1 and attrib == -1:
+                utils.warn(f"[ModelRenderer] shader has no \"cue_albedo_layer\" uniform, but the albedo is a texture array layer")
+            else:
+                self.shader_uniform_data.append(UniformBind(UniformBindTypes.SINT1, loc, np.int32(self.albedo_layer.layer), attrib))
 
         self.model_opaque = True
         if en_data.get("a_model_transparent", False):
@@ -57,6 +96,7 @@ class ModelRenderer:
 
         self.scene = target_scene
         self.draw_ins = DrawInstance(self.mesh, self.pipeline, self.model_textures, self.model_opaque, self.shader_uniform_data, en_trans)
+        self.draw_ins.pvs_mask = pvs_mask
 
         self.model_transform = en_trans
 
@@ -74,6 +114,11 @@ class ModelRenderer:
             self.scene.remove(self.draw_ins)
             self.is_visible = False
 
+        for entry in self.asset_refs:
+            GameState.asset_manager.release(entry)
+
+        self.asset_refs = []
+
     # start rendering this model if hidden
     def show(self) -> None:
         if not self.is_visible:
@@ -0,0 +1,167 @@
+import os, json, hashlib
+
+import numpy as np
+
+from . import cue_utils as utils
+
+# == Asset Content Hashes ==
+
+# content hashes of asset files, used by the AssetManager to resolve identical files stored under different paths to the
+# same gpu object. hashes of loose files are kept in a sidecar json index in the asset dir together with the file's mtime
+# and size, so a file is only re-hashed after it changes. hashes of packed files are computed once per mount (packs are immutable)
+
+ASSET_HASH_INDEX = ".asset_hashes.json"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def hash_buffer(data: 'bytes | np.ndarray') -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+class AssetHashIndex:
+    def __init__(self, index_path: str) -> None:
+        self.index_path = index_path
+        self.file_hashes = {}
+        self.packed_hashes = {}
+        self.is_dirty = False
+
+        try:
+            with open(index_path, 'r') as f:
+                self.file_hashes = {p: tuple(e) for p, e in json.load(f).items()}
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, TypeError) as e:
+            utils.warn(f"[asset_index] ignoring corrupted hash index {index_path}: {e}")
+
+    # returns the content hash of the loose file [full_path] (cached as [path]), or None if it can't be read
+    # with [compute] unset, only an up-to-date cached hash is returned (eg. where reading the whole file would stall)
+    def file_hash(self, path: str, full_path: str, compute: bool = True) -> str | None:
+        try:
+            st = os.stat(full_path)
+        except OSError:
+            return None
+
+        cached = self.file_hashes.get(path, None)
+        if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+
+        if not compute:
+            return None
+
+        h = hashlib.blake2b(digest_size=16)
+
+        try:
+            with open(full_path, 'rb') as f:
+                while chunk := f.read(HASH_CHUNK_SIZE):
+                    h.update(chunk)
+        except OSError:
+            return None
+
+        self.file_hashes[path] = (st.st_mtime_ns, st.st_size, h.hexdigest())
+        self.is_dirty = True
+
+        return h.hexdigest()
+
+    # caches and returns the content hash of the loose file [full_path] (cached as [path]) from it's already read [data]
+    def data_hash(self, path: str, full_path: str, data: 'bytes | np.ndarray') -> str | None:
+        try:
+            st = os.stat(full_path)
+        except OSError:
+            return None
+
+        h = hash_buffer(data)
+
+        self.file_hashes[path] = (st.st_mtime_ns, st.st_size, h)
+        self.is_dirty = True
+
+        return h
+
+    # returns the content hash of the packed file [path] with the data [data]
+    def packed_hash(self, path: str, data: np.ndarray, compute: bool = True) -> str | None:
+        h = self.packed_hashes.get(path, None)
+
+        if h is None and compute:
+            h = hash_buffer(data)
+            self.packed_hashes[path] = h
+
+        return h
+
+    def save(self) -> None:
+        if not self.is_dirty:
+            return
+
+        try:
+            tmp_path = self.index_path + ".tmp"
+
+            with open(tmp_path, 'w') as f:
+                json.dump(self.file_hashes, f)
+
+            os.replace(tmp_path, self.index_path)
+            self.is_dirty = False
+
+        except OSError as e:
+            utils.warn(f"[asset_index] failed to save hash index {self.index_path}: {e}")
+            self.is_dirty = False # don't retry on every map load
+
+    index_path: str
+
+    file_hashes: dict[str, tuple[int, int, str]] # dict[path, tuple[mtime_ns, size, hash]]
+    packed_hashes: dict[str, str] # dict[path, hash]
+    is_dirty: bool
+
+# == Asset Dependency Graph ==
+
+# records which maps and which of their entities use which cached assets, an edge is added whenever an asset is loaded
+# (or hit in the cache) while a map is loaded. the entity of an edge is the entity being spawned at that time, loads
+# after the map load (eg. sounds played by triggers) are recorded for the map only
+#
+# the graph is used by the map prefetcher (to prefetch everything a map needed last time, not just it's `a_` params),
+# by the cache eviction (assets needed by the current or the next map are evicted last) and by the `map_assets` report
+
+class AssetDepGraph:
+    def __init__(self) -> None:
+        self.map_assets = {}
+        self.entity_assets = {}
+
+        self.current_map = None
+        self.current_entity = None
+        self.pinned_maps = set()
+
+    # starts recording the assets of [map_path], forgetting what it used on it's last load
+    def begin_map(self, map_path: str) -> None:
+        self.current_map = map_path
+        self.current_entity = None
+
+        self.map_assets[map_path] = {}
+        self.entity_assets = {}
+
+    def record(self, key: str, asset_type: int, source_paths: tuple[str, ...]) -> None:
+        if self.current_map is None:
+            return
+
+        self.map_assets[self.current_map][key] = (asset_type, source_paths)
+
+        if self.current_entity is not None:
+            self.entity_assets.setdefault(self.current_entity, set()).add(key)
+
+    # marks the assets of [map_path] as needed soon (eg. the map is being prefetched), so they're evicted last
+    def pin_map(self, map_path: str) -> None:
+        self.pinned_maps.add(map_path)
+
+    def unpin_maps(self) -> None:
+        self.pinned_maps.clear()
+
+    def is_needed(self, key: str) -> bool:
+        if self.current_map is not None and key in self.map_assets[self.current_map]:
+            return True
+
+        return any(key in self.map_assets.get(m, ()) for m in self.pinned_maps)
+
+    # returns the entities of the current map which used [key]
+    def asset_entities(self, key: str) -> list[str]:
+        return [en for en, keys in self.entity_assets.items() if key in keys]
+
+    map_assets: dict[str, dict[str, tuple[int, tuple[str, ...]]]] # dict[map_path, dict[asset_key, tuple[asset_type, source_paths]]]
+    entity_assets: dict[str, set[str]] # dict[entity_name, set[asset_key]], current map only
+
+    current_map: str | None
+    current_entity: str | None
+    pinned_maps: set[str]
@@ -0,0 +1,173 @@
+import time
+from array import array
+from collections import deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from . import cue_utils as utils
+
+if TYPE_CHECKING:
+    from .cue_assets import AssetManager
+
+# == Cue Asset Stats ==
+
+# runtime instrumentation of the AssetManager: cache hits and misses per asset type, load and decode times per asset
+# and a timeline of the assets loaded during gameplay frames (outside of map loads), which are the loads causing frame stalls
+#
+# memory accounting comes from the asset cache itself (see AssetManager.memory_by_type), vram sizes are estimates
+# from the texture sizes / mip levels and the mesh buffer sizes
+#
+# reported with the `asset_stats` and `asset_top` dev commands and the "Asset Stats" editor panel
+
+@dataclass(slots=True)
+class AssetLoadStats:
+    type_name: str
+
+    load_count: int = 0
+    total_time: float = 0.
+    decode_time: float = 0.
+    max_time: float = 0.
+
+class AssetStats:
+    def __init__(self, timeline_len: int = 256) -> None:
+        self.start_time = time.perf_counter()
+
+        self.cache_hits = {}
+        self.cache_misses = {}
+
+        self.asset_loads = {}
+        self.gameplay_loads = deque(maxlen=timeline_len)
+
+    def reset(self) -> None:
+        self.start_time = time.perf_counter()
+
+        self.cache_hits.clear()
+        self.cache_misses.clear()
+
+        self.asset_loads.clear()
+        self.gameplay_loads.clear()
+
+    # == record api ==
+
+    def record_hit(self, type_name: str) -> None:
+        self.cache_hits[type_name] = self.cache_hits.get(type_name, 0) + 1
+
+    def record_miss(self, type_name: str) -> None:
+        self.cache_misses[type_name] = self.cache_misses.get(type_name, 0) + 1
+
+    # [decode_time] is the part of [load_time] spent reading and decoding the file (0 when it was prefetched),
+    # the rest is spent on uploads and creating the asset objects
+    def record_load(self, type_name: str, path: str, load_time: float, decode_time: float, during_map_load: bool) -> None:
+        stats = self.asset_loads.get(path, None)
+        if stats is None:
+            stats = AssetLoadStats(type_name)
+            self.asset_loads[path] = stats
+
+        stats.load_count += 1
+        stats.total_time += load_time
+        stats.decode_time += decode_time
+        stats.max_time = max(stats.max_time, load_time)
+
+        if not during_map_load:
+            self.gameplay_loads.append((time.perf_counter() - self.start_time, type_name, path, load_time))
+
+    # == report api ==
+
+    def hit_rate(self, type_name: str) -> float:
+        hits = self.cache_hits.get(type_name, 0)
+        total = hits + self.cache_misses.get(type_name, 0)
+
+        return hits / total if total else 0.
+
+    # returns the slowest loaded assets (by total load time) as list[tuple[path, stats]]
+    def top_loads(self, count: int) -> list[tuple[str, AssetLoadStats]]:
+        return sorted(self.asset_loads.items(), key=lambda a: a[1].total_time, reverse=True)[:count]
+
+    def report(self, asset_mgr: 'AssetManager') -> None:
+        mem = asset_mgr.memory_by_type()
+
+        utils.info(f"[asset_stats] {'type':<14} {'cached':>6} {'hits':>7} {'misses':>7} {'hit rate':>8} {'ram':>11} {'vram':>11} {'load time':>11}")
+
+        for type_name in sorted(set(mem.keys()) | set(self.cache_hits.keys()) | set(self.cache_misses.keys())):
+            count, ram, vram = mem.get(type_name, (0, 0, 0))
+            load_time = sum(s.total_time for s in self.asset_loads.values() if s.type_name == type_name)
+
+            utils.info(f"[asset_stats] {type_name:<14} {count:>6} {self.cache_hits.get(type_name, 0):>7} {self.cache_misses.get(type_name, 0):>7} {self.hit_rate(type_name) * 100:7.1f}% {ram / (1024 * 1024):7.2f} MiB {vram / (1024 * 1024):7.2f} MiB {load_time * 1000:9.2f}ms")
+
+        utils.info(f"[asset_stats] ram: {asset_mgr.ram_usage / (1024 * 1024):.2f} / {asset_mgr.ram_budget / (1024 * 1024):.0f} MiB, vram: {asset_mgr.vram_usage / (1024 * 1024):.2f} / {asset_mgr.vram_budget / (1024 * 1024):.0f} MiB, audio: {asset_mgr.audio_usage / (1024 * 1024):.2f} / {asset_mgr.audio_budget / (1024 * 1024):.0f} MiB")
+
+        stall_time = sum(l[3] for l in self.gameplay_loads)
+        utils.info(f"[asset_stats] {len(self.gameplay_loads)} loads during gameplay frames (total: {stall_time * 1000:.2f}ms)")
+
+        for t, type_name, path, dt in list(self.gameplay_loads)[-8:]:
+            utils.info(f"[asset_stats]   {t:9.2f}s {type_name:<8} {dt * 1000:8.2f}ms  {path}")
+
+    # an imgui window with the stats, returns if the window is still open
+    def show_panel(self, asset_mgr: 'AssetManager') -> bool:
+        import imgui # only needed by the panel, the stats themselves are also collected in headless runs
+
+        imgui.set_next_window_size(520, 420, condition=imgui.FIRST_USE_EVER)
+
+        expanded, opened = imgui.begin("Asset Stats", closable=True)
+        if not expanded:
+            imgui.end()
+            return opened
+
+        # memory
+
+        imgui.text(f"ram:  {asset_mgr.ram_usage / (1024 * 1024):8.2f} / {asset_mgr.ram_budget / (1024 * 1024):.0f} MiB")
+        imgui.progress_bar(min(asset_mgr.ram_usage / max(asset_mgr.ram_budget, 1), 1.), (-1, 0))
+
+        imgui.text(f"vram: {asset_mgr.vram_usage / (1024 * 1024):8.2f} / {asset_mgr.vram_budget / (1024 * 1024):.0f} MiB (estimated)")
+        imgui.progress_bar(min(asset_mgr.vram_usage / max(asset_mgr.vram_budget, 1), 1.), (-1, 0))
+
+        imgui.separator()
+
+        # per type
+
+        with imgui.begin_table("Asset Types", 6, imgui.TABLE_BORDERS):
+            imgui.table_next_row()
+
+            for col in ("type", "cached", "hit rate", "misses", "ram MiB", "vram MiB"):
+                imgui.table_next_column()
+                imgui.text(col)
+
+            for type_name, (count, ram, vram) in sorted(asset_mgr.memory_by_type().items()):
+                imgui.table_next_row()
+
+                for v in (type_name, str(count), f"{self.hit_rate(type_name) * 100:.1f}%", str(self.cache_misses.get(type_name, 0)), f"{ram / (1024 * 1024):.2f}", f"{vram / (1024 * 1024):.2f}"):
+                    imgui.table_next_column()
+                    imgui.text(v)
+
+        # slowest loads
+
+        if imgui.collapsing_header("Slowest loads", flags=imgui.TREE_NODE_DEFAULT_OPEN)[0]:
+            for path, s in self.top_loads(10):
+                imgui.text(f"{s.total_time * 1000:8.2f}ms (decode {s.decode_time * 1000:7.2f}ms) x{s.load_count} {path}")
+
+        # gameplay timeline
+
+        if imgui.collapsing_header("Loads during gameplay", flags=imgui.TREE_NODE_DEFAULT_OPEN)[0]:
+            if self.gameplay_loads:
+                imgui.plot_histogram("##gameplay_loads", array('f', [l[3] * 1000 for l in self.gameplay_loads]), graph_size=(-1, 60), overlay_text="load time (ms)")
+
+                for t, type_name, path, dt in reversed(self.gameplay_loads):
+                    imgui.text(f"{t:9.2f}s {type_name:<8} {dt * 1000:8.2f}ms  {path}")
+            else:
+                imgui.text_disabled("no assets loaded outside of map loads")
+
+        if imgui.button("Reset stats"):
+            self.reset()
+
+        imgui.end()
+        return opened
+
+    start_time: float
+
+    cache_hits: dict[str, int] # dict[type_name, hit_count]
+    cache_misses: dict[str, int] # dict[type_name, miss_count]
+
+    asset_loads: dict[str, AssetLoadStats] # dict[path, stats]
+    gameplay_loads: deque[tuple[float, str, str, float]] # deque[tuple[time, type_name, path, load_time]]
+
+asset_stats = AssetStats()
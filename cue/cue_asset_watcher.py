@@ -0,0 +1,145 @@
+import os
+
+from .cue_state import GameState
+from . import cue_utils as utils
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
+# == Cue Asset Watcher ==
+
+# watches the source files of all assets in the asset cache and hot reloads changed assets in-place (see AssetManager.reload_asset)
+#
+# by default the files are polled round-robin, only `files_per_tick` files are stat-ed each frame so the cost stays flat
+# with large asset caches, a change is then noticed within (watched files / files_per_tick) frames. if the optional
+# `inotify_simple` package is installed (linux only), inotify is used instead and no files are polled at all
+
+class AssetWatcher:
+    def __init__(self, files_per_tick: int = 8) -> None:
+        self.files_per_tick = files_per_tick
+        self.is_running = False
+        self.tick_scheduled = False
+
+        self.watch_list = []
+        self.watch_cursor = 0
+        self.file_mtimes = {}
+
+        self.inotify = None
+        self.inotify_dirs = {}
+        self.inotify_cache_size = -1
+
+    def start(self) -> None:
+        if self.is_running:
+            return
+
+        if INotify is not None and self.inotify is None:
+            try:
+                self.inotify = INotify()
+            except OSError as e:
+                utils.warn(f"[asset_watcher] failed to init inotify, falling back to polling: {e}")
+
+        self.is_running = True
+
+        if not self.tick_scheduled:
+            self.tick_scheduled = True
+            GameState.static_sequencer.next(self.tick)
+
+        utils.info(f"[asset_watcher] watching assets for changes ({'inotify' if self.inotify is not None else 'polling'})")
+
+    def stop(self) -> None:
+        self.is_running = False
+
+    def tick(self) -> None:
+        if not self.is_running:
+            self.tick_scheduled = False
+            return
+
+        if self.inotify is not None:
+            self._inotify_tick()
+        else:
+            self._poll_tick()
+
+        GameState.static_sequencer.next(self.tick)
+
+    # == polling ==
+
+    def _poll_tick(self) -> None:
+        asset_mgr = GameState.asset_manager
+
+        if self.watch_cursor >= len(self.watch_list):
+            # start a new round with the current cache contents
+
+            self.watch_list = list({f for e in asset_mgr.asset_cache.values() for f in e.source_paths})
+            self.watch_cursor = 0
+
+            watched = set(self.watch_list)
+            self.file_mtimes = {f: m for f, m in self.file_mtimes.items() if f in watched}
+
+        for f in self.watch_list[self.watch_cursor:self.watch_cursor + self.files_per_tick]:
+            try:
+                mtime = os.stat(os.path.join(asset_mgr.asset_dir, f)).st_mtime_ns
+            except OSError:
+                continue # deleted or mid-save, keep the last known mtime
+
+            last_mtime = self.file_mtimes.get(f, None)
+            self.file_mtimes[f] = mtime
+
+            if last_mtime is not None and last_mtime != mtime:
+                self._reload_file(f)
+
+        self.watch_cursor += self.files_per_tick
+
+    # == inotify ==
+
+    def _inotify_tick(self) -> None:
+        asset_mgr = GameState.asset_manager
+
+        # add watches for dirs of newly cached assets
+
+        if len(asset_mgr.asset_cache) != self.inotify_cache_size:
+            self.inotify_cache_size = len(asset_mgr.asset_cache)
+
+            for d in {os.path.dirname(f) for e in asset_mgr.asset_cache.values() for f in e.source_paths}:
+                if d in self.inotify_dirs.values():
+                    continue
+
+                try:
+                    wd = self.inotify.add_watch(os.path.join(asset_mgr.asset_dir, d), inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO)
+                    self.inotify_dirs[wd] = d
+                except OSError:
+                    pass
+
+        changed = set()
+
+        for ev in self.inotify.read(timeout=0):
+            d = self.inotify_dirs.get(ev.wd, None)
+            if d is not None and ev.name:
+                changed.add(os.path.join(d, ev.name) if d else ev.name)
+
+        for f in changed:
+            self._reload_file(f)
+
+    # reloads all cached assets loaded from the file [f]
+    def _reload_file(self, f: str) -> None:
+        asset_mgr = GameState.asset_manager
+        f = os.path.normpath(f)
+
+        for key in [k for k, e in asset_mgr.asset_cache.items() if any(os.path.normpath(s) == f for s in e.source_paths)]:
+            asset_mgr.reload_asset(key)
+
+    files_per_tick: int
+    is_running: bool
+    tick_scheduled: bool
+
+    # the current polling round
+    watch_list: list[str]
+    watch_cursor: int
+    file_mtimes: dict[str, int] # dict[source_path, mtime_ns]
+
+    inotify: 'INotify | None'
+    inotify_dirs: dict[int, str] # dict[watch_descriptor, asset_subdir]
+    inotify_cache_size: int
+
+asset_watcher = AssetWatcher()
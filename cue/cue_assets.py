@@ -1,49 +1,874 @@
-import os
+import os, io, time, threading, queue
 import pygame as pg
 import numpy as np
+import OpenGL.GL as gl
 from typing import Any
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from concurrent.futures import Future, ThreadPoolExecutor
 
-from .rendering.cue_resources import GPUMesh, GPUTexture, ShaderPipeline
+from .rendering.cue_resources import GPUMesh, GPUTexture, GPUTextureArray, TextureLayer, ShaderPipeline
+from .rendering import cue_resources as res
 from . import cue_utils as utils
+from . import cue_profiler as profiler
+from . import cue_mesh_file as mesh_file
+from . import cue_texture_file as tex_file
+from . import cue_pack as pack
+from .cue_asset_index import AssetHashIndex, AssetDepGraph, ASSET_HASH_INDEX
+from .cue_asset_stats import asset_stats
+from .cue_state import GameState
 
 # == Cue Asset Manager ==
 
+# the program binary cache dir (see ShaderPipeline), relative to the asset dir
+PROGRAM_CACHE_DIR = ".program_cache"
+
 class AssetTypes:
     AUDIO_ASSET = 0
     SURFACE_ASSET = 1
     TEXTURE_ASSET = 2
     MESH_ASSET = 3
     SHADER_ASSET = 4
+    AUDIO_STREAM_ASSET = 5
+    TEXTURE_LAYER_ASSET = 6
+
+# names of the asset types, used in stats and reports
+asset_type_names = {
+    AssetTypes.AUDIO_ASSET: "audio", AssetTypes.SURFACE_ASSET: "surface", AssetTypes.TEXTURE_ASSET: "texture",
+    AssetTypes.MESH_ASSET: "mesh", AssetTypes.SHADER_ASSET: "shader", AssetTypes.AUDIO_STREAM_ASSET: "audio_stream",
+    AssetTypes.TEXTURE_LAYER_ASSET: "texture_layer",
+}
+
+# maps file extensions to the asset type names used by `AssetManager.preload`
+asset_ext_types = {
+    ".wav": "audio", ".ogg": "audio", ".mp3": "audio", ".flac": "audio",
+    ".png": "texture", ".jpg": "texture", ".jpeg": "texture", ".bmp": "texture", ".tga": "texture",
+    ".npz": "mesh", ".cmesh": "mesh",
+    ".vert": "shader", ".frag": "shader", ".glsl": "shader",
+}
+
+def guess_asset_type(path: str) -> str | None:
+    return asset_ext_types.get(os.path.splitext(path)[1].lower(), None)
+
+# == asset size estimates ==
+
+def sound_size(snd: pg.mixer.Sound) -> int:
+    mixer_init = pg.mixer.get_init()
+    if mixer_init is None:
+        return 0
+
+    return int(snd.get_length() * mixer_init[0] * mixer_init[2] * abs(mixer_init[1]) // 8)
+
+def texture_size(tex: GPUTexture) -> int:
+    base_size = tex.texture_size[0] * tex.texture_size[1] * 4
+    return base_size * 4 // 3 if tex.texture_levels > 1 else base_size
+
+# size of decoded texture data (a surface or a cooked texture)
+def texture_data_size(data: 'pg.Surface | tex_file.CookedTexture') -> int:
+    if isinstance(data, tex_file.CookedTexture):
+        return sum(l.nbytes for l in data.levels)
+
+    return data.get_pitch() * data.get_height()
+
+# uploads decoded texture data into [tex]
+def write_texture_data(tex: GPUTexture, data: 'pg.Surface | tex_file.CookedTexture') -> None:
+    if isinstance(data, tex_file.CookedTexture):
+        tex.write_mips(data.levels)
+    else:
+        tex.write_to(data)
+
+# returns the size and the rgba8 mip levels of decoded texture data, as uploaded into texture array layers
+def texture_data_levels(data: 'pg.Surface | tex_file.CookedTexture') -> tuple[tuple[int, int], list]:
+    if isinstance(data, tex_file.CookedTexture):
+        return ((data.width, data.height), data.levels)
+
+    return (data.get_size(), [pg.image.tobytes(data, "RGBA", False)])
+
+def mesh_bufs_size(mesh_bufs: tuple) -> int:
+    return sum(b.nbytes for b in mesh_bufs if b is not None)
+
+# uploads decoded mesh buffers (pos, norm, uv, elem | None) into [mesh]
+def write_mesh_bufs(mesh: GPUMesh, mesh_bufs: tuple) -> None:
+    vertex_buf, norm_buf, uv_buf, elem_buf = mesh_bufs
+    mesh.write_to(vertex_buf, norm_buf, uv_buf, np.size(vertex_buf) // 3, elem_buf, len(elem_buf) if elem_buf is not None else 0)
+
+# == audio streams ==
+
+# a long audio track streamed from it's file by `pg.mixer.music` instead of being fully decoded into ram, returned by
+# AssetManager.load_audio for streamed assets. streams mirror the playback api of `pg.mixer.Sound`, so callers don't
+# need to care which mode an asset was loaded in
+#
+# note: pygame has a single music stream, so playing a stream stops whichever stream was playing before
+
+class AudioStream:
+    def __init__(self, path: str, stream_source: 'str | np.ndarray') -> None:
+        self.path = path
+        self.stream_source = stream_source
+        self.volume = 1.
+
+    def play(self, loops: int = 0, maxtime: int = 0, fade_ms: int = 0) -> None:
+        # the file is (re)opened on each play, packed streams are read from the pack mapping
+        # note: [maxtime] is only accepted for compatibility with `pg.mixer.Sound.play`, streams always play to the end
+        source = self.stream_source if isinstance(self.stream_source, str) else io.BytesIO(self.stream_source)
+
+        pg.mixer.music.load(source, self.path)
+        pg.mixer.music.set_volume(self.volume)
+        pg.mixer.music.play(loops, 0., fade_ms)
+
+        AudioStream.playing_stream = self
+
+    def stop(self) -> None:
+        if self.is_playing():
+            pg.mixer.music.stop()
+            AudioStream.playing_stream = None
+
+    def fadeout(self, ms: int) -> None:
+        if self.is_playing():
+            pg.mixer.music.fadeout(ms)
+
+    def set_volume(self, value: float) -> None:
+        self.volume = value
+
+        if self.is_playing():
+            pg.mixer.music.set_volume(value)
+
+    def get_volume(self) -> float:
+        return self.volume
+
+    def is_playing(self) -> bool:
+        return AudioStream.playing_stream is self and pg.mixer.music.get_busy()
+
+    path: str
+    stream_source: 'str | np.ndarray' # a full file path or a packed file
+    volume: float
+
+    playing_stream: 'AudioStream | None' = None # class var, the stream currently loaded into `pg.mixer.music`
+
+# a loaded asset in the asset cache, sizes are estimates used for the cache budgets
+@dataclass(slots=True)
+class AssetCacheEntry:
+    asset_type: int
+    asset: Any
+    path: str
+
+    # files the asset was loaded from (relative to the asset dir), the path itself for most assets
+    source_paths: tuple[str, ...] = ()
+
+    ram_size: int = 0
+    vram_size: int = 0
+
+    # number of acquire() calls without a matching release(), entries are only evictable when 0
+    ref_count: int = 0
+
+    # content deduplication (see AssetManager.content_hash), an alias entry shares the asset of the entry it's a duplicate of
+    content_hash: str | None = None
+    alias_of: 'AssetCacheEntry | None' = None
+    aliases: list[str] = field(default_factory=list)
+
+# an async asset load, decoded on a worker thread and finished (uploaded) on the main thread
+@dataclass(slots=True)
+class PendingLoad:
+    asset_type: int
+    path: str
+
+    # the placeholder which gets filled in-place (None for audio)
+    asset: Any
+
+    decoded: Any = None
+    decode_error: Exception | None = None
+    decode_time: float = 0.
+
+    # set by whichever thread runs the decode (a worker, or the main thread taking the load back, see _finish_pending)
+    decode_claimed: bool = False
+    decode_done: threading.Event = field(default_factory=threading.Event)
+
+    # resolved with the final asset once uploaded
+    future: Future = field(default_factory=Future)
 
 class AssetManager:
     def __init__(self, asset_dir: str) -> None:
         self.asset_dir = asset_dir
         self.asset_cache = {}
 
+        self.unused_assets = OrderedDict()
+        self.ram_usage = 0
+        self.vram_usage = 0
+        self.ram_budget = 512 * 1024 * 1024
+        self.vram_budget = 1024 * 1024 * 1024
+        self.eviction_paused = False
+
+        self.audio_usage = 0
+        self.audio_budget = 64 * 1024 * 1024
+        self.audio_stream_threshold = 1024 * 1024
+        self.audio_modes = {}
+
+        self.worker_pool = None
+        self.prefetch_lock = threading.Lock()
+        self.prefetch_staging = {}
+        self.prefetch_bytes = 0
+        self.prefetch_budget = 256 * 1024 * 1024
+        self.prefetch_gen = 0
+
+        self.pending_loads = {}
+        self.pending_lock = threading.Lock()
+        self.upload_queue = queue.Queue() # unbounded, workers must never block on the main thread (uploads are limited by upload_budget)
+        self.upload_budget = .002
+        self.upload_tick_scheduled = False
+
+        self.placeholder_surf = None
+        self.texture_arrays = {}
+
+        self.packs = []
+        self.allow_loose_overrides = True
+
+        self.hash_index = AssetHashIndex(os.path.join(asset_dir, ASSET_HASH_INDEX))
+        self.content_keys = {}
+        self.dep_graph = AssetDepGraph()
+
+        # mount the asset pack of the asset dir if it has been packed (see cue_pack)
+        default_pack = asset_dir.rstrip("/\\") + pack.PACK_EXT
+        if os.path.isfile(default_pack):
+            self.mount_pack(default_pack)
+
+        # cache linked shader programs in the asset dir, unless the app configured another location
+        if res.program_cache_dir is None:
+            res.program_cache_dir = os.path.join(asset_dir, PROGRAM_CACHE_DIR)
+
     def reset(self) -> None:
         utils.info(f"[asset_mgr] flushed {len(self.asset_cache)} loaded assets from cache")
         self.asset_cache = {}
 
-    def preload(self, path: str, type_hint: str | None = None) -> None:
-        pass
+        self.unused_assets.clear()
+        self.ram_usage = 0
+        self.vram_usage = 0
+        self.audio_usage = 0
+
+        self.content_keys = {}
+        self.hash_index.save()
+
+        # arrays with layers still in use are kept alive by their TextureLayers
+        self.texture_arrays = {}
+
+        self.drop_prefetched()
+
+    # == asset packs ==
+
+    # mounted packs serve all asset loads, loose files in the asset dir override packed ones (when `allow_loose_overrides`
+    # is set) so edited assets can be tested without repacking, shipping builds can disable it to skip the per-asset stat()
+    #
+    # note: packs mounted later take priority over earlier ones, so patch packs can be mounted on top of the base pack
+
+    def mount_pack(self, pack_path: str) -> bool:
+        try:
+            p = pack.AssetPack(pack_path)
+        except (OSError, ValueError) as e:
+            utils.error(f"[asset_mgr] failed to mount asset pack {pack_path}: {e}")
+            return False
+
+        self.packs.insert(0, p)
+        self.hash_index.packed_hashes.clear()
+
+        utils.info(f"[asset_mgr] mounted asset pack {pack_path} ({len(p.paths)} files)")
+        return True
+
+    def unmount_packs(self) -> None:
+        self.packs.clear()
+        self.hash_index.packed_hashes.clear()
+
+    # lists all asset paths under [prefix] from the mounted pack indexes, without touching the filesystem
+    def list_packed(self, prefix: str = "") -> list[str]:
+        return sorted({f for p in self.packs for f in p.list_paths(prefix)})
+
+    # returns a zero-copy view of the packed data of [path], or None if it should be loaded from the loose file
+    def _packed_data(self, path: str) -> np.ndarray | None:
+        if not self.packs:
+            return None
+
+        if self.allow_loose_overrides and os.path.exists(os.path.join(self.asset_dir, path)):
+            return None
+
+        pack_path = os.path.normpath(path).replace(os.sep, "/")
+
+        for p in self.packs:
+            data = p.read(pack_path)
+            if data is not None:
+                return data
+
+        return None
+
+    # == asset lifetimes ==
+
+    # cached assets are reference counted by their users with acquire() / release() (eg. ModelRenderer does so on spawn / despawn),
+    # assets nobody holds a reference to stay cached in a lru and are only evicted when the cache is over one of it's budgets
+    # (`ram_budget` for cpu side data, `vram_budget` for estimated gpu memory), so map transitions can reuse assets shared between maps
+    #
+    # note: an evicted asset is only dropped from the cache, objects still referenced elsewhere stay valid until deleted
+
+    # takes a reference to a cached asset (by it's cache key), the returned entry is to be passed back to release()
+    def acquire(self, key: str) -> AssetCacheEntry:
+        entry = self.asset_cache.get(key, None)
+        if entry is None:
+            raise KeyError(f"asset \"{key}\" is not loaded, load it before acquiring")
+
+        # refs to a duplicate are held by the entry it's an alias of
+        if entry.alias_of is not None:
+            entry = entry.alias_of
+
+        entry.ref_count += 1
+        self.unused_assets.pop(entry.path, None)
+        self.dep_graph.record(key, entry.asset_type, entry.source_paths)
+
+        return entry
+
+    def release(self, entry: AssetCacheEntry) -> None:
+        if entry.ref_count <= 0:
+            utils.warn(f"[asset_mgr] unbalanced release of {entry.path}")
+            return
+
+        entry.ref_count -= 1
+
+        # the entry might be flushed or evicted (and reloaded) since, just drop the ref then
+        if entry.ref_count == 0 and self.asset_cache.get(entry.path, None) is entry:
+            self.unused_assets[entry.path] = None
+            self.trim()
+
+    # evicts least recently used unreferenced assets until back under budget, assets needed by the current map
+    # or a pinned (eg. prefetched) map are only evicted after all others (see AssetDepGraph)
+    #
+    # decoded sounds have their own `audio_budget` (on top of counting into `ram_budget`), so short sounds played once
+    # don't pile up in ram until the whole cache is over budget
+    def trim(self) -> None:
+        if self.eviction_paused:
+            return
+
+        evicted_count = 0
+
+        while self.unused_assets:
+            if self.ram_usage > self.ram_budget or self.vram_usage > self.vram_budget:
+                victim_type = None
+            elif self.audio_usage > self.audio_budget:
+                victim_type = AssetTypes.AUDIO_ASSET
+            else:
+                break
+
+            # aliases are skipped, they don't hold any memory and are dropped together with their original
+            def is_victim(k: str) -> bool:
+                e = self.asset_cache[k]
+                return e.alias_of is None and (victim_type is None or e.asset_type == victim_type)
+
+            key = next((k for k in self.unused_assets if is_victim(k) and not self.dep_graph.is_needed(k)), None)
+            if key is None:
+                key = next((k for k in self.unused_assets if is_victim(k)), None)
+
+            if key is None:
+                break
+
+            self._drop_entry(key)
+            evicted_count += 1
+
+        if evicted_count:
+            utils.info(f"[asset_mgr] evicted {evicted_count} unused assets (ram: {self.ram_usage / (1024 * 1024):.2f} MiB, vram: {self.vram_usage / (1024 * 1024):.2f} MiB)")
+
+    # pauses eviction (eg. while a map is reloading, between despawning the old and spawning the new entities)
+    def pause_eviction(self) -> None:
+        self.eviction_paused = True
+
+    def resume_eviction(self) -> None:
+        self.eviction_paused = False
+        self.trim()
+
+    def _cache_insert(self, key: str, asset_type: int, asset: Any, ram_size: int = 0, vram_size: int = 0, source_paths: tuple[str, ...] | None = None) -> AssetCacheEntry:
+        if key in self.asset_cache:
+            self._drop_entry(key)
+
+        entry = AssetCacheEntry(asset_type, asset, key, source_paths if source_paths is not None else (key,), ram_size, vram_size)
+
+        self.asset_cache[key] = entry
+        self.dep_graph.record(key, asset_type, entry.source_paths)
+
+        self.ram_usage += ram_size
+        self.vram_usage += vram_size
+
+        if asset_type == AssetTypes.AUDIO_ASSET:
+            self.audio_usage += ram_size
+
+        # trim before the new entry is evictable, so it's never evicted right away
+        self.trim()
+        self.unused_assets[key] = None
+
+        return entry
+
+    # removes [key] from the cache, together with all aliases of it
+    def _drop_entry(self, key: str) -> AssetCacheEntry:
+        entry = self.asset_cache.pop(key)
+        self.unused_assets.pop(key, None)
+
+        self.ram_usage -= entry.ram_size
+        self.vram_usage -= entry.vram_size
+
+        if entry.asset_type == AssetTypes.AUDIO_ASSET:
+            self.audio_usage -= entry.ram_size
+
+        if entry.alias_of is not None and key in entry.alias_of.aliases:
+            entry.alias_of.aliases.remove(key)
+
+        for alias_key in entry.aliases:
+            alias = self.asset_cache.get(alias_key, None)
+            if alias is not None and alias.alias_of is entry:
+                del self.asset_cache[alias_key]
+                self.unused_assets.pop(alias_key, None)
+
+        entry.aliases.clear()
+
+        if entry.content_hash is not None and self.content_keys.get((entry.asset_type, entry.content_hash), None) == key:
+            del self.content_keys[(entry.asset_type, entry.content_hash)]
+
+        return entry
+
+    def _resize_entry(self, entry: AssetCacheEntry, ram_size: int, vram_size: int) -> None:
+        if self.asset_cache.get(entry.path, None) is entry:
+            self.ram_usage += ram_size - entry.ram_size
+            self.vram_usage += vram_size - entry.vram_size
+
+            if entry.asset_type == AssetTypes.AUDIO_ASSET:
+                self.audio_usage += ram_size - entry.ram_size
+
+        entry.ram_size = ram_size
+        entry.vram_size = vram_size
+
+    # == content deduplication ==
+
+    # textures and meshes are also keyed by a hash of their file content, so identical files stored under different paths
+    # resolve to the same gpu object. the duplicate path is cached as an alias entry, which shares the asset (and it's
+    # ref count) with the entry loaded first and is dropped together with it. hashes of loose files are cached in a
+    # sidecar index in the asset dir (see AssetHashIndex), saved on each map load
+
+    # returns the content hash of [path], or None if it's not readable (or not known yet and [compute] is not set)
+    def content_hash(self, path: str, compute: bool = True) -> str | None:
+        data = self._packed_data(path)
+        if data is not None:
+            return self.hash_index.packed_hash(path, data, compute)
+
+        return self.hash_index.file_hash(path, os.path.join(self.asset_dir, path), compute)
+
+    # returns the (content hash, data) of [path] for a sync load, a loose file without an up-to-date cached hash is read
+    # once here and hashed from memory, it's data is then passed on to the decoder so the file isn't read twice
+    def _source_hash(self, path: str) -> tuple[str | None, np.ndarray | None]:
+        data = self._packed_data(path)
+        if data is not None:
+            return (self.hash_index.packed_hash(path, data), data)
+
+        full_path = os.path.join(self.asset_dir, path)
+
+        h = self.hash_index.file_hash(path, full_path, compute=False)
+        if h is not None:
+            return (h, None)
+
+        try:
+            with open(full_path, 'rb') as f:
+                data = np.frombuffer(f.read(), dtype=np.uint8)
+        except OSError:
+            return (None, None) # left for the decoder to report
+
+        return (self.hash_index.data_hash(path, full_path, data), data)
+
+    # looks up a cached asset with the content hash [h] and caches [path] as it's alias if found, returns the asset or None
+    def _resolve_duplicate(self, path: str, asset_type: int, h: str | None) -> Any:
+        if h is None:
+            return None
+
+        dup_key = self.content_keys.get((asset_type, h), None)
+        dup = self.asset_cache.get(dup_key, None) if dup_key is not None else None
+
+        if dup is None or dup_key in self.pending_loads:
+            return None
+
+        alias = self._cache_insert(path, asset_type, dup.asset, source_paths=(path,))
+        alias.alias_of = dup
+        dup.aliases.append(path)
+
+        utils.info(f"[asset_mgr] {path} is a duplicate of {dup_key}, sharing it's gpu object")
+        return dup.asset
+
+    def _set_content_hash(self, entry: AssetCacheEntry, h: str | None) -> None:
+        entry.content_hash = h
+
+        if h is not None:
+            self.content_keys[(entry.asset_type, h)] = entry.path
+
+    # == asset prefetching ==
+
+    # assets can be decoded ahead of time on worker threads into a staging area (eg. while the previous map is still running),
+    # the next load_* call for a staged asset then only does the gl upload. staging is limited to `prefetch_budget` bytes
+    # and everything left in it is dropped with drop_prefetched() (called by the map loader after each map load)
+
+    def get_worker_pool(self) -> ThreadPoolExecutor:
+        if self.worker_pool is None:
+            self.worker_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cue_asset")
+
+        return self.worker_pool
+
+    # queues a decode of [path] on a worker thread, [type_hint] is one of "audio", "texture", "mesh" or "shader" (a single shader stage source)
+    # when not set, the type is guessed from the file extension
+    def preload(self, path: str, type_hint: str | None = None) -> Future:
+        return self.get_worker_pool().submit(self.prefetch_asset, path, type_hint, self.prefetch_gen)
+
+    # decodes [path] into the staging area on the calling thread, returns False if the asset was skipped
+    # (already loaded or staged, over budget, unknown type or the staging area was dropped since [gen])
+    def prefetch_asset(self, path: str, type_hint: str | None = None, gen: int | None = None) -> bool:
+        if gen is None:
+            gen = self.prefetch_gen
+
+        if type_hint is None:
+            type_hint = guess_asset_type(path)
+
+        with self.prefetch_lock:
+            if gen != self.prefetch_gen or path in self.asset_cache or path in self.prefetch_staging or self.prefetch_bytes >= self.prefetch_budget:
+                return False
+
+        try:
+            if type_hint == "texture":
+                staged_type = AssetTypes.TEXTURE_ASSET
+                data = self._decode_texture(path)
+                data_size = texture_data_size(data)
+
+            elif type_hint == "mesh":
+                staged_type = AssetTypes.MESH_ASSET
+                data = self._decode_mesh(path)
+                data_size = mesh_bufs_size(data)
+
+            elif type_hint == "shader":
+                staged_type = AssetTypes.SHADER_ASSET
+                data = self._decode_text(path)
+                data_size = len(data)
+
+            elif type_hint == "audio":
+                if pg.mixer.get_init() is None or self.audio_mode(path) == "stream":
+                    return False # streams are not decoded ahead
+
+                staged_type = AssetTypes.AUDIO_ASSET
+                data = self._decode_audio(path)
+                data_size = sound_size(data)
+
+            else:
+                return False
+
+        except (OSError, ValueError, KeyError, pg.error) as e:
+            utils.warn(f"[asset_mgr] failed to prefetch {path}: {e}")
+            return False
+
+        with self.prefetch_lock:
+            if gen != self.prefetch_gen or self.prefetch_bytes + data_size > self.prefetch_budget:
+                return False # dropped while decoding or over budget
+
+            self.prefetch_staging[path] = (staged_type, data, data_size)
+            self.prefetch_bytes += data_size
+
+        return True
+
+    # drops all staged assets, in-flight decodes started before this call will be discarded when they finish
+    def drop_prefetched(self) -> None:
+        with self.prefetch_lock:
+            self.prefetch_gen += 1
+
+            if self.prefetch_staging:
+                utils.info(f"[asset_mgr] dropped {len(self.prefetch_staging)} unused prefetched assets ({self.prefetch_bytes / (1024 * 1024):.2f} MiB)")
+
+            self.prefetch_staging = {}
+            self.prefetch_bytes = 0
+
+    def _take_prefetched(self, path: str, staged_type: int) -> Any:
+        with self.prefetch_lock:
+            staged = self.prefetch_staging.pop(path, None)
+            if staged is None:
+                return None
+
+            self.prefetch_bytes -= staged[2]
+
+        if staged[0] != staged_type:
+            return None
+
+        return staged[1]
+
+    # == async asset loading ==
+
+    # the load_*_async funcs only queue a decode on the worker threads and return right away, the gl uploads are done on
+    # the main thread from a bounded upload queue, which is drained under a per-frame time budget (`upload_budget` secs)
+    #
+    # textures and meshes return a placeholder which is filled in-place once uploaded (a 1x1 grey texture / a mesh with no vertices),
+    # so they can be used in DrawInstances right away. a sync load_* call on a pending asset finishes the load immediately
+
+    def load_texture_async(self, path: str) -> GPUTexture:
+        c = self.check_cache(path, AssetTypes.TEXTURE_ASSET)
+        if c is not None:
+            return c
+
+        # only dedup with an already known hash, hashing the file here would stall like a sync load
+        h = self.content_hash(path, compute=False)
+
+        c = self._resolve_duplicate(path, AssetTypes.TEXTURE_ASSET, h)
+        if c is not None:
+            return c
+
+        if self.placeholder_surf is None:
+            self.placeholder_surf = pg.Surface((1, 1), pg.SRCALPHA)
+            self.placeholder_surf.fill((128, 128, 128, 255))
+
+        tex = GPUTexture()
+        tex.write_to(self.placeholder_surf)
+
+        entry = self._cache_insert(path, AssetTypes.TEXTURE_ASSET, tex, vram_size=texture_size(tex))
+        self._set_content_hash(entry, h)
+        self._queue_async_load(PendingLoad(AssetTypes.TEXTURE_ASSET, path, tex))
+
+        return tex
+
+    def load_mesh_async(self, path: str) -> GPUMesh:
+        c = self.check_cache(path, AssetTypes.MESH_ASSET)
+        if c is not None:
+            return c
+
+        h = self.content_hash(path, compute=False)
+
+        c = self._resolve_duplicate(path, AssetTypes.MESH_ASSET, h)
+        if c is not None:
+            return c
+
+        mesh = GPUMesh(interleaved=True)
+
+        entry = self._cache_insert(path, AssetTypes.MESH_ASSET, mesh)
+        self._set_content_hash(entry, h)
+        self._queue_async_load(PendingLoad(AssetTypes.MESH_ASSET, path, mesh))
+
+        return mesh
+
+    # audio has nothing to upload, a future resolved with the loaded sound (on the main thread) is returned instead
+    def load_audio_async(self, path: str) -> Future:
+        pending = self.pending_loads.get(path, None)
+        if pending is not None:
+            return pending.future
+
+        if self.audio_mode(path) == "stream":
+            f = Future()
+            f.set_result(self.load_audio(path, "stream")) # nothing to decode
+
+            return f
+
+        c = self.check_cache(path, AssetTypes.AUDIO_ASSET)
+        if c is not None:
+            f = Future()
+            f.set_result(c)
+
+            return f
+
+        pending = PendingLoad(AssetTypes.AUDIO_ASSET, path, None)
+        self._queue_async_load(pending)
+
+        return pending.future
+
+    # uploads queued async loads until the time budget is used up, called each frame from the static sequencer while loads are pending
+    def process_uploads(self, budget: float | None = None) -> None:
+        if budget is None:
+            budget = self.upload_budget
+
+        t = time.perf_counter()
+
+        while time.perf_counter() - t < budget:
+            try:
+                pending = self.upload_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if not pending.future.done(): # might have been finished by a sync load already
+                self._finish_pending(pending)
+
+    def _queue_async_load(self, pending: PendingLoad) -> None:
+        self.pending_loads[pending.path] = pending
+        self.get_worker_pool().submit(self._async_decode_job, pending)
+
+        if not self.upload_tick_scheduled:
+            self.upload_tick_scheduled = True
+            GameState.static_sequencer.next(self._upload_tick)
+
+    def _upload_tick(self) -> None:
+        self.process_uploads()
+
+        if self.pending_loads:
+            GameState.static_sequencer.next(self._upload_tick)
+        else:
+            self.upload_tick_scheduled = False
+
+    def _async_decode_job(self, pending: PendingLoad) -> None:
+        if not self._claim_decode(pending):
+            return # taken back and decoded by the main thread
+
+        self._decode_pending(pending)
+        self.upload_queue.put(pending)
+
+    # returns True if the caller should decode [pending], False if another thread already does
+    def _claim_decode(self, pending: PendingLoad) -> bool:
+        with self.pending_lock:
+            if pending.decode_claimed:
+                return False
+
+            pending.decode_claimed = True
+            return True
+
+    def _decode_pending(self, pending: PendingLoad) -> None:
+        t = time.perf_counter()
+
+        try:
+            pending.decoded = self._take_prefetched(pending.path, pending.asset_type)
+
+            if pending.decoded is None:
+                if pending.asset_type == AssetTypes.TEXTURE_ASSET:
+                    pending.decoded = self._decode_texture(pending.path)
+                elif pending.asset_type == AssetTypes.MESH_ASSET:
+                    pending.decoded = self._decode_mesh(pending.path)
+                else:
+                    pending.decoded = self._decode_audio(pending.path)
+
+        except Exception as e:
+            pending.decode_error = e
+
+        pending.decode_time = time.perf_counter() - t
+        pending.decode_done.set()
+
+    # does the main thread part of an async load, a load whose decode hasn't started yet is taken back and decoded inline
+    # (waiting on it could deadlock, eg. while the workers are busy with jobs which wait on the main thread)
+    def _finish_pending(self, pending: PendingLoad) -> None:
+        if self._claim_decode(pending):
+            self._decode_pending(pending)
+        else:
+            pending.decode_done.wait()
+
+        if self.pending_loads.get(pending.path, None) is pending:
+            del self.pending_loads[pending.path]
+
+        if pending.decode_error is not None:
+            utils.error(f"[asset_mgr] async load of {pending.path} failed: {pending.decode_error}")
+
+            # drop the placeholder from cache, so a later load retries (the placeholder stays valid for it's current users)
+            entry = self.asset_cache.get(pending.path, None)
+            if entry is not None and entry.asset is pending.asset and pending.asset is not None:
+                self._drop_entry(pending.path)
+
+            pending.future.set_exception(pending.decode_error)
+            return
+
+        t = time.perf_counter()
+        entry = self.asset_cache.get(pending.path, None)
+
+        if pending.asset_type == AssetTypes.TEXTURE_ASSET:
+            write_texture_data(pending.asset, pending.decoded)
+
+            if entry is not None:
+                self._resize_entry(entry, 0, texture_size(pending.asset))
+
+        elif pending.asset_type == AssetTypes.MESH_ASSET:
+            write_mesh_bufs(pending.asset, pending.decoded)
+
+            if entry is not None:
+                self._resize_entry(entry, 0, mesh_bufs_size(pending.decoded))
+
+        else:
+            pending.asset = pending.decoded
+            self._cache_insert(pending.path, AssetTypes.AUDIO_ASSET, pending.asset, ram_size=sound_size(pending.asset))
+
+        pending.decoded = None
+        pending.future.set_result(pending.asset)
+
+        self._record_load(asset_type_names[pending.asset_type], pending.path, pending.decode_time + time.perf_counter() - t, pending.decode_time)
+
+    def _finish_if_pending(self, path: str) -> None:
+        pending = self.pending_loads.get(path, None)
+        if pending is not None:
+            self._finish_pending(pending)
+
+    # == audio modes ==
+
+    # audio assets are either decoded fully into a `pg.mixer.Sound` ("sound") or streamed from their file ("stream", see AudioStream),
+    # the mode can be set per asset with set_audio_mode() (before it's first loaded), otherwise files over `audio_stream_threshold` bytes are streamed
+
+    def set_audio_mode(self, path: str, mode: str | None) -> None:
+        if mode not in ("sound", "stream", None):
+            raise ValueError(f"unknown audio mode \"{mode}\", expected \"sound\", \"stream\" or None")
+
+        if mode is None:
+            self.audio_modes.pop(path, None)
+        else:
+            self.audio_modes[path] = mode
+
+    def audio_mode(self, path: str) -> str:
+        mode = self.audio_modes.get(path, None)
+        if mode is not None:
+            return mode
+
+        return "stream" if self._file_size(path) > self.audio_stream_threshold else "sound"
+
+    def _file_size(self, path: str) -> int:
+        data = self._packed_data(path)
+        if data is not None:
+            return len(data)
+
+        try:
+            return os.path.getsize(os.path.join(self.asset_dir, path))
+        except OSError:
+            return 0
 
     # == asset access ==
 
     def check_cache(self, path: str, ex_type: int) -> Any:
         cache = self.asset_cache.get(path, None)
-        if cache is not None: # and cache[1] != None:
-            if cache[0] != ex_type:
-                raise ValueError(f"The assets has been loaded before as a different type! (expected: {ex_type} got: {cache[0]})")
+        if cache is not None: # and cache.asset != None:
+            if cache.asset_type != ex_type:
+                raise ValueError(f"The assets has been loaded before as a different type! (expected: {ex_type} got: {cache.asset_type})")
+
+            if path in self.unused_assets:
+                self.unused_assets.move_to_end(path)
 
-            return cache[1]
+            if cache.alias_of is not None and cache.alias_of.path in self.unused_assets:
+                self.unused_assets.move_to_end(cache.alias_of.path)
+
+            self.dep_graph.record(path, cache.asset_type, cache.source_paths)
+            asset_stats.record_hit(asset_type_names[ex_type])
+
+            return cache.asset
+
+        asset_stats.record_miss(asset_type_names[ex_type])
+
+    # loads a sound, or an AudioStream for streamed audio, [mode] overrides the asset's audio mode (see audio_mode())
+    def load_audio(self, path: str, mode: str | None = None) -> 'pg.mixer.Sound | AudioStream':
+        if mode is None:
+            mode = self.audio_mode(path)
+
+        if mode == "stream":
+            c = self.check_cache(path, AssetTypes.AUDIO_STREAM_ASSET)
+            if c is not None:
+                return c
+
+            data = self._packed_data(path)
+            stream = AudioStream(path, data if data is not None else os.path.join(self.asset_dir, path))
+
+            self._cache_insert(path, AssetTypes.AUDIO_STREAM_ASSET, stream)
+            return stream
+
+        self._finish_if_pending(path)
 
-    def load_audio(self, path: str) -> pg.mixer.Sound:
         c = self.check_cache(path, AssetTypes.AUDIO_ASSET)
         if c is not None:
             return c
 
-        snd = pg.mixer.Sound(file=os.path.join(self.asset_dir, path))
-        self.asset_cache[path] = (AssetTypes.AUDIO_ASSET, snd)
+        t = time.perf_counter()
+
+        snd = self._take_prefetched(path, AssetTypes.AUDIO_ASSET)
+        if snd is None:
+            snd = self._decode_audio(path)
+
+        td = time.perf_counter()
+        self._cache_insert(path, AssetTypes.AUDIO_ASSET, snd, ram_size=sound_size(snd))
+
+        self._record_load("audio", path, time.perf_counter() - t, td - t)
 
         return snd
 
@@ -53,69 +878,398 @@ class AssetManager:
         if c is not None:
             return c
 
-        surf = pg.image.load(os.path.join(self.asset_dir, path), path)
+        t = time.perf_counter()
+
+        surf = self._take_prefetched(path, AssetTypes.SURFACE_ASSET)
+        if surf is None:
+            surf = self._decode_surface(path)
+
+        td = time.perf_counter()
 
         if cache_surf:
-            self.asset_cache[path] = (AssetTypes.SURFACE_ASSET, surf)
+            self._cache_insert(path, AssetTypes.SURFACE_ASSET, surf, ram_size=surf.get_pitch() * surf.get_height())
+
+        self._record_load("surface", path, time.perf_counter() - t, td - t)
 
         return surf
 
     # loads a image file to gpu vram; short-hand for load_surface with a texture.write_to()
+    # note: a cooked texture (see cue_texture_file.py) is used instead if present, it's uploaded with it's full mip chain
     def load_texture(self, path: str, cache_tex: bool = True) -> GPUTexture:
+        self._finish_if_pending(path)
+
         c = self.check_cache(path, AssetTypes.TEXTURE_ASSET)
         if c is not None:
             return c
 
-        surf = self.load_surface(path, False)
+        t = time.perf_counter()
+
+        h, data = None, None
+        if cache_tex:
+            h, data = self._source_hash(path)
+
+            c = self._resolve_duplicate(path, AssetTypes.TEXTURE_ASSET, h)
+            if c is not None:
+                self._take_prefetched(path, AssetTypes.TEXTURE_ASSET)
+                return c
+
+        tex_data = self._take_prefetched(path, AssetTypes.TEXTURE_ASSET)
+        if tex_data is None:
+            tex_data = self._decode_texture(path, data)
+
+        td = time.perf_counter()
 
         tex = GPUTexture()
-        tex.write_to(surf)
+        write_texture_data(tex, tex_data)
 
         if cache_tex:
-            self.asset_cache[path] = (AssetTypes.TEXTURE_ASSET, tex)
+            entry = self._cache_insert(path, AssetTypes.TEXTURE_ASSET, tex, vram_size=texture_size(tex))
+            self._set_content_hash(entry, h)
+
+        self._record_load("texture", path, time.perf_counter() - t, td - t)
 
         return tex
 
     def load_mesh(self, path: str) -> GPUMesh:
+        self._finish_if_pending(path)
+
         c = self.check_cache(path, AssetTypes.MESH_ASSET)
         if c is not None:
             return c
 
-        with np.load(os.path.join(self.asset_dir, path)) as mesh_data:
-            vertex_buf = mesh_data["vert_data"]
-            norm_buf = mesh_data["norm_data"]
-            uv_buf = mesh_data["uv_data"]
+        t = time.perf_counter()
 
-            if "elem_data" in mesh_data:
-                elem_buf = mesh_data["elem_data"]
-            else:
-                elem_buf = None
+        h, data = self._source_hash(path)
+
+        c = self._resolve_duplicate(path, AssetTypes.MESH_ASSET, h)
+        if c is not None:
+            self._take_prefetched(path, AssetTypes.MESH_ASSET)
+            return c
+
+        mesh_bufs = self._take_prefetched(path, AssetTypes.MESH_ASSET)
+        if mesh_bufs is None:
+            mesh_bufs = self._decode_mesh(path, data)
+
+        td = time.perf_counter()
+
+        mesh = GPUMesh(interleaved=True)
+        write_mesh_bufs(mesh, mesh_bufs)
+
+        entry = self._cache_insert(path, AssetTypes.MESH_ASSET, mesh, vram_size=mesh_bufs_size(mesh_bufs))
+        self._set_content_hash(entry, h)
 
-        mesh = GPUMesh()
-        mesh.write_to(vertex_buf, norm_buf, uv_buf, len(vertex_buf), elem_buf, len(elem_buf) if elem_buf is not None else 0)
-        self.asset_cache[path] = (AssetTypes.MESH_ASSET, mesh)
+        self._record_load("mesh", path, time.perf_counter() - t, td - t)
 
         return mesh
     
+    # the cache key of a shader pipeline
+    @staticmethod
+    def shader_key(vs_path: str, fs_path: str) -> str:
+        return f"(vert: {vs_path}, frag: {fs_path})"
+
     def load_shader(self, vs_path: str, fs_path: str) -> ShaderPipeline:
-        unique_name = f"(vert: {vs_path}, frag: {fs_path})"
+        unique_name = AssetManager.shader_key(vs_path, fs_path)
 
         c = self.check_cache(unique_name, AssetTypes.SHADER_ASSET)
         if c is not None:
             return c
 
-        with open(os.path.join(self.asset_dir, vs_path), 'r') as f:
-            vs_src = f.read()
+        t = time.perf_counter()
+
+        vs_src = self._take_prefetched(vs_path, AssetTypes.SHADER_ASSET)
+        if vs_src is None:
+            vs_src = self._decode_text(vs_path)
+
+        fs_src = self._take_prefetched(fs_path, AssetTypes.SHADER_ASSET)
+        if fs_src is None:
+            fs_src = self._decode_text(fs_path)
+
+        td = time.perf_counter()
 
-        with open(os.path.join(self.asset_dir, fs_path), 'r') as f:
-            fs_src = f.read()
-        
         pipe = ShaderPipeline(vs_src, fs_src, unique_name)
-        self.asset_cache[unique_name] = (AssetTypes.SHADER_ASSET, pipe)
+        self._cache_insert(unique_name, AssetTypes.SHADER_ASSET, pipe, ram_size=len(vs_src) + len(fs_src), source_paths=(vs_path, fs_path))
+
+        self._record_load("shader", unique_name, time.perf_counter() - t, td - t)
 
         return pipe
 
+    # == texture arrays ==
+
+    # textures can also be loaded as a layer of a shared GPUTextureArray, all textures with the same size and mip level count
+    # share arrays, so draws differing only by their texture can be batched (see ModelRenderer's `a_model_texture_array`)
+
+    @staticmethod
+    def texture_layer_key(path: str) -> str:
+        return f"(layer: {path})"
+
+    def load_texture_layer(self, path: str) -> TextureLayer:
+        key = AssetManager.texture_layer_key(path)
+
+        c = self.check_cache(key, AssetTypes.TEXTURE_LAYER_ASSET)
+        if c is not None:
+            return c
+
+        t = time.perf_counter()
+
+        tex_data = self._take_prefetched(path, AssetTypes.TEXTURE_ASSET)
+        if tex_data is None:
+            tex_data = self._decode_texture(path)
+
+        td = time.perf_counter()
+
+        size, levels = texture_data_levels(tex_data)
+
+        tex_layer = self._alloc_texture_layer(size, len(levels))
+        tex_layer.texture_array.write_layer(tex_layer.layer, levels)
+
+        layer_size = size[0] * size[1] * 4
+        self._cache_insert(key, AssetTypes.TEXTURE_LAYER_ASSET, tex_layer, vram_size=layer_size * 4 // 3 if len(levels) > 1 else layer_size, source_paths=(path,))
+
+        self._record_load("texture_layer", path, time.perf_counter() - t, td - t)
+
+        return tex_layer
+
+    def _alloc_texture_layer(self, size: tuple[int, int], levels: int) -> TextureLayer:
+        arrays = self.texture_arrays.setdefault((size[0], size[1], levels), [])
+
+        for tex_array in arrays:
+            tex_layer = tex_array.alloc_layer()
+            if tex_layer is not None:
+                return tex_layer
+
+        tex_array = GPUTextureArray(size, levels)
+        arrays.append(tex_array)
+
+        utils.info(f"[asset_mgr] created a {size[0]}x{size[1]} texture array ({levels} mip levels, {tex_array.layer_count} layers)")
+
+        return tex_array.alloc_layer()
+
+    # == instrumentation ==
+
+    # records a finished load into the map load profile (during map loads) and the asset stats (see cue_asset_stats)
+    def _record_load(self, type_name: str, path: str, load_time: float, decode_time: float) -> None:
+        profiler.record_asset(type_name, path, load_time)
+        asset_stats.record_load(type_name, path, load_time, decode_time, profiler.active_profile is not None)
+
+    # returns the cached asset count and memory of each asset type as dict[type_name, tuple[count, ram_size, vram_size]]
+    def memory_by_type(self) -> dict[str, tuple[int, int, int]]:
+        mem = {}
+
+        for e in self.asset_cache.values():
+            if e.alias_of is not None:
+                continue
+
+            count, ram, vram = mem.get(asset_type_names[e.asset_type], (0, 0, 0))
+            mem[asset_type_names[e.asset_type]] = (count + 1, ram + e.ram_size, vram + e.vram_size)
+
+        return mem
+
+    # == asset reloading ==
+
+    # reloads a cached asset from disk into the existing asset object, so all of it's users (eg. DrawStates) see the new data
+    # without respawning anything, returns False if the asset can't be reloaded in-place (it's left unchanged then)
+    def reload_asset(self, key: str) -> bool:
+        entry = self.asset_cache.get(key, None)
+        if entry is None or key in self.pending_loads:
+            return False
+
+        if entry.alias_of is not None:
+            # the gpu object is shared with the (unchanged) original, just drop the alias so the next load picks up the new content
+            self._drop_entry(key)
+
+            utils.warn(f"[asset_mgr] can't reload {key} in-place, it was a duplicate of {entry.alias_of.path} (reload the map to apply)")
+            return False
+
+        try:
+            if entry.asset_type == AssetTypes.TEXTURE_ASSET:
+                write_texture_data(entry.asset, self._decode_texture(entry.path))
+                self._resize_entry(entry, 0, texture_size(entry.asset))
+
+            elif entry.asset_type == AssetTypes.TEXTURE_LAYER_ASSET:
+                size, levels = texture_data_levels(self._decode_texture(entry.source_paths[0]))
+
+                tex_array = entry.asset.texture_array
+                if size != tex_array.texture_size or len(levels) != tex_array.texture_levels:
+                    utils.warn(f"[asset_mgr] can't reload {key} in-place, the texture size or mip count changed (reload the map to apply)")
+                    return False
+
+                tex_array.write_layer(entry.asset.layer, levels)
+
+            elif entry.asset_type == AssetTypes.SURFACE_ASSET:
+                surf = self._decode_surface(entry.path)
+                if surf.get_size() != entry.asset.get_size():
+                    utils.warn(f"[asset_mgr] can't reload {key} in-place, the surface size changed")
+                    return False
+
+                entry.asset.blit(surf, (0, 0))
+
+            elif entry.asset_type == AssetTypes.MESH_ASSET:
+                mesh_bufs = self._decode_mesh(entry.path)
+
+                mesh = entry.asset
+                if mesh_bufs[3] is None and mesh.mesh_ebo is not None:
+                    gl.glDeleteBuffers(1, [mesh.mesh_ebo])
+                    mesh.mesh_ebo = None
+                    mesh.element_count = 0
+
+                write_mesh_bufs(mesh, mesh_bufs)
+                self._resize_entry(entry, 0, mesh_bufs_size(mesh_bufs))
+
+            elif entry.asset_type == AssetTypes.SHADER_ASSET:
+                vs_path, fs_path = entry.source_paths
+                if not entry.asset.relink(self._decode_text(vs_path), self._decode_text(fs_path)):
+                    return False
+
+            else:
+                utils.warn(f"[asset_mgr] can't reload {key} in-place, unsupported asset type")
+                return False
+
+        except (OSError, ValueError, KeyError, pg.error) as e:
+            utils.error(f"[asset_mgr] failed to reload {key}: {e}")
+            return False
+
+        # the content changed, so aliases of the entry are no longer it's duplicates (their current users see the new content too)
+        if entry.content_hash is not None:
+            for alias_key in list(entry.aliases):
+                self._drop_entry(alias_key)
+
+            if self.content_keys.get((entry.asset_type, entry.content_hash), None) == key:
+                del self.content_keys[(entry.asset_type, entry.content_hash)]
+
+            self._set_content_hash(entry, self.content_hash(entry.path))
+
+        utils.info(f"[asset_mgr] reloaded {key}")
+        return True
+
+    # == asset decoding ==
+
+    # note: the decode functions don't touch any gl state and are safe to call from worker threads
+
+    # all decoders read from the mounted packs first (see _packed_data), falling back to the loose files. the texture and
+    # mesh decoders also take the source [data] if the caller already read it (see _source_hash)
+
+    def _decode_surface(self, path: str, data: np.ndarray | None = None) -> pg.Surface:
+        if data is None:
+            data = self._packed_data(path)
+
+        if data is not None:
+            return pg.image.load(io.BytesIO(data), path)
+
+        return pg.image.load(os.path.join(self.asset_dir, path), path)
+
+    # prefers the cooked texture if it's up-to-date, falls back to decoding the source image
+    def _decode_texture(self, path: str, data: np.ndarray | None = None) -> 'pg.Surface | tex_file.CookedTexture':
+        if self.packs and not (self.allow_loose_overrides and os.path.exists(os.path.join(self.asset_dir, path))):
+            # packs are built in one go, so a packed cooked texture is never stale
+            cooked_data = self._packed_data(path + tex_file.CTEX_EXT)
+            if cooked_data is not None:
+                try:
+                    return tex_file.parse_ctex(cooked_data, path + tex_file.CTEX_EXT)
+                except ValueError as e:
+                    utils.warn(f"[asset_mgr] ignoring packed cooked texture {path}{tex_file.CTEX_EXT}: {e}")
+
+        cooked_path = tex_file.cooked_path_for(os.path.join(self.asset_dir, path))
+        if cooked_path is not None:
+            try:
+                return tex_file.read_ctex(cooked_path)
+            except ValueError as e:
+                utils.warn(f"[asset_mgr] ignoring cooked texture {cooked_path}: {e}")
+
+        return self._decode_surface(path, data)
+
+    # note: `.cmesh` files are memory-mapped, the returned buffers are views into the file and are uploaded without copies
+    # note: a cooked `.cmesh` of a source mesh is preferred, like cooked textures (see cue_cook)
+    def _decode_mesh(self, path: str, data: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray | None]:
+        if not path.endswith(mesh_file.CMESH_EXT):
+            if self.packs and not (self.allow_loose_overrides and os.path.exists(os.path.join(self.asset_dir, path))):
+                cooked_data = self._packed_data(path + mesh_file.CMESH_EXT)
+                if cooked_data is not None:
+                    try:
+                        return mesh_file.parse_cmesh(cooked_data, path + mesh_file.CMESH_EXT)
+                    except ValueError as e:
+                        utils.warn(f"[asset_mgr] ignoring packed cooked mesh {path}{mesh_file.CMESH_EXT}: {e}")
+
+            cooked_path = mesh_file.cooked_path_for(os.path.join(self.asset_dir, path))
+            if cooked_path is not None:
+                try:
+                    return mesh_file.read_cmesh(cooked_path)
+                except ValueError as e:
+                    utils.warn(f"[asset_mgr] ignoring cooked mesh {cooked_path}: {e}")
+
+        if data is None:
+            data = self._packed_data(path)
+
+        if data is not None:
+            return mesh_file.parse_mesh_file(data, path)
+
+        return mesh_file.read_mesh_file(os.path.join(self.asset_dir, path))
+
+    def _decode_audio(self, path: str) -> pg.mixer.Sound:
+        data = self._packed_data(path)
+        if data is not None:
+            return pg.mixer.Sound(file=io.BytesIO(data))
+
+        return pg.mixer.Sound(file=os.path.join(self.asset_dir, path))
+
+    def _decode_text(self, path: str) -> str:
+        data = self._packed_data(path)
+        if data is not None:
+            return bytes(data).decode("utf-8")
+
+        with open(os.path.join(self.asset_dir, path), 'r') as f:
+            return f.read()
+
     # contains already loaded assets, clear with reset()
-    asset_cache: dict[str, tuple[int, Any]]
+    asset_cache: dict[str, AssetCacheEntry]
+
+    # lru of cache keys with no references (oldest first), evicted from when over budget
+    unused_assets: OrderedDict[str, None]
+
+    # estimated memory used by all cached assets
+    ram_usage: int
+    vram_usage: int
+
+    ram_budget: int
+    vram_budget: int
+    eviction_paused: bool
+
+    # decoded sounds, also counted into `ram_usage`
+    audio_usage: int
+    audio_budget: int
+
+    # audio files larger than the threshold (in bytes, compressed) are streamed, unless overriden in `audio_modes`
+    audio_stream_threshold: int
+    audio_modes: dict[str, str] # dict[path, "sound" | "stream"]
+
+    asset_dir: str
+
+    worker_pool: ThreadPoolExecutor | None # created on first use
+
+    # decoded assets waiting for their load_* call, guarded by `prefetch_lock`
+    prefetch_lock: threading.Lock
+    prefetch_staging: dict[str, tuple[int, Any, int]] # dict[path, tuple[staged_type, decoded_data, data_size]]
+    prefetch_bytes: int
+    prefetch_budget: int
+
+    # bumped on each drop_prefetched(), used to discard decodes which were in-flight during a drop
+    prefetch_gen: int
+
+    # async loads, pending until uploaded on the main thread
+    pending_loads: dict[str, PendingLoad]
+    pending_lock: threading.Lock # guards PendingLoad.decode_claimed
+    upload_queue: queue.Queue
+    upload_budget: float
+    upload_tick_scheduled: bool
+
+    placeholder_surf: pg.Surface | None
+
+    # shared texture arrays for texture layers, by (width, height, mip levels)
+    texture_arrays: dict[tuple[int, int, int], list[GPUTextureArray]]
+
+    # mounted asset packs, in lookup order
+    packs: list[pack.AssetPack]
+    allow_loose_overrides: bool
 
-    asset_dir: str
\ No newline at end of file
+    hash_index: AssetHashIndex
+    content_keys: dict[tuple[int, str], str] # dict[tuple[asset_type, content_hash], cache_key]
+    dep_graph: AssetDepGraph
\ No newline at end of file
@@ -0,0 +1,398 @@
+import json, os, math, hashlib
+from dataclasses import dataclass
+
+import numpy as np
+from pygame.math import Vector3 as Vec3, Vector2 as Vec2
+
+from .cue_state import GameState
+from . import cue_utils as utils
+from . import cue_mesh_file as mesh_file
+
+from .components.cue_transform import Transform
+from .components.cue_model import ModelRenderer
+from .rendering.cue_resources import GPUMesh, interleave_vertices, is_packed_streams, unpack_vertices, compact_elements
+from .phys.cue_phys_types import PhysAABB
+from .rendering import cue_pvs as pvs
+
+# == Cue Map Bakes ==
+
+# a map bake is an optional compile-time step which pre-processes the static world of a map, so that the runtime can skip
+# the per-entity setup for it entirely:
+#  - `bt_static_mesh` entities sharing the same pipeline, textures and uniforms are pre-transformed into world space and merged into single meshes
+#  - `bt_phys_aabb` entities are pre-built into packed aabb arrays, already grouped by their phys subscene
+#  - optionally, a potentially visible set (pvs) is computed for the baked meshes (see cue_pvs.py)
+#
+# the bake is saved next to the map file (as `<map file>.cbake`) and is memory-mapped on load, the map file itself still
+# contains all of the baked entities (so the editor can keep using it), but the map header lists them in it's `bake` field
+# and `load_map` will not spawn them if the bake file is present and matches the map
+#
+# the bake file is formated as follows:
+#  - 16 byte header: 8 byte magic, uint32 bake version, uint32 index length
+#  - json index (utf-8) describing the baked data and where it is stored
+#  - data sections, each aligned to BAKE_ALIGN bytes (offsets in the index are relative to the first section)
+
+BAKE_MAGIC = b"CUEBAKE\0"
+BAKE_VERSION = 2
+BAKE_ALIGN = 16
+BAKE_EXT = ".cbake"
+
+def _align(offset: int) -> int:
+    return (offset + BAKE_ALIGN - 1) & ~(BAKE_ALIGN - 1)
+
+def _encode_param(param):
+    if isinstance(param, Vec2):
+        return (param.x, param.y)
+
+    elif isinstance(param, Vec3):
+        return (param.x, param.y, param.z)
+
+    raise TypeError("unsupported data type in entity data")
+
+# == bake compiler ==
+
+class _BakeWriter:
+    def __init__(self) -> None:
+        self.sections = []
+        self.data_size = 0
+
+    def add(self, arr: np.ndarray) -> dict:
+        arr = np.ascontiguousarray(arr)
+
+        desc = {"offset": self.data_size, "dtype": arr.dtype.str, "shape": list(arr.shape)}
+        self.sections.append((self.data_size, arr))
+        self.data_size = _align(self.data_size + arr.nbytes)
+
+        return desc
+
+    def write(self, path: str, index: dict) -> None:
+        index_data = json.dumps(index, default=_encode_param).encode("utf-8")
+        data_start = _align(16 + len(index_data))
+
+        with open(path, 'wb') as f:
+            f.write(BAKE_MAGIC)
+            f.write(BAKE_VERSION.to_bytes(4, 'little'))
+            f.write(len(index_data).to_bytes(4, 'little'))
+            f.write(index_data)
+
+            for offset, arr in self.sections:
+                f.seek(data_start + offset)
+                f.write(arr.tobytes())
+
+            f.truncate(data_start + self.data_size)
+
+    sections: list[tuple[int, np.ndarray]]
+    data_size: int
+
+def _entity_matrix(en_data: dict) -> np.ndarray:
+    # note: matches the `Transform` component matrix
+    rot = en_data["t_rot"]
+
+    return (
+        utils.mat4_translate(en_data["t_pos"]) @
+        utils.mat4_rotate((math.radians(rot[0]), math.radians(rot[1]), math.radians(rot[2]))) @
+        utils.mat4_scale(en_data["t_scale"])
+    )
+
+def _bake_mesh_member(asset_dir: str, en_data: dict, mesh_cache: dict) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    mesh = mesh_cache.get(en_data["a_model_mesh"], None)
+    if mesh is None:
+        pos, norm, uv, elem = mesh_file.read_mesh_file(os.path.join(asset_dir, en_data["a_model_mesh"]))
+
+        if is_packed_streams(norm, uv):
+            pos, norm, uv = unpack_vertices(pos, norm, uv)
+
+        pos = pos.reshape((-1, 3)).astype(np.float32)
+        norm = norm.reshape((-1, 3)).astype(np.float32)
+        uv = uv.reshape((-1, 2)).astype(np.float32)
+        elem = elem.astype(np.uint32) if elem is not None else np.arange(len(pos), dtype=np.uint32)
+
+        mesh = (pos, norm, uv, elem)
+        mesh_cache[en_data["a_model_mesh"]] = mesh
+
+    pos, norm, uv, elem = mesh
+    mat = _entity_matrix(en_data)
+
+    # transform into world space
+
+    world_pos = pos @ mat[:3, :3].T + mat[:3, 3]
+
+    try: norm_mat = np.linalg.inv(mat[:3, :3]).T
+    except np.linalg.LinAlgError: norm_mat = mat[:3, :3] # degenerate scale, normals will be off anyway
+
+    world_norm = norm @ norm_mat.T
+    world_norm /= np.maximum(np.linalg.norm(world_norm, axis=1, keepdims=True), 1e-8)
+
+    return (world_pos.astype(np.float32), world_norm.astype(np.float32), uv, elem)
+
+def _merge_meshes(meshes: list[tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    elem_bufs = []
+    vertex_base = 0
+
+    for pos, _, _, elem in meshes:
+        elem_bufs.append(elem + vertex_base)
+        vertex_base += len(pos)
+
+    return (
+        np.concatenate([m[0] for m in meshes]),
+        np.concatenate([m[1] for m in meshes]),
+        np.concatenate([m[2] for m in meshes]),
+        np.concatenate(elem_bufs).astype(np.uint32),
+    )
+
+# bakes the static world of a map into a bake file next to [map_path], returns the `bake` map header field or None if there was nothing to bake
+# if [pvs_cell_size] is set, a pvs with roughly that cell size is computed and the merged meshes are split by pvs cells (see cue_pvs.py)
+# note: reads the meshes from [asset_dir], the bake must be redone when a baked mesh asset changes
+def bake_map(map_path: str, entity_export: dict[str, tuple[str, dict]], asset_dir: str, pvs_cell_size: float | None = None) -> dict | None:
+    mesh_groups = {}
+    aabb_groups = {}
+
+    for name, (type_name, en_data) in entity_export.items():
+        if type_name == "bt_static_mesh":
+            if en_data.get("a_model_transparent", False) or en_data.get("t_pos", None) is None:
+                continue # non-opaque meshes must stay separate for view ordering
+
+            group_key = json.dumps((
+                en_data["a_model_vshader"],
+                en_data["a_model_fshader"],
+                en_data.get("a_model_albedo", None),
+                en_data.get("a_model_uniforms", {}),
+            ), sort_keys=True, default=_encode_param)
+
+            mesh_groups.setdefault(group_key, []).append((name, en_data))
+
+        elif type_name == "bt_phys_aabb":
+            if en_data.get("t_pos", None) is None:
+                continue
+
+            aabb_groups.setdefault(en_data.get("phys_subscene_id", ""), []).append((name, en_data))
+
+    if not mesh_groups and not aabb_groups:
+        return None
+
+    writer = _BakeWriter()
+    mesh_cache = {}
+
+    baked_meshes = []
+    baked_colliders = []
+    baked_entities = []
+
+    # pack static colliders
+
+    for sub_id, members in sorted(aabb_groups.items()):
+        aabb_buf = np.empty((len(members), 2, 3), dtype=np.float32)
+
+        for i, (_, en_data) in enumerate(members):
+            pos, size = en_data["t_pos"], en_data["t_scale"]
+
+            aabb_buf[i, 0] = (pos[0] - size[0] / 2, pos[1] - size[1] / 2, pos[2] - size[2] / 2)
+            aabb_buf[i, 1] = (pos[0] + size[0] / 2, pos[1] + size[1] / 2, pos[2] + size[2] / 2)
+
+        baked_colliders.append((sub_id, aabb_buf))
+        baked_entities += [m[0] for m in members]
+
+    # transform static meshes into world space
+
+    mesh_members = []
+
+    for group_key, members in mesh_groups.items():
+        for name, en_data in members:
+            mesh_members.append((group_key, _bake_mesh_member(asset_dir, en_data, mesh_cache)))
+
+        baked_entities += [m[0] for m in members]
+
+    # compute the pvs, the baked colliders covered by the baked meshes act as occluders
+
+    pvs_index = None
+    mesh_cells = [(-1, 0)] * len(mesh_members) # tuple[home cell, touched cell mask]
+
+    if pvs_cell_size is not None and mesh_members:
+        mesh_bounds = [(m[1][0].min(axis=0), m[1][0].max(axis=0)) for m in mesh_members]
+        occluders = np.concatenate([c[1] for c in baked_colliders]) if baked_colliders else np.empty((0, 2, 3), dtype=np.float32)
+        occluders = occluders[pvs.visible_occluders(occluders, np.concatenate([m[1][0] for m in mesh_members]))]
+
+        bounds_min = np.min([b[0] for b in mesh_bounds] + ([occluders[:, 0].min(axis=0)] if len(occluders) else []), axis=0) - .01
+        bounds_max = np.max([b[1] for b in mesh_bounds] + ([occluders[:, 1].max(axis=0)] if len(occluders) else []), axis=0) + .01
+
+        origin, cell_size, dims = pvs.pvs_grid(bounds_min, bounds_max, pvs_cell_size)
+        target_mask = np.zeros(math.prod(dims), dtype=bool)
+
+        for i, (b_min, b_max) in enumerate(mesh_bounds):
+            cell_mask = pvs.cell_range_mask(origin, cell_size, dims, b_min, b_max)
+            home_cell = pvs.clamped_cell(origin, cell_size, dims, (b_min + b_max) / 2)
+
+            mesh_cells[i] = (home_cell, cell_mask)
+
+            for c in range(cell_mask.bit_length()):
+                if cell_mask >> c & 1:
+                    target_mask[c] = True
+
+        vis = pvs.compute_pvs(origin, cell_size, dims, occluders, target_mask)
+        vis_bits = np.packbits(vis, axis=1, bitorder='little')
+
+        pvs_index = {
+            "origin": origin.tolist(),
+            "cell_size": cell_size,
+            "dims": list(dims),
+            "vis_bits": writer.add(vis_bits),
+        }
+
+        utils.info(f"[bake] computed pvs with {math.prod(dims)} cells ({cell_size:.2f} units per cell), avg. {vis.sum() / len(vis):.1f} visible cells per cell")
+
+    # merge static meshes, by pvs cells if a pvs was computed
+
+    merge_groups = {}
+
+    for (group_key, mesh), (home_cell, cell_mask) in zip(mesh_members, mesh_cells):
+        merge_group = merge_groups.setdefault((group_key, home_cell), ([], [0]))
+
+        merge_group[0].append(mesh)
+        merge_group[1][0] |= cell_mask
+
+    for (group_key, _), (meshes, cell_mask) in merge_groups.items():
+        vs_path, fs_path, albedo_path, uniforms = json.loads(group_key)
+        pos, norm, uv, elem = _merge_meshes(meshes)
+
+        baked_meshes.append({
+            "vshader": vs_path,
+            "fshader": fs_path,
+            "albedo": albedo_path,
+            "uniforms": uniforms,
+
+            # the pvs cells touched by this mesh, only used with a pvs
+            "pvs_cells": [c for c in range(cell_mask[0].bit_length()) if cell_mask[0] >> c & 1],
+
+            "vertex_count": len(pos),
+            "element_count": len(elem),
+
+            # interleaved vertices, uploaded as is into an interleaved GPUMesh
+            "verts": writer.add(interleave_vertices(pos, norm, uv)),
+            "elem": writer.add(compact_elements(elem, len(pos))),
+        })
+
+    # the bake key ties the bake file to the exact entity data it was baked from
+
+    key_src = json.dumps(sorted((n, entity_export[n][0], entity_export[n][1]) for n in baked_entities), sort_keys=True, default=_encode_param)
+    bake_key = hashlib.sha1(key_src.encode("utf-8")).hexdigest()
+
+    collider_index = [{"sub_id": sub_id, "aabbs": writer.add(aabb_buf)} for sub_id, aabb_buf in baked_colliders]
+
+    bake_path = map_path + BAKE_EXT
+    writer.write(bake_path, {
+        "bake_key": bake_key,
+        "meshes": baked_meshes,
+        "colliders": collider_index,
+        "pvs": pvs_index,
+    })
+
+    utils.info(f"[bake] baked {len(baked_entities)} static entities into {len(baked_meshes)} meshes and {len(baked_colliders)} collider groups")
+
+    return {
+        "file": os.path.basename(bake_path),
+        "key": bake_key,
+        "entities": baked_entities,
+    }
+
+# == bake loader ==
+
+@dataclass(init=False, slots=True)
+class MapBake:
+    def __init__(self, bake_path: str, bake_header: dict) -> None:
+        self.bake_data = np.memmap(bake_path, dtype=np.uint8, mode='r')
+
+        if bytes(self.bake_data[:8]) != BAKE_MAGIC:
+            raise ValueError("not a cue bake file")
+
+        bake_ver = int.from_bytes(bytes(self.bake_data[8:12]), 'little')
+        if bake_ver != BAKE_VERSION:
+            raise ValueError(f"incompatible bake file version (bake file: {bake_ver}; supported: {BAKE_VERSION})")
+
+        index_len = int.from_bytes(bytes(self.bake_data[12:16]), 'little')
+        self.bake_index = json.loads(bytes(self.bake_data[16:16 + index_len]))
+        self.data_start = _align(16 + index_len)
+
+        if self.bake_index["bake_key"] != bake_header["key"]:
+            raise ValueError("bake file doesn't match the map file, the map must be re-baked")
+
+        self.baked_entities = set(bake_header["entities"])
+
+        self.bake_meshes = []
+        self.bake_renderers = []
+        self.bake_aabbs = []
+
+    # returns a zero-copy view into the memory-mapped bake file
+    def section(self, desc: dict) -> np.ndarray:
+        dtype = np.dtype(desc["dtype"])
+        start = self.data_start + desc["offset"]
+        count = math.prod(desc["shape"])
+
+        return self.bake_data[start:start + count * dtype.itemsize].view(dtype).reshape(desc["shape"])
+
+    def spawn(self) -> None:
+        ident_trans = Transform(Vec3(0., 0., 0.), Vec3(0., 0., 0.))
+
+        pvs_index = self.bake_index.get("pvs", None)
+        if pvs_index is not None:
+            GameState.active_scene.pvs = pvs.PVSData(pvs_index["origin"], pvs_index["cell_size"], pvs_index["dims"], self.section(pvs_index["vis_bits"]))
+
+        for m in self.bake_index["meshes"]:
+            mesh = GPUMesh(interleaved=True)
+            verts = self.section(m["verts"])
+            mesh.write_to(verts[:, 0:3], verts[:, 3:6], verts[:, 6:8], m["vertex_count"], self.section(m["elem"]), m["element_count"])
+
+            en_data = {
+                "a_model_vshader": m["vshader"],
+                "a_model_fshader": m["fshader"],
+                "a_model_uniforms": m["uniforms"],
+            }
+
+            if m["albedo"] is not None:
+                en_data["a_model_albedo"] = m["albedo"]
+
+            pvs_mask = None
+            if pvs_index is not None:
+                pvs_mask = sum(1 << c for c in m["pvs_cells"])
+
+            renderer = ModelRenderer(en_data, ident_trans, mesh=mesh, pvs_mask=pvs_mask)
+
+            self.bake_meshes.append(mesh)
+            self.bake_renderers.append(renderer)
+
+        for c in self.bake_index["colliders"]:
+            for points in self.section(c["aabbs"]):
+                aabb = PhysAABB(points, c["sub_id"])
+
+                GameState.collider_scene.add_coll(aabb)
+                self.bake_aabbs.append(aabb)
+
+    def despawn(self) -> None:
+        for r in self.bake_renderers:
+            r.despawn()
+
+        GameState.active_scene.pvs = None
+
+        for aabb in self.bake_aabbs:
+            GameState.collider_scene.remove_coll(aabb)
+
+        self.bake_renderers = []
+        self.bake_aabbs = []
+
+    bake_data: np.memmap
+    bake_index: dict
+    data_start: int
+
+    # names of the map entities which are contained in this bake and should not be spawned
+    baked_entities: set[str]
+
+    bake_meshes: list[GPUMesh]
+    bake_renderers: list[ModelRenderer]
+    bake_aabbs: list[PhysAABB]
+
+# tries to open the bake of a map, returns None (and falls back to normal entity spawning) if the bake is missing or stale
+def try_load_bake(map_path: str, bake_header: dict) -> MapBake | None:
+    bake_path = os.path.join(os.path.dirname(map_path), bake_header["file"])
+
+    try:
+        return MapBake(bake_path, bake_header)
+    except (OSError, ValueError, KeyError) as e:
+        utils.warn(f"[bake] failed to load map bake {bake_path}, spawning the static world normally: {e}")
+        return None
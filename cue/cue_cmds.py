@@ -3,6 +3,9 @@ from . import cue_utils as utils
 # a set of basic dev con commands
 
 from . import cue_map
+from . import cue_profiler as profiler
+from .cue_asset_watcher import asset_watcher
+from .cue_asset_stats import asset_stats
 from .cue_state import GameState
 
 def help_cmd(args: list[str]):
@@ -18,37 +21,169 @@ def exit_cmd(args: list[str]):
 
 utils.add_dev_command("exit", exit_cmd)
 
-def map_cmd(args: list[str]):
-    if len(args) == 0:
-        utils.error("no map specified, use 'map [map file path]' to load a cue map")
-        return
-    elif len(args) > 1:
-        utils.error(f"unknown arguments; expected 1, got {len(args)}")
-        return
-
+# defers a map load from the asset dir or a full path, returns False if the map file was not found
+def defer_map_load(path: str) -> bool:
     # try from asset dir
     try:
-        cue_map.load_map_when_safe(GameState.asset_manager.asset_dir + "/" + args[0])
-        return
+        cue_map.load_map_when_safe(GameState.asset_manager.asset_dir + "/" + path)
+        return True
     except FileNotFoundError:
         pass
 
     # try as a full path
     try:
-        cue_map.load_map_when_safe(args[0])
-        return
+        cue_map.load_map_when_safe(path)
+        return True
     except FileNotFoundError:
         pass
 
     utils.error("map file not found!")
+    return False
+
+def map_cmd(args: list[str]):
+    if len(args) == 0:
+        utils.error("no map specified, use 'map [map file path]' to load a cue map")
+        return
+    elif len(args) > 1:
+        utils.error(f"unknown arguments; expected 1, got {len(args)}")
+        return
+
+    defer_map_load(args[0])
 
 utils.add_dev_command("map", map_cmd)
 
+def map_profile_cmd(args: list[str]):
+    if len(args) != 1:
+        utils.error("use 'map_profile [map file path]' to load a cue map and print its load time breakdown")
+        return
+
+    if defer_map_load(args[0]):
+        profiler.report_next_load = True
+
+utils.add_dev_command("map_profile", map_profile_cmd)
+
 def assetc_flush(args: list[str]):
     GameState.asset_manager.reset()
 
 utils.add_dev_command("flush_assetc", assetc_flush)
 
+def asset_watch_cmd(args: list[str]):
+    if len(args) != 1 or args[0] not in ("on", "off"):
+        utils.error("use 'asset_watch [on|off]' to toggle hot reloading of changed assets")
+        return
+
+    if args[0] == "on":
+        asset_watcher.start()
+    else:
+        asset_watcher.stop()
+        utils.info("[asset_watcher] stopped watching assets")
+
+utils.add_dev_command("asset_watch", asset_watch_cmd)
+
+# reports the assets a map needs, as recorded by the asset dependency graph on it's last load
+def map_assets_cmd(args: list[str]):
+    if len(args) > 1:
+        utils.error("use 'map_assets [map file path]' to list the assets used by a map (default: the current map)")
+        return
+
+    asset_mgr = GameState.asset_manager
+    dep_graph = asset_mgr.dep_graph
+    map_path = args[0] if args else getattr(GameState, "current_map", None)
+
+    if map_path is None:
+        utils.error("no map currently loaded, specify a map file path")
+        return
+
+    if map_path not in dep_graph.map_assets:
+        # never loaded, only the assets declared by the map's entities are known
+        try:
+            _, map_entities, _ = cue_map.read_map(map_path)
+        except (OSError, ValueError) as e:
+            utils.error(f"failed to read map {map_path}: {e}")
+            return
+
+        declared = cue_map.collect_map_assets(map_entities)
+        utils.info(f"{map_path} was not loaded yet, {len(declared)} assets declared by it's entities:")
+
+        for path, type_name in declared:
+            utils.info(f" - {path} ({type_name})")
+
+        return
+
+    map_assets = dep_graph.map_assets[map_path]
+    is_current = map_path == dep_graph.current_map
+    ram_total, vram_total = 0, 0
+
+    utils.info(f"{map_path} uses {len(map_assets)} assets:")
+
+    for key in sorted(map_assets.keys()):
+        entry = asset_mgr.asset_cache.get(key, None)
+
+        if entry is None:
+            status = "not cached"
+        elif entry.alias_of is not None:
+            status = f"duplicate of {entry.alias_of.path}"
+        else:
+            status = f"ram: {entry.ram_size / 1024:.1f} KiB, vram: {entry.vram_size / 1024:.1f} KiB, refs: {entry.ref_count}"
+            ram_total += entry.ram_size
+            vram_total += entry.vram_size
+
+        users = dep_graph.asset_entities(key) if is_current else []
+        utils.info(f" - {key} ({status})" + (f" used by {', '.join(sorted(users))}" if users else ""))
+
+    utils.info(f"total: ram {ram_total / (1024 * 1024):.2f} MiB, vram {vram_total / (1024 * 1024):.2f} MiB")
+
+    if is_current:
+        unneeded = [e for k, e in asset_mgr.asset_cache.items() if k not in map_assets and e.alias_of is None]
+        utils.info(f"{len(unneeded)} other assets cached but not used by this map (ram {sum(e.ram_size for e in unneeded) / (1024 * 1024):.2f} MiB, vram {sum(e.vram_size for e in unneeded) / (1024 * 1024):.2f} MiB)")
+
+utils.add_dev_command("map_assets", map_assets_cmd)
+
+def asset_stats_cmd(args: list[str]):
+    if args == ["reset"]:
+        asset_stats.reset()
+        utils.info("[asset_stats] stats reset")
+        return
+    elif len(args) != 0:
+        utils.error("use 'asset_stats' to print asset cache stats or 'asset_stats reset' to reset them")
+        return
+
+    asset_stats.report(GameState.asset_manager)
+
+utils.add_dev_command("asset_stats", asset_stats_cmd)
+
+def asset_top_cmd(args: list[str]):
+    sort_keys = ("time", "ram", "vram")
+
+    try:
+        count = int(args[0]) if len(args) > 0 else 10
+    except ValueError:
+        count = -1
+
+    sort_key = args[1] if len(args) > 1 else "time"
+
+    if len(args) > 2 or count < 0 or sort_key not in sort_keys:
+        utils.error("use 'asset_top [count] [time|ram|vram]' to list the slowest loading or largest assets")
+        return
+
+    if sort_key == "time":
+        utils.info(f"[asset_stats] slowest {count} asset loads:")
+
+        for path, s in asset_stats.top_loads(count):
+            utils.info(f"[asset_stats]   {s.type_name:<8} total: {s.total_time * 1000:9.2f}ms  decode: {s.decode_time * 1000:9.2f}ms  max: {s.max_time * 1000:8.2f}ms  x{s.load_count}  {path}")
+
+        return
+
+    entries = [e for e in GameState.asset_manager.asset_cache.values() if e.alias_of is None]
+    entries.sort(key=lambda e: e.ram_size if sort_key == "ram" else e.vram_size, reverse=True)
+
+    utils.info(f"[asset_stats] largest {count} cached assets by {sort_key}:")
+
+    for e in entries[:count]:
+        utils.info(f"[asset_stats]   ram: {e.ram_size / 1024:10.1f} KiB  vram: {e.vram_size / 1024:10.1f} KiB  refs: {e.ref_count:<3} {e.path}")
+
+utils.add_dev_command("asset_top", asset_top_cmd)
+
 def reload_cmd(args: list[str]):
     if len(args) != 0:
         utils.error("unknown args")
@@ -63,4 +198,16 @@ def reload_cmd(args: list[str]):
 
     cue_map.load_map_when_safe(GameState.current_map)
 
-utils.add_dev_command("reload", reload_cmd)
\ No newline at end of file
+utils.add_dev_command("reload", reload_cmd)
+
+def frustum_cull_cmd(args: list[str]):
+    if len(args) > 1 or (args and args[0] not in ("on", "off")):
+        utils.error("use 'frustum_cull [on|off]' to toggle frustum culling of the active scene")
+        return
+
+    scene = GameState.active_scene
+    scene.frustum_culling = args[0] == "on" if args else not scene.frustum_culling
+
+    utils.info(f"frustum culling {'enabled' if scene.frustum_culling else 'disabled'}")
+
+utils.add_dev_command("frustum_cull", frustum_cull_cmd)
\ No newline at end of file
@@ -0,0 +1,299 @@
+import os, sys, json, time, shutil, hashlib, argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+
+import pygame as pg
+import numpy as np
+
+from . import cue_texture_file as tex_file
+from . import cue_mesh_file as mesh_file
+from . import cue_mesh_opt as mesh_opt
+from .cue_asset_index import ASSET_HASH_INDEX, HASH_CHUNK_SIZE
+from .cue_assets import PROGRAM_CACHE_DIR
+from .rendering.cue_resources import is_packed_streams, unpack_vertices
+
+# == Cue Asset Cooker ==
+
+# an offline build step converting an asset dir into a cooked asset dir with runtime-optimized formats:
+#  - images are cooked into `.ctex` textures with full mip chains (see cue_texture_file), the source image is kept for surface loads
+#  - `.npz` meshes are converted into memory-mapped `.cmesh` files (see cue_mesh_file), optionally optimized and packed
+#  - shaders are compiled with a hidden gl context to catch errors at build time (skipped when no context can be created)
+#  - the bounds of all meshes are written into `COOK_BOUNDS_FILE`
+#  - everything else is copied as is
+#
+# cooked files are written next to their source path (as `<path>.ctex` / `<path>.cmesh`) and are picked up by the
+# AssetManager, so maps don't need any changes. the cooked dir can be used as the asset dir directly or packed (see cue_pack)
+#
+# a manifest with the source hashes and cook settings is kept in the output dir, so only changed assets are cooked again
+# and the outputs of removed sources are deleted. the conversions run in a process pool
+
+COOK_MANIFEST = ".cook_manifest.json"
+COOK_BOUNDS_FILE = "mesh_bounds.json"
+COOK_VERSION = 1
+
+@dataclass(slots=True)
+class CookOptions:
+    srgb: bool = True
+    optimize_meshes: bool = False
+    pack_vertices: bool = False
+
+def _asset_kind(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+
+    if ext in tex_file.cook_source_exts:
+        return "texture"
+
+    if ext in (".npz", mesh_file.CMESH_EXT):
+        return "mesh"
+
+    if ext in (".vert", ".frag", ".glsl"):
+        return "shader"
+
+    return "file"
+
+# the settings an asset was cooked with, assets are recooked when these change
+def _cook_settings(kind: str, opts: CookOptions) -> dict:
+    if kind == "texture":
+        return {"version": COOK_VERSION, "srgb": opts.srgb}
+
+    if kind == "mesh":
+        return {"version": COOK_VERSION, "optimize": opts.optimize_meshes, "pack": opts.pack_vertices}
+
+    return {"version": COOK_VERSION}
+
+def _file_hash(path: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+
+    with open(path, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+# == cook jobs ==
+
+# cooks a single asset, runs in the worker processes. returns the written outputs (relative to [out_dir]) and the mesh bounds (if a mesh)
+def _cook_asset(asset_dir: str, out_dir: str, path: str, opts: CookOptions) -> tuple[list[str], list | None]:
+    src_path = os.path.join(asset_dir, path)
+    out_path = os.path.join(out_dir, path)
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+
+    kind = _asset_kind(path)
+
+    if kind == "texture":
+        shutil.copy2(src_path, out_path)
+        tex_file.cook_texture(src_path, out_path + tex_file.CTEX_EXT, opts.srgb)
+
+        return ([path, path + tex_file.CTEX_EXT], None)
+
+    if kind == "mesh":
+        pos, norm, uv, elem = mesh_file.read_mesh_file(src_path)
+        bounds = [b.tolist() for b in mesh_file.mesh_bounds(pos)]
+
+        if path.endswith(mesh_file.CMESH_EXT) and not opts.optimize_meshes and not opts.pack_vertices:
+            shutil.copy2(src_path, out_path) # already in the runtime format
+            return ([path], bounds)
+
+        if opts.optimize_meshes:
+            if is_packed_streams(norm, uv):
+                pos, norm, uv = unpack_vertices(pos, norm, uv)
+
+            if elem is None:
+                elem = np.arange(np.size(pos) // 3, dtype=np.uint32)
+
+            (pos, norm, uv, elem), _ = mesh_opt.optimize_mesh(pos, norm, uv, elem)
+
+        cooked_path = path if path.endswith(mesh_file.CMESH_EXT) else path + mesh_file.CMESH_EXT
+        mesh_file.write_cmesh(os.path.join(out_dir, cooked_path), pos, norm, uv, elem, interleaved=True, packed=opts.pack_vertices)
+
+        return ([cooked_path], bounds)
+
+    # shaders (validated on the main process) and other files
+
+    shutil.copy2(src_path, out_path)
+    return ([path], None)
+
+# compiles each shader stage in [paths] with a hidden gl context, returns the paths which failed to compile
+def _validate_shaders(asset_dir: str, paths: list[str]) -> list[str]:
+    stage_paths = [p for p in paths if os.path.splitext(p)[1].lower() in (".vert", ".frag")]
+    if not stage_paths:
+        return []
+
+    try:
+        pg.display.init()
+
+        pg.display.gl_set_attribute(pg.GL_CONTEXT_PROFILE_MASK, pg.GL_CONTEXT_PROFILE_CORE)
+        pg.display.gl_set_attribute(pg.GL_CONTEXT_MAJOR_VERSION, 3)
+        pg.display.gl_set_attribute(pg.GL_CONTEXT_MINOR_VERSION, 3)
+
+        pg.display.set_mode((1, 1), pg.OPENGL | pg.HIDDEN)
+    except pg.error as e:
+        print(f"[cook] no gl context available, skipping validation of {len(stage_paths)} shaders: {e}")
+        return []
+
+    import OpenGL.GL as gl
+    from .rendering.cue_resources import ShaderPipeline
+
+    failed = []
+
+    for path in stage_paths:
+        with open(os.path.join(asset_dir, path), 'r') as f:
+            src = f.read()
+
+        s = ShaderPipeline._compile_shader(gl.GL_VERTEX_SHADER if path.lower().endswith(".vert") else gl.GL_FRAGMENT_SHADER, src, path)
+
+        if s is None:
+            failed.append(path)
+        else:
+            gl.glDeleteShader(s)
+
+    pg.display.quit()
+    return failed
+
+# == cooker ==
+
+def _is_source(asset_dir: str, path: str) -> bool:
+    if path in (ASSET_HASH_INDEX, COOK_MANIFEST, COOK_BOUNDS_FILE) or path.startswith(PROGRAM_CACHE_DIR + "/") or path.endswith(".cmfc"):
+        return False
+
+    # cooked files already next to their source (eg. from the editor or cue_texture_file) are redone by the cooker
+    for cooked_ext in (tex_file.CTEX_EXT, mesh_file.CMESH_EXT):
+        if path.endswith(cooked_ext) and os.path.isfile(os.path.join(asset_dir, path[:-len(cooked_ext)])):
+            return False
+
+    return True
+
+# cooks all changed assets of [asset_dir] into [out_dir], returns (cooked count, up-to-date count, failed count)
+def cook_assets(asset_dir: str, out_dir: str, opts: CookOptions | None = None, force: bool = False, jobs: int | None = None) -> tuple[int, int, int]:
+    if opts is None:
+        opts = CookOptions()
+
+    manifest_path = os.path.join(out_dir, COOK_MANIFEST)
+    manifest = {}
+
+    if not force:
+        try:
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"[cook] ignoring corrupted manifest {manifest_path}: {e}", file=sys.stderr)
+
+    # find the changed sources
+
+    out_abs = os.path.abspath(out_dir)
+    sources = {}
+    todo = []
+
+    for dirpath, dirnames, filenames in os.walk(asset_dir):
+        dirnames[:] = [d for d in dirnames if os.path.abspath(os.path.join(dirpath, d)) != out_abs]
+
+        for name in filenames:
+            full_path = os.path.join(dirpath, name)
+            path = os.path.relpath(full_path, asset_dir).replace(os.sep, "/")
+
+            if not _is_source(asset_dir, path):
+                continue
+
+            st = os.stat(full_path)
+            settings = _cook_settings(_asset_kind(path), opts)
+            sources[path] = (st.st_mtime_ns, st.st_size)
+
+            entry = manifest.get(path, None)
+            if entry is not None and entry["settings"] == settings and all(os.path.isfile(os.path.join(out_dir, o)) for o in entry["outputs"]):
+                if entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size:
+                    continue
+
+                # touched, but maybe not changed
+                if entry["hash"] == _file_hash(full_path):
+                    entry["mtime_ns"], entry["size"] = st.st_mtime_ns, st.st_size
+                    continue
+
+            todo.append(path)
+
+    # drop the outputs of removed sources
+
+    for path in [p for p in manifest if p not in sources]:
+        for o in manifest.pop(path)["outputs"]:
+            try:
+                os.remove(os.path.join(out_dir, o))
+            except OSError:
+                pass
+
+        print(f"[cook] removed {path}")
+
+    # cook
+
+    failed_count = 0
+    cooked_shaders = []
+
+    os.makedirs(out_dir, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        cook_jobs = {pool.submit(_cook_asset, asset_dir, out_dir, path, opts): path for path in todo}
+
+        for job in as_completed(cook_jobs):
+            path = cook_jobs[job]
+            manifest.pop(path, None)
+
+            try:
+                outputs, bounds = job.result()
+            except Exception as e:
+                print(f"[cook] failed to cook {path}: {e}", file=sys.stderr)
+                failed_count += 1
+                continue
+
+            mtime_ns, size = sources[path]
+            manifest[path] = {"mtime_ns": mtime_ns, "size": size, "hash": _file_hash(os.path.join(asset_dir, path)), "settings": _cook_settings(_asset_kind(path), opts), "outputs": outputs, "bounds": bounds}
+
+            if _asset_kind(path) == "shader":
+                cooked_shaders.append(path)
+
+            print(f"[cook] {path}")
+
+    # failed shaders are still copied (so the error also shows at runtime), but not recorded as cooked
+
+    for path in _validate_shaders(asset_dir, cooked_shaders):
+        print(f"[cook] shader {path} failed to compile", file=sys.stderr)
+
+        manifest.pop(path, None)
+        failed_count += 1
+
+    # write the mesh bounds and the manifest
+
+    mesh_bounds = {p: e["bounds"] for p, e in sorted(manifest.items()) if e.get("bounds", None) is not None}
+
+    with open(os.path.join(out_dir, COOK_BOUNDS_FILE), 'w') as f:
+        json.dump(mesh_bounds, f, indent=1)
+
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+
+    os.replace(tmp_path, manifest_path)
+
+    return (len(todo) - failed_count, len(sources) - len(todo), failed_count)
+
+# usage: python -m cue.cue_cook [asset dir] [out dir] [--force] [--jobs N] [--linear] [--optimize-meshes] [--pack-vertices]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m cue.cue_cook", description="cooks an asset dir into runtime-optimized formats")
+
+    parser.add_argument("asset_dir")
+    parser.add_argument("out_dir")
+    parser.add_argument("--force", action="store_true", help="ignore the manifest and cook everything")
+    parser.add_argument("--jobs", type=int, default=None, help="worker process count (default: cpu count)")
+    parser.add_argument("--linear", action="store_true", help="generate texture mips in linear space instead of srgb")
+    parser.add_argument("--optimize-meshes", action="store_true", help="weld vertices and optimize the vertex cache / fetch order")
+    parser.add_argument("--pack-vertices", action="store_true", help="store meshes with packed vertices (10 bit normals, half float uvs)")
+
+    args = parser.parse_args()
+
+    t = time.perf_counter()
+    cooked_count, skipped_count, failed_count = cook_assets(args.asset_dir, args.out_dir, CookOptions(not args.linear, args.optimize_meshes, args.pack_vertices), args.force, args.jobs)
+
+    print(f"[cook] cooked {cooked_count} assets ({skipped_count} up-to-date, {failed_count} failed) in {time.perf_counter() - t:.2f}s")
+
+    if failed_count:
+        sys.exit(1)
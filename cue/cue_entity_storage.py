@@ -1,6 +1,9 @@
-from .entities.cue_entity_types import EntityTypeRegistry
+import time
 from typing import Any, Callable
 
+from .entities.cue_entity_types import EntityTypeRegistry
+from . import cue_profiler as profiler
+
 # import built-in types
 from .entities import built_in_manifest
 
@@ -31,7 +34,12 @@ class EntityStorage:
 
         en_data.setdefault("bt_en_name", name)
 
+        t = time.perf_counter()
         en_handle = en_type.spawn_call(en_data)
+
+        if profiler.active_profile is not None:
+            profiler.active_profile.record_spawn(type_name, name, time.perf_counter() - t)
+
         self.entity_storage[name] = (type_name, en_handle)
 
         return en_handle
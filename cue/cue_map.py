@@ -1,7 +1,15 @@
-import json, os, time
+import json, os, time, pickle, hashlib, threading
+from dataclasses import dataclass
+from concurrent.futures import Future
+import numpy as np
+
 from .cue_state import GameState
+from . import cue_utils as utils
+from . import cue_assets as assets
+from . import cue_profiler as profiler
 
 from .entities.cue_entity_types import EntityTypeRegistry
+from . import cue_bake as bake
 from pygame.math import Vector3 as Vec3, Vector2 as Vec2
 
 # from .cue_asset_manager import AssetManager
@@ -21,7 +29,12 @@ from pygame.math import Vector3 as Vec3, Vector2 as Vec2
 #         ],
 #         "asset_list": [ // assets which are used in this map file, should be loaded while in a loading screen
 #             "assets/models/big_door.npz",
-#         ]
+#         ],
+#         "bake": { // optional, present only if the map was compiled with a static world bake (see cue_bake.py)
+#             "file": "example.json.cbake",
+#             "key": "<hash of the baked entity data>",
+#             "entities": ["pt_static_wall"], // entities contained in the bake, these are not spawned if the bake is loaded
+#         }
 #     },
 #     "cmf_data": {
 #         "map_entities": [
@@ -58,6 +71,11 @@ map_load_evid = GameState.static_sequencer.create_event("builtin.map_loaded")
 
 def reset_state() -> None:
     GameState.entity_storage.reset()
+
+    if hasattr(GameState, "map_bake"):
+        GameState.map_bake.despawn()
+        del GameState.map_bake
+
     GameState.sequencer.reset(time.perf_counter())
     
     GameState.active_scene.reset()
@@ -82,50 +100,334 @@ def load_en_param_types(en_data: dict) -> dict:
 
     return params
 
+# == Map Cache ==
+
+# parsed maps are cached keyed by the map path, the file mtime and a hash of the file contents. the cached
+# form is a pickle of the already validated and type-converted entity list, this is faster to decode than
+# json and gives each load its own copy of the entity data (entity types are free to mutate their en_data)
+#
+# the same pickle is also saved next to the map file (as `<map file>.cmfc`) so that the cache survives restarts,
+# a cache file is only used when the hash stored in it matches the current map file contents
+#
+# maps in mounted asset packs (see AssetManager.mount_pack) are read from the pack, together with their packed cache
+# file if the pack has one (packs are read-only, so no cache file is written for them)
+
+MAP_CACHE_VERSION = 2
+MAP_CACHE_EXT = ".cmfc"
+
+# disable for read-only map dirs, etc.
+map_disk_cache_enabled = True
+
+@dataclass(slots=True)
+class MapCacheEntry:
+    file_mtime: int
+    file_size: int
+    file_hash: str
+
+    # pickled `tuple[type_list, map_entities, bake_header]`
+    map_blob: bytes
+
+map_cache: dict[str, MapCacheEntry] = {}
+
+def flush_map_cache() -> None:
+    utils.info(f"[map] flushed {len(map_cache)} parsed maps from cache")
+    map_cache.clear()
+
+# returns if [file_path] is a loose map file or a map in one of the mounted packs
+def map_exists(file_path: str) -> bool:
+    if GameState.asset_manager._packed_data(file_path) is not None:
+        return True
+
+    return os.path.exists(os.path.join(GameState.asset_manager.asset_dir, file_path)) or os.path.exists(file_path)
+
+def resolve_map_path(file_path: str) -> str:
+    asset_path = os.path.join(GameState.asset_manager.asset_dir, file_path)
+    if os.path.exists(asset_path):
+        return asset_path
+
+    return file_path
+
+def parse_map_file(map_data: bytes) -> tuple[list[str], list[tuple[str, str, dict]], dict | None]:
+    map_file = json.loads(map_data)
+
+    try:
+        if not MAP_LOADER_VERSION == map_file["cmf_ver"]:
+            raise ValueError(f"Map file version is imcompatible with the current version of Cue! (map file: {map_file['cmf_ver']}; supported: {MAP_LOADER_VERSION})")
+
+        type_list = map_file["cmf_header"]["type_list"]
+        bake_header = map_file["cmf_header"].get("bake", None)
+        entities = [(e[0], e[1], load_en_param_types(e[2])) for e in map_file["cmf_data"]["map_entities"]]
+
+    except KeyError:
+        raise ValueError("corrupted map file, missing json fields")
+
+    return (type_list, entities, bake_header)
+
+def _read_disk_cache(cache_path: str, file_hash: str) -> bytes | None:
+    try:
+        with open(cache_path, 'rb') as f:
+            cache_file = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+    return _check_cache_file(cache_file, file_hash)
+
+def _check_cache_file(cache_file: dict, file_hash: str) -> bytes | None:
+    if cache_file.get("cache_ver") != MAP_CACHE_VERSION or cache_file.get("cmf_ver") != MAP_LOADER_VERSION:
+        return None
+
+    if cache_file.get("file_hash") != file_hash:
+        return None # stale cache, map was changed since
+
+    return cache_file["map_blob"]
+
+def _write_disk_cache(cache_path: str, file_hash: str, map_blob: bytes) -> None:
+    cache_file = {
+        "cache_ver": MAP_CACHE_VERSION,
+        "cmf_ver": MAP_LOADER_VERSION,
+        "file_hash": file_hash,
+        "map_blob": map_blob,
+    }
+
+    # written to a temp file first, the map might be read (and cached) by a prefetch worker at the same time (see _prefetch_map_job)
+    try:
+        tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(cache_file, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        utils.warn(f"[map] failed to write map cache file {cache_path}: {e}")
+
+# reads and parses a map file (or fetches it from the map cache), returns the map type list, the map entities and the map bake header
+# note: the returned entity data is a fresh copy on each call and can be passed directly to spawn
+def read_map(file_path: str) -> tuple[list[str], list[tuple[str, str, dict]], dict | None]:
+    packed_data = GameState.asset_manager._packed_data(file_path)
+    if packed_data is not None:
+        return _read_packed_map(file_path, packed_data)
+
+    full_path = resolve_map_path(file_path)
+    st = os.stat(full_path)
+
+    entry = map_cache.get(full_path, None)
+    if entry is not None and entry.file_mtime == st.st_mtime_ns and entry.file_size == st.st_size:
+        return pickle.loads(entry.map_blob)
+
+    with open(full_path, 'rb') as f:
+        map_data = f.read()
+
+    file_hash = hashlib.sha1(map_data).hexdigest()
+    cache_path = full_path + MAP_CACHE_EXT
+
+    if entry is not None and entry.file_hash == file_hash:
+        # only touched, not changed
+        map_blob = entry.map_blob
+
+    elif map_disk_cache_enabled and (map_blob := _read_disk_cache(cache_path, file_hash)) is not None:
+        pass
+
+    else:
+        map_blob = pickle.dumps(parse_map_file(map_data), protocol=pickle.HIGHEST_PROTOCOL)
+
+        if map_disk_cache_enabled:
+            _write_disk_cache(cache_path, file_hash, map_blob)
+
+    map_cache[full_path] = MapCacheEntry(st.st_mtime_ns, st.st_size, file_hash, map_blob)
+    return pickle.loads(map_blob)
+
+# same as read_map for a map in a mounted pack, with the packed [map_data]
+# note: packed maps are cached by their content hash only, as there's no mtime (another pack with the same map path could be mounted)
+def _read_packed_map(file_path: str, map_data: np.ndarray) -> tuple[list[str], list[tuple[str, str, dict]], dict | None]:
+    file_hash = hashlib.sha1(map_data).hexdigest()
+
+    entry = map_cache.get(file_path, None)
+    if entry is not None and entry.file_hash == file_hash:
+        return pickle.loads(entry.map_blob)
+
+    map_blob = None
+
+    cache_data = GameState.asset_manager._packed_data(file_path + MAP_CACHE_EXT) if map_disk_cache_enabled else None
+    if cache_data is not None:
+        try:
+            map_blob = _check_cache_file(pickle.loads(cache_data), file_hash)
+        except (pickle.UnpicklingError, EOFError):
+            pass
+
+    if map_blob is None:
+        map_blob = pickle.dumps(parse_map_file(bytes(map_data)), protocol=pickle.HIGHEST_PROTOCOL)
+
+    map_cache[file_path] = MapCacheEntry(0, len(map_data), file_hash, map_blob)
+    return pickle.loads(map_blob)
+
+# == Map Prefetching ==
+
+# a map can be prefetched while the current map keeps running (eg. by a bt_map_trigger), this parses the map file
+# (filling the map cache) and decodes all of it's assets on the asset manager's worker threads into it's prefetch staging area.
+# when the map is then loaded, only the gl uploads and the entity spawns are left for the main thread
+#
+# anything prefetched but not used by the next map load is dropped right after it
+
+prefetch_jobs: dict[str, Future] = {}
+
+# returns the assets referenced by the `a_` prefixed entity params of [map_entities] as list[tuple[path, type_name]]
+# [skip_meshes] are names of entities which meshes are not needed (eg. baked entities)
+def collect_map_assets(map_entities: list[tuple[str, str, dict]], skip_meshes=()) -> list[tuple[str, str]]:
+    map_assets = {}
+
+    for name, _, en_data in map_entities:
+        for pn, p in en_data.items():
+            if not pn.startswith("a_") or not isinstance(p, str) or not p:
+                continue
+
+            type_name = assets.guess_asset_type(p)
+            if type_name is None or (type_name == "mesh" and name in skip_meshes):
+                continue
+
+            map_assets[p] = type_name
+
+    return list(map_assets.items())
+
+# converts the assets a map used on it's last load (see AssetDepGraph) into prefetchable list[tuple[path, type_name]]
+def recorded_map_assets(file_path: str) -> list[tuple[str, str]]:
+    type_names = {assets.AssetTypes.TEXTURE_ASSET: "texture", assets.AssetTypes.TEXTURE_LAYER_ASSET: "texture", assets.AssetTypes.MESH_ASSET: "mesh", assets.AssetTypes.AUDIO_ASSET: "audio", assets.AssetTypes.SHADER_ASSET: "shader"}
+    recorded = []
+
+    for asset_type, source_paths in GameState.asset_manager.dep_graph.map_assets.get(file_path, {}).values():
+        if asset_type in type_names:
+            recorded.extend((p, type_names[asset_type]) for p in source_paths)
+
+    return recorded
+
+def _prefetch_map_job(file_path: str, gen: int, recorded_assets: list[tuple[str, str]]) -> None:
+    t = time.perf_counter()
+
+    try:
+        _, map_entities, bake_header = read_map(file_path)
+    except (OSError, ValueError) as e:
+        utils.warn(f"[map] failed to prefetch {file_path}: {e}")
+        return
+
+    baked_entities = bake_header["entities"] if bake_header is not None else ()
+
+    asset_mgr = GameState.asset_manager
+    staged_count = 0
+
+    map_assets = dict(collect_map_assets(map_entities, baked_entities))
+    map_assets.update(recorded_assets)
+
+    for path, type_name in map_assets.items():
+        if asset_mgr.prefetch_asset(path, type_name, gen):
+            staged_count += 1
+
+    utils.info(f"[map] prefetched {file_path} ({staged_count} assets staged) in {(time.perf_counter() - t) * 1000:.2f}ms")
+
+# starts parsing [file_path] and decoding it's assets in the background, safe to call from sequence triggered code
+def prefetch_map(file_path: str) -> None:
+    if file_path in prefetch_jobs or file_path == getattr(GameState, "current_map", None):
+        return
+
+    asset_mgr = GameState.asset_manager
+    asset_mgr.dep_graph.pin_map(file_path)
+
+    # the dep graph is snapshotted here, it's not safe to read from the worker
+    prefetch_jobs[file_path] = asset_mgr.get_worker_pool().submit(_prefetch_map_job, file_path, asset_mgr.prefetch_gen, recorded_map_assets(file_path))
+
+def _drop_prefetched() -> None:
+    for job in prefetch_jobs.values():
+        job.cancel()
+
+    prefetch_jobs.clear()
+    GameState.asset_manager.drop_prefetched()
+
+# == Map Loader ==
+
 # loads and parses a map file into EntityStorage and AssetManager, this function should be called within a "loading screen" context
 # WARN: this function is NOT safe to call from sequence triggered code, as later sequences might operate on the newly loaded map aka UB, use load_map_when_safe in sequence contexts
-def load_map(file_path: str) -> None:    
-    # read the map file
-    
+def load_map(file_path: str) -> None:
+    prof = profiler.begin_map_profile(file_path)
+    t = prof.start_time
+
     try:
-        with open(os.path.join(GameState.asset_manager.asset_dir, file_path), 'r') as f:
-            map_file = json.load(f)
-    except FileNotFoundError:
-        with open(file_path, 'r') as f:
-            map_file = json.load(f)
+        # wait for the map's prefetch (if any), so it's not parsed twice
 
-    reset_state()
-    GameState.static_sequencer.fire_event(map_reset_evid)
+        job = prefetch_jobs.pop(file_path, None)
+        if job is not None:
+            job.result()
+            t = prof.phase("prefetch_wait", t)
 
-    GameState.current_map = file_path
-    if hasattr(GameState, "next_map_deferred"):
-        del GameState.next_map_deferred
+        # read the map file (or get it from the map cache)
+
+        type_list, map_entities, bake_header = read_map(file_path)
+        t = prof.phase("parse", t)
 
-    try:
         # validate map
 
-        if not MAP_LOADER_VERSION == map_file["cmf_ver"]:
-            raise ValueError(f"Map file version is imcompatible with the current version of Cue! (map file: {map_file['cmf_ver']}; supported: {MAP_LOADER_VERSION})")    
+        for et in type_list:
+            if not et in EntityTypeRegistry.entity_types:
+                raise ValueError(f"Map file contains Cue entity types not supprted by the current app! (missing \"{et}\")")
+
+        map_bake = None
+        if bake_header is not None:
+            map_bake = bake.try_load_bake(resolve_map_path(file_path), bake_header)
+
+        t = prof.phase("validate", t)
+
+        # keep assets shared with the previous map cached while it's entities are despawned
+        GameState.asset_manager.pause_eviction()
+
+        reset_state()
+        GameState.static_sequencer.fire_event(map_reset_evid)
+
+        GameState.current_map = file_path
+        if hasattr(GameState, "next_map_deferred"):
+            del GameState.next_map_deferred
+
+        dep_graph = GameState.asset_manager.dep_graph
+        dep_graph.begin_map(file_path)
 
-        for t in map_file["cmf_header"]["type_list"]:
-            if not t in EntityTypeRegistry.entity_types:
-                raise ValueError(f"Map file contains Cue entity types not supprted by the current app! (missing \"{t}\")")
+        t = prof.phase("reset", t)
 
         # load map data into Cue subsystems
 
-        # GameState.asset_manager.preload(map_file["cmf_header"]["asset_list"])
+        if map_bake is not None:
+            GameState.map_bake = map_bake
+            map_bake.spawn()
 
-        for e in map_file["cmf_data"]["map_entities"]:
-            GameState.entity_storage.spawn(e[1], e[0], load_en_param_types(e[2]))
+            baked_entities = map_bake.baked_entities
+            t = prof.phase("bake", t)
+        else:
+            baked_entities = ()
 
-    except KeyError:
-        raise ValueError("corrupted map file, missing json fields")
+        for e in map_entities:
+            if e[0] in baked_entities:
+                continue
+
+            dep_graph.current_entity = e[0]
+            GameState.entity_storage.spawn(e[1], e[0], e[2])
+
+        dep_graph.current_entity = None
+        t = prof.phase("spawn", t)
+
+        dep_graph.unpin_maps()
+        GameState.asset_manager.resume_eviction()
+        GameState.asset_manager.hash_index.save()
+        _drop_prefetched()
+
+        GameState.static_sequencer.fire_event(map_load_evid)
+        prof.phase("load_event", t)
 
-    GameState.static_sequencer.fire_event(map_load_evid)
+    except:
+        GameState.asset_manager.dep_graph.current_entity = None
+        GameState.asset_manager.resume_eviction()
+        profiler.abort_map_profile()
+        raise
+
+    profiler.end_map_profile(prof)
 
 # functions same as load_map, but it's safe to call from a seqencer context
 def load_map_when_safe(file_path: str):
-    if (not os.path.exists(os.path.join(GameState.asset_manager.asset_dir, file_path))) and not os.path.exists(file_path):
+    if not map_exists(file_path):
         raise FileNotFoundError(f"No such file or directory: '{file_path}'")
 
     GameState.next_map_deferred = file_path
@@ -146,8 +448,10 @@ def map_encode_entity_params(param):
     raise TypeError("unsupported data type in entity data")
 
 # saves a map file to disk from an `entity_export`, this function is really only used in the on-cue editor for map compilation
+# if [bake_static] is set, the static world of the map is also baked into a bake file next to the map (see cue_bake.py)
+# and if [bake_pvs_cell_size] is set, a pvs is also computed for the baked static world (see rendering/cue_pvs.py)
 # *warn*: this func will not hesitate to override existing files!
-def compile_map(file_path: str, entity_export: dict[str, tuple[str, dict]]):
+def compile_map(file_path: str, entity_export: dict[str, tuple[str, dict]], bake_static: bool = False, bake_pvs_cell_size: float | None = None):
     # collect all metadata for the `cmf_header`
 
     header_type_list = set()
@@ -155,8 +459,9 @@ def compile_map(file_path: str, entity_export: dict[str, tuple[str, dict]]):
 
     for e in entity_export.values():
         header_type_list.add(e[0])
-        
-        # TODO: collect asset metadata
+
+    for path, _ in collect_map_assets([(name, e[0], e[1]) for name, e in entity_export.items()]):
+        header_asset_list.add(path)
 
     # collect entity data for `cmf_data`
 
@@ -177,6 +482,12 @@ def compile_map(file_path: str, entity_export: dict[str, tuple[str, dict]]):
 
         entities.append((name, e[0], params))
 
+    # bake the static world
+
+    header_bake = None
+    if bake_static:
+        header_bake = bake.bake_map(file_path, entity_export, GameState.asset_manager.asset_dir, bake_pvs_cell_size)
+
     # dump the final json
 
     map_file = {
@@ -190,6 +501,9 @@ def compile_map(file_path: str, entity_export: dict[str, tuple[str, dict]]):
         }
     }
 
+    if header_bake is not None:
+        map_file["cmf_header"]["bake"] = header_bake
+
     with open(file_path, 'w') as f:
         json.dump(map_file, f, indent=4, default=map_encode_entity_params)
 
@@ -0,0 +1,210 @@
+import os, io, struct
+
+import numpy as np
+
+from .rendering.cue_resources import interleave_vertices, pack_vertices, compact_elements, packed_vertex_dtype
+
+# == Cue Raw Mesh Files ==
+
+# `.cmesh` is the uncompressed runtime mesh format, it's memory-mapped on load and the sections are passed straight to
+# glBufferData, so there are no intermediate decompression copies like with `.npz` archives (which are still supported)
+#
+# the file is formated as follows (all little endian):
+#  - 32 byte header: 8 byte magic, uint32 version, uint32 layout, uint32 vertex count, uint32 element count, uint32 section count, uint32 element size
+#  - section table: (offset, byte size) uint64 pairs, offsets are from the file start and aligned to CMESH_ALIGN bytes
+#  - section data
+#
+# with the `CMESH_LAYOUT_STREAMS` layout, the sections are: positions (f32 x3), normals (f32 x3), uvs (f32 x2) and elements
+# with the `CMESH_LAYOUT_INTERLEAVED` layout, the sections are: vertices (pos f32 x3, norm f32 x3, uv f32 x2) and elements
+# with the `CMESH_LAYOUT_PACKED` layout, the sections are: vertices (pos f32 x3, norm 2_10_10_10 snorm, uv f16 x2) and elements
+# an empty elements section means the mesh is not indexed
+#
+# `.npz` meshes can be cooked into a `.cmesh` next to them (as `<mesh path>.cmesh`, see cue_cook), which is then preferred
+# by the AssetManager as long as it's not older than the source
+#
+# elements are u16 (element size 2) for meshes with up to 65536 vertices, u32 (element size 4) otherwise
+# version 1 files have no element size (the header pad bytes) and always use u32 elements
+
+CMESH_MAGIC = b"CUEMESH\0"
+CMESH_VERSION = 2
+CMESH_ALIGN = 16
+CMESH_EXT = ".cmesh"
+
+CMESH_LAYOUT_STREAMS = 0
+CMESH_LAYOUT_INTERLEAVED = 1
+CMESH_LAYOUT_PACKED = 2
+
+cmesh_header = struct.Struct("<8sIIIIII")
+cmesh_section = struct.Struct("<QQ")
+
+def _align(offset: int) -> int:
+    return (offset + CMESH_ALIGN - 1) & ~(CMESH_ALIGN - 1)
+
+# [packed] stores packed vertices (always interleaved, see pack_vertices), which is 20 instead of 32 bytes per vertex
+def write_cmesh(path: str, pos_data: np.ndarray, norm_data: np.ndarray, uv_data: np.ndarray, elem_data: np.ndarray | None = None, interleaved: bool = False, packed: bool = False) -> None:
+    vertex_count = np.size(pos_data) // 3
+    elem_data = compact_elements(elem_data if elem_data is not None else (), vertex_count)
+
+    if packed:
+        layout = CMESH_LAYOUT_PACKED
+        sections = [pack_vertices(pos_data, norm_data, uv_data).view(np.uint8), elem_data]
+    elif interleaved:
+        layout = CMESH_LAYOUT_INTERLEAVED
+        sections = [interleave_vertices(pos_data, norm_data, uv_data), elem_data]
+    else:
+        layout = CMESH_LAYOUT_STREAMS
+        sections = [
+            np.ascontiguousarray(pos_data, dtype=np.float32),
+            np.ascontiguousarray(norm_data, dtype=np.float32),
+            np.ascontiguousarray(uv_data, dtype=np.float32),
+            elem_data,
+        ]
+
+    element_count = elem_data.size
+
+    offset = _align(cmesh_header.size + cmesh_section.size * len(sections))
+    section_table = []
+
+    for s in sections:
+        section_table.append((offset, s.nbytes))
+        offset = _align(offset + s.nbytes)
+
+    with open(path, 'wb') as f:
+        f.write(cmesh_header.pack(CMESH_MAGIC, CMESH_VERSION, layout, vertex_count, element_count, len(sections), elem_data.itemsize))
+
+        for st in section_table:
+            f.write(cmesh_section.pack(*st))
+
+        for (s_offset, _), s in zip(section_table, sections):
+            f.seek(s_offset)
+            f.write(s.tobytes())
+
+        f.truncate(offset)
+
+# memory-maps a mesh file, returns zero-copy views of it's sections as (pos_data, norm_data, uv_data, elem_data | None)
+# note: for interleaved files the vertex streams are strided [vertex_count, n] views of the vertex section, which
+# GPUMesh uploads as is into interleaved meshes (see interleave_vertices)
+# note: for packed files the vertex streams are the fields of the vertex section as a `packed_vertex_dtype` array, with
+# packed normals and half float uvs (see unpack_vertices for float streams)
+def read_cmesh(path: str) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray | None]:
+    return parse_cmesh(np.memmap(path, dtype=np.uint8, mode='r'), path)
+
+# same as read_cmesh, but with the file already in memory as a uint8 array (eg. a slice of an asset pack)
+def parse_cmesh(file_data: np.ndarray, path: str) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray | None]:
+    if len(file_data) < cmesh_header.size:
+        raise ValueError(f"{path} is not a cue mesh file")
+
+    magic, version, layout, vertex_count, element_count, section_count, element_size = cmesh_header.unpack(file_data[:cmesh_header.size])
+
+    if magic != CMESH_MAGIC:
+        raise ValueError(f"{path} is not a cue mesh file")
+
+    if version not in (1, CMESH_VERSION):
+        raise ValueError(f"incompatible mesh file version in {path} (mesh file: {version}; supported: 1 - {CMESH_VERSION})")
+
+    if not (layout == CMESH_LAYOUT_STREAMS and section_count == 4) and not (layout in (CMESH_LAYOUT_INTERLEAVED, CMESH_LAYOUT_PACKED) and section_count == 2):
+        raise ValueError(f"unsupported mesh file layout in {path} (layout: {layout})")
+
+    if version == 1:
+        element_size = 4
+
+    if element_size not in (2, 4):
+        raise ValueError(f"unsupported mesh file element size in {path} (element size: {element_size})")
+
+    elem_dtype = np.uint16 if element_size == 2 else np.uint32
+
+    def section(i: int, dtype: np.dtype) -> np.ndarray:
+        s_offset, s_size = cmesh_section.unpack_from(file_data, cmesh_header.size + cmesh_section.size * i)
+
+        if s_offset + s_size > len(file_data):
+            raise ValueError(f"truncated mesh file {path}")
+
+        return file_data[s_offset:s_offset + s_size].view(dtype)
+
+    if layout == CMESH_LAYOUT_PACKED:
+        verts = section(0, packed_vertex_dtype)
+
+        if len(verts) != vertex_count:
+            raise ValueError(f"corrupted mesh file {path}, vertex count mismatch")
+
+        pos_data = verts["pos"]
+        norm_data = verts["norm"]
+        uv_data = verts["uv"]
+        elem_data = section(1, elem_dtype) if element_count else None
+
+    elif layout == CMESH_LAYOUT_INTERLEAVED:
+        verts = section(0, np.float32)
+
+        if len(verts) != vertex_count * 8:
+            raise ValueError(f"corrupted mesh file {path}, vertex count mismatch")
+
+        verts = verts.reshape((vertex_count, 8))
+
+        pos_data = verts[:, 0:3]
+        norm_data = verts[:, 3:6]
+        uv_data = verts[:, 6:8]
+        elem_data = section(1, elem_dtype) if element_count else None
+
+    else:
+        pos_data = section(0, np.float32)
+        norm_data = section(1, np.float32)
+        uv_data = section(2, np.float32)
+        elem_data = section(3, elem_dtype) if element_count else None
+
+        if len(pos_data) != vertex_count * 3:
+            raise ValueError(f"corrupted mesh file {path}, vertex count mismatch")
+
+    return (pos_data, norm_data, uv_data, elem_data)
+
+# returns the cooked file of a source mesh if it's usable (exists and is not older than the source)
+def cooked_path_for(src_path: str) -> str | None:
+    cooked_path = src_path + CMESH_EXT
+
+    try:
+        cooked_mtime = os.stat(cooked_path).st_mtime_ns
+    except OSError:
+        return None
+
+    try:
+        if os.stat(src_path).st_mtime_ns > cooked_mtime:
+            return None # stale
+    except OSError:
+        pass # no source, only the cooked file is shipped
+
+    return cooked_path
+
+# returns the (min, max) corners of the axis aligned bounding box of [pos_data]
+def mesh_bounds(pos_data: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    pos = np.asarray(pos_data, dtype=np.float32).reshape((-1, 3))
+
+    if not len(pos):
+        return (np.zeros(3, dtype=np.float32), np.zeros(3, dtype=np.float32))
+
+    return (pos.min(axis=0), pos.max(axis=0))
+
+# loads the mesh data of a `.cmesh` (memory-mapped) or a legacy `.npz` mesh file
+def read_mesh_file(path: str) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray | None]:
+    if path.endswith(CMESH_EXT):
+        return read_cmesh(path)
+
+    return _read_npz(path)
+
+# same as read_mesh_file, but with the file already in memory as a uint8 array (eg. a slice of an asset pack)
+def parse_mesh_file(file_data: np.ndarray, path: str) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray | None]:
+    if path.endswith(CMESH_EXT):
+        return parse_cmesh(file_data, path)
+
+    return _read_npz(io.BytesIO(file_data))
+
+def _read_npz(file: 'str | io.BytesIO') -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray | None]:
+    with np.load(file) as mesh_data:
+        pos_data = mesh_data["vert_data"]
+        norm_data = mesh_data["norm_data"]
+        uv_data = mesh_data["uv_data"]
+
+        if "elem_data" in mesh_data:
+            elem_data = mesh_data["elem_data"]
+        else:
+            elem_data = None
+
+    return (pos_data, norm_data, uv_data, elem_data)
@@ -0,0 +1,181 @@
+from collections import deque
+
+import numpy as np
+
+from .rendering.cue_resources import interleave_vertices
+
+# == Cue Mesh Optimizer ==
+
+# offline mesh optimization passes, run by the model importer before a mesh is saved:
+#  - vertex welding: merges bit-identical vertices (assimp emits a vertex per face corner for most formats)
+#  - vertex cache optimization: reorders triangles with Tom Forsyth's linear-speed algorithm, so vertices shared
+#    between nearby triangles are still in the gpu's post-transform cache when reused
+#  - vertex fetch optimization: reorders vertices by first use in the (reordered) index buffer, so vertex fetches
+#    walk the vertex buffer roughly linearly
+#
+# the passes run on numpy arrays (pos_data, norm_data, uv_data, elem_data) as used by the mesh files and GPUMesh
+
+# == metrics ==
+
+# average cache miss ratio (transformed vertices per triangle) of [elem_data] with a fifo post-transform cache of [cache_size]
+# entries, 0.5 is the theoretical optimum for large regular grids and 3.0 the worst case (no reuse at all)
+def acmr(elem_data: np.ndarray, cache_size: int = 16) -> float:
+    tri_count = len(elem_data) // 3
+    if tri_count == 0:
+        return 0.
+
+    cache = deque()
+    in_cache = set()
+    misses = 0
+
+    for v in elem_data.tolist():
+        if v in in_cache:
+            continue
+
+        misses += 1
+        cache.append(v)
+        in_cache.add(v)
+
+        if len(cache) > cache_size:
+            in_cache.discard(cache.popleft())
+
+    return misses / tri_count
+
+# == vertex welding ==
+
+# merges identical vertices, returns the welded (pos_data, norm_data, uv_data, elem_data) with flat float32 streams
+def weld_vertices(pos_data: np.ndarray, norm_data: np.ndarray, uv_data: np.ndarray, elem_data: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    verts = np.ascontiguousarray(interleave_vertices(pos_data, norm_data, uv_data))
+
+    # compare whole vertices as raw bytes (note: -0. and 0. are not merged, which only costs a duplicate vertex)
+    vert_keys = verts.view(np.dtype((np.void, verts.dtype.itemsize * verts.shape[1]))).ravel()
+    _, first_index, remap = np.unique(vert_keys, return_index=True, return_inverse=True)
+
+    welded = verts[first_index]
+    elem_data = remap.reshape(-1)[np.asarray(elem_data, dtype=np.int64)].astype(np.uint32)
+
+    return (welded[:, 0:3].flatten(), welded[:, 3:6].flatten(), welded[:, 6:8].flatten(), elem_data)
+
+# == vertex cache optimization ==
+
+FORSYTH_CACHE_SIZE = 32
+
+_CACHE_DECAY_POWER = 1.5
+_LAST_TRI_SCORE = .75
+_VALENCE_BOOST_SCALE = 2.
+_VALENCE_BOOST_POWER = .5
+
+def _cache_score_table() -> list[float]:
+    scores = []
+
+    for cache_pos in range(FORSYTH_CACHE_SIZE):
+        if cache_pos < 3:
+            scores.append(_LAST_TRI_SCORE) # the last triangle's vertices get a fixed score, so the same tri isn't favored forever
+        else:
+            scores.append((1. - (cache_pos - 3) / (FORSYTH_CACHE_SIZE - 3)) ** _CACHE_DECAY_POWER)
+
+    return scores + [0.] # cache_pos -1 (not in cache) indexes the last item
+
+# reorders the triangles of [elem_data] for post-transform vertex cache locality (Tom Forsyth's algorithm), returns the new elem_data
+#
+# each vertex is scored by it's position in a simulated lru cache and by the number of triangles still using it (vertices
+# with few remaining triangles are boosted, so they're finished off instead of leaving stray triangles behind), the next
+# triangle emitted is always the highest scoring one among the triangles of the cached vertices
+def optimize_vertex_cache(elem_data: np.ndarray, vertex_count: int) -> np.ndarray:
+    tri_count = len(elem_data) // 3
+    if tri_count == 0:
+        return np.asarray(elem_data, dtype=np.uint32)
+
+    elem = np.asarray(elem_data, dtype=np.int64)
+
+    # vertex -> triangle adjacency as a csr array
+
+    valence = np.bincount(elem, minlength=vertex_count)
+    adj_offsets = np.concatenate(([0], np.cumsum(valence))).tolist()
+    adj_tris = (np.argsort(elem, kind='stable') // 3).tolist()
+
+    tris = elem.reshape((-1, 3)).tolist()
+
+    cache_scores = _cache_score_table()
+    valence_scores = [0.] + [_VALENCE_BOOST_SCALE * v ** -_VALENCE_BOOST_POWER for v in range(1, int(valence.max()) + 1)]
+
+    live_tris = valence.tolist()
+    vert_scores = [valence_scores[v] for v in live_tris]
+    tri_added = [False] * tri_count
+
+    cache = []
+    out = []
+
+    best_tri = max(range(tri_count), key=lambda t: sum(vert_scores[v] for v in tris[t]))
+    scan_cursor = 0
+
+    for _ in range(tri_count):
+        if best_tri < 0:
+            # nothing left around the cache, continue from the next unused triangle in input order
+            while tri_added[scan_cursor]:
+                scan_cursor += 1
+
+            best_tri = scan_cursor
+
+        tri = tris[best_tri]
+        tri_added[best_tri] = True
+        out.append(tri)
+
+        for v in tri:
+            live_tris[v] -= 1
+
+        # move the triangle's vertices to the front of the cache
+
+        new_cache = list(tri) + [v for v in cache if v not in tri]
+        for v in new_cache[FORSYTH_CACHE_SIZE:]:
+            vert_scores[v] = valence_scores[live_tris[v]] if live_tris[v] else -1.
+
+        cache = new_cache[:FORSYTH_CACHE_SIZE]
+        for i, v in enumerate(cache):
+            vert_scores[v] = cache_scores[i] + valence_scores[live_tris[v]] if live_tris[v] else -1.
+
+        # rescore the triangles of the touched vertices and pick the best one
+
+        best_tri, best_score = -1, -1.
+
+        for v in new_cache:
+            for i in range(adj_offsets[v], adj_offsets[v + 1]):
+                t = adj_tris[i]
+                if tri_added[t]:
+                    continue
+
+                a, b, c = tris[t]
+                score = vert_scores[a] + vert_scores[b] + vert_scores[c]
+                if score > best_score:
+                    best_tri, best_score = t, score
+
+    return np.array(out, dtype=np.uint32).reshape(-1)
+
+# == vertex fetch optimization ==
+
+# reorders the vertices by their first use in [elem_data] (dropping unused vertices), returns the new (pos_data, norm_data, uv_data, elem_data)
+def optimize_vertex_fetch(pos_data: np.ndarray, norm_data: np.ndarray, uv_data: np.ndarray, elem_data: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    verts = interleave_vertices(pos_data, norm_data, uv_data)
+    elem = np.asarray(elem_data, dtype=np.int64)
+
+    used, first_use = np.unique(elem, return_index=True)
+    fetch_order = used[np.argsort(first_use)]
+
+    remap = np.empty(len(verts), dtype=np.int64)
+    remap[fetch_order] = np.arange(len(fetch_order))
+
+    reordered = verts[fetch_order]
+    return (reordered[:, 0:3].flatten(), reordered[:, 3:6].flatten(), reordered[:, 6:8].flatten(), remap[elem].astype(np.uint32))
+
+# runs all passes, returns the optimized (pos_data, norm_data, uv_data, elem_data) and a dict of before / after stats
+def optimize_mesh(pos_data: np.ndarray, norm_data: np.ndarray, uv_data: np.ndarray, elem_data: np.ndarray) -> tuple[tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray], dict]:
+    stats = {"vertex_count_before": np.size(pos_data) // 3, "acmr_before": acmr(elem_data)}
+
+    pos_data, norm_data, uv_data, elem_data = weld_vertices(pos_data, norm_data, uv_data, elem_data)
+    elem_data = optimize_vertex_cache(elem_data, np.size(pos_data) // 3)
+    pos_data, norm_data, uv_data, elem_data = optimize_vertex_fetch(pos_data, norm_data, uv_data, elem_data)
+
+    stats["vertex_count_after"] = np.size(pos_data) // 3
+    stats["acmr_after"] = acmr(elem_data)
+
+    return ((pos_data, norm_data, uv_data, elem_data), stats)
@@ -0,0 +1,165 @@
+import os, sys, struct, time, bisect
+from typing import Callable
+
+import numpy as np
+
+# == Cue Asset Packs ==
+
+# a `.cpak` asset pack stores a whole asset dir in a single file, it's memory-mapped when mounted (see AssetManager.mount_pack)
+# and all asset loaders are served zero-copy slices of it, so a shipping build does a single open() instead of one per asset
+#
+# the file is formated as follows (all little endian):
+#  - 24 byte header: 8 byte magic, uint32 version, uint32 entry count, uint64 data start
+#  - entry table sorted by path: (data offset, data size, path offset, path length, type) uint64, uint64, uint32, uint32, uint32 + 4 pad bytes per entry
+#  - path strings (utf-8, '/' separated, relative to the asset dir), path offsets are relative to the end of the entry table
+#  - asset data, each aligned to PACK_ALIGN bytes, data offsets are from the file start
+
+PACK_MAGIC = b"CUEPAK\0\0"
+PACK_VERSION = 1
+PACK_ALIGN = 16
+PACK_EXT = ".cpak"
+
+pack_header = struct.Struct("<8sIIQ")
+pack_entry = struct.Struct("<QQIII4x")
+
+# asset type names stored in the entry types (by index)
+pack_entry_types = ("", "audio", "texture", "mesh", "shader", "cooked_texture", "map")
+
+def _align(offset: int) -> int:
+    return (offset + PACK_ALIGN - 1) & ~(PACK_ALIGN - 1)
+
+class AssetPack:
+    def __init__(self, pack_path: str) -> None:
+        self.pack_path = pack_path
+        self.pack_data = np.memmap(pack_path, dtype=np.uint8, mode='r')
+
+        if len(self.pack_data) < pack_header.size:
+            raise ValueError(f"{pack_path} is not a cue asset pack")
+
+        magic, version, entry_count, _ = pack_header.unpack(self.pack_data[:pack_header.size])
+
+        if magic != PACK_MAGIC:
+            raise ValueError(f"{pack_path} is not a cue asset pack")
+
+        if version != PACK_VERSION:
+            raise ValueError(f"incompatible asset pack version in {pack_path} (pack file: {version}; supported: {PACK_VERSION})")
+
+        # decode the index, the paths are kept sorted for bisect lookups
+
+        table_end = pack_header.size + pack_entry.size * entry_count
+        self.entries = [pack_entry.unpack_from(self.pack_data, pack_header.size + pack_entry.size * i) for i in range(entry_count)]
+        self.paths = [bytes(self.pack_data[table_end + e[2]:table_end + e[2] + e[3]]).decode("utf-8") for e in self.entries]
+
+    def find(self, path: str) -> tuple[int, int, str] | None:
+        i = bisect.bisect_left(self.paths, path)
+        if i == len(self.paths) or self.paths[i] != path:
+            return None
+
+        offset, size, _, _, type_id = self.entries[i]
+        return (offset, size, pack_entry_types[type_id] if type_id < len(pack_entry_types) else "")
+
+    # returns a zero-copy view of the packed file data, or None if [path] is not in this pack
+    def read(self, path: str) -> np.ndarray | None:
+        entry = self.find(path)
+        if entry is None:
+            return None
+
+        return self.pack_data[entry[0]:entry[0] + entry[1]]
+
+    # lists the packed paths under [prefix] (eg. "textures/")
+    def list_paths(self, prefix: str = "") -> list[str]:
+        start = bisect.bisect_left(self.paths, prefix)
+        end = start
+
+        while end < len(self.paths) and self.paths[end].startswith(prefix):
+            end += 1
+
+        return self.paths[start:end]
+
+    pack_path: str
+    pack_data: np.ndarray
+
+    entries: list[tuple[int, int, int, int, int]] # list[tuple[data_offset, data_size, path_offset, path_len, type_id]]
+    paths: list[str]
+
+# == pack builder ==
+
+# packs all files under [asset_dir] into [pack_path], [type_of] maps a path to one of `pack_entry_types` (or "" for unknown)
+# files for which [include] returns False are skipped
+def build_pack(asset_dir: str, pack_path: str, type_of: Callable[[str], str], include: Callable[[str], bool] | None = None) -> int:
+    files = []
+
+    for dirpath, _, filenames in os.walk(asset_dir):
+        for name in filenames:
+            full_path = os.path.join(dirpath, name)
+            path = os.path.relpath(full_path, asset_dir).replace(os.sep, "/")
+
+            if os.path.abspath(full_path) == os.path.abspath(pack_path) or (include is not None and not include(path)):
+                continue
+
+            files.append((path, full_path))
+
+    files.sort(key=lambda f: f[0])
+
+    path_blob = b"".join(f[0].encode("utf-8") for f in files)
+    data_start = _align(pack_header.size + pack_entry.size * len(files) + len(path_blob))
+
+    with open(pack_path, 'wb') as f:
+        f.write(pack_header.pack(PACK_MAGIC, PACK_VERSION, len(files), data_start))
+
+        # write the data first, so the index can be filled in with the final offsets
+
+        entries = []
+        path_offset = 0
+        data_offset = data_start
+
+        for path, full_path in files:
+            with open(full_path, 'rb') as src:
+                data = src.read()
+
+            f.seek(data_offset)
+            f.write(data)
+
+            path_len = len(path.encode("utf-8"))
+            type_name = type_of(path)
+
+            entries.append(pack_entry.pack(data_offset, len(data), path_offset, path_len, pack_entry_types.index(type_name) if type_name in pack_entry_types else 0))
+
+            path_offset += path_len
+            data_offset = _align(data_offset + len(data))
+
+        f.truncate(data_offset)
+
+        f.seek(pack_header.size)
+        f.write(b"".join(entries))
+        f.write(path_blob)
+
+    return len(files)
+
+# usage: python -m cue.cue_pack [asset dir] [pack path (default: <asset dir>.cpak)]
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python -m cue.cue_pack [asset dir] [pack path]", file=sys.stderr)
+        sys.exit(1)
+
+    from .cue_assets import guess_asset_type, PROGRAM_CACHE_DIR
+    from .cue_asset_index import ASSET_HASH_INDEX
+    from .cue_cook import COOK_MANIFEST
+    from . import cue_texture_file as tex_file
+
+    def pack_type_of(path: str) -> str:
+        if path.endswith(tex_file.CTEX_EXT):
+            return "cooked_texture"
+
+        if path.endswith(".json"):
+            return "map"
+
+        return guess_asset_type(path) or ""
+
+    asset_dir = sys.argv[1].rstrip("/\\")
+    pack_path = sys.argv[2] if len(sys.argv) > 2 else asset_dir + PACK_EXT
+
+    t = time.perf_counter()
+    file_count = build_pack(asset_dir, pack_path, pack_type_of, lambda p: not p.startswith(PROGRAM_CACHE_DIR + "/") and p not in (ASSET_HASH_INDEX, COOK_MANIFEST))
+
+    print(f"[pack] packed {file_count} files into {pack_path} ({os.path.getsize(pack_path) / (1024 * 1024):.2f} MiB) in {time.perf_counter() - t:.2f}s")
@@ -0,0 +1,149 @@
+import json, os, time
+from dataclasses import dataclass
+
+from . import cue_utils as utils
+
+# == Cue Load Profiler ==
+
+# records where the time goes while loading a map (map parsing, validation, state reset, entity spawns and asset loads)
+#
+# every map load is profiled (the overhead is only a few perf_counter calls), the last profile is kept in `last_map_profile`
+# a full report is emitted to the dev console and to a json file only when requested with `report_next_load` (see the `map_profile` dev command)
+
+@dataclass(slots=True)
+class SpawnStats:
+    spawn_count: int = 0
+    total_time: float = 0.
+
+    max_time: float = 0.
+    max_name: str = ""
+
+class LoadProfile:
+    def __init__(self, map_path: str) -> None:
+        self.map_path = map_path
+        self.start_time = time.perf_counter()
+        self.total_time = 0.
+
+        self.phases = {}
+        self.spawn_stats = {}
+        self.asset_loads = []
+
+    # == record api ==
+
+    # records a phase which started at [t], returns the current time so phases can be chained
+    def phase(self, name: str, t: float) -> float:
+        now = time.perf_counter()
+        self.phases[name] = self.phases.get(name, 0.) + (now - t)
+
+        return now
+
+    def record_spawn(self, type_name: str, en_name: str, dt: float) -> None:
+        stats = self.spawn_stats.get(type_name, None)
+        if stats is None:
+            stats = SpawnStats()
+            self.spawn_stats[type_name] = stats
+
+        stats.spawn_count += 1
+        stats.total_time += dt
+
+        if dt > stats.max_time:
+            stats.max_time = dt
+            stats.max_name = en_name
+
+    def record_asset(self, type_name: str, path: str, dt: float) -> None:
+        self.asset_loads.append((type_name, path, dt))
+
+    # == report api ==
+
+    def report(self, top_asset_count: int = 10) -> None:
+        utils.info(f"[profiler] map load profile of {self.map_path} (total: {self.total_time * 1000:.2f}ms)")
+
+        utils.info("[profiler]  phases:")
+        for name, dt in self.phases.items():
+            utils.info(f"[profiler]   {name:<12} {dt * 1000:9.2f}ms")
+
+        utils.info("[profiler]  entity spawns (by total time):")
+        for type_name, s in sorted(self.spawn_stats.items(), key=lambda s: s[1].total_time, reverse=True):
+            utils.info(f"[profiler]   {type_name:<24} x{s.spawn_count:<5} total: {s.total_time * 1000:9.2f}ms  max: {s.max_time * 1000:8.2f}ms ({s.max_name})")
+
+        asset_total = sum(a[2] for a in self.asset_loads)
+        utils.info(f"[profiler]  asset loads (slowest {min(top_asset_count, len(self.asset_loads))} of {len(self.asset_loads)}, total: {asset_total * 1000:.2f}ms):")
+        for type_name, path, dt in sorted(self.asset_loads, key=lambda a: a[2], reverse=True)[:top_asset_count]:
+            utils.info(f"[profiler]   {type_name:<8} {dt * 1000:9.2f}ms  {path}")
+
+    def to_json(self) -> dict:
+        return {
+            "map_path": self.map_path,
+            "total_ms": self.total_time * 1000,
+            "phases_ms": {name: dt * 1000 for name, dt in self.phases.items()},
+            "entity_spawns": {
+                type_name: {
+                    "count": s.spawn_count,
+                    "total_ms": s.total_time * 1000,
+                    "max_ms": s.max_time * 1000,
+                    "max_entity": s.max_name,
+                } for type_name, s in self.spawn_stats.items()
+            },
+            "asset_loads": [{"type": a[0], "path": a[1], "ms": a[2] * 1000} for a in self.asset_loads],
+        }
+
+    def dump_json(self, path: str) -> None:
+        with open(path, 'w') as f:
+            json.dump(self.to_json(), f, indent=4)
+
+    map_path: str
+    start_time: float
+    total_time: float
+
+    phases: dict[str, float] # dict[phase_name, total_time]
+    spawn_stats: dict[str, SpawnStats] # dict[type_name, stats]
+    asset_loads: list[tuple[str, str, float]] # list[tuple[asset_type_name, path, load_time]]
+
+# == global profiler state ==
+
+active_profile: LoadProfile | None = None
+last_map_profile: LoadProfile | None = None
+
+# if set, the next finished map load will be reported to the dev console and dumped into a json file,
+# it's cleared by the next map load either way (a failed load doesn't carry it over to a later one)
+report_next_load: bool = False
+
+def begin_map_profile(map_path: str) -> LoadProfile:
+    global active_profile
+
+    active_profile = LoadProfile(map_path)
+    return active_profile
+
+def end_map_profile(prof: LoadProfile) -> None:
+    global active_profile, last_map_profile, report_next_load
+
+    prof.total_time = time.perf_counter() - prof.start_time
+
+    active_profile = None
+    last_map_profile = prof
+
+    report, report_next_load = report_next_load, False
+
+    utils.info(f"[map] loaded {prof.map_path} in {prof.total_time * 1000:.2f}ms")
+
+    if report:
+        prof.report()
+
+        json_path = os.path.splitext(os.path.basename(prof.map_path))[0] + "_load_profile.json"
+        try:
+            prof.dump_json(json_path)
+            utils.info(f"[profiler] map load profile saved to {json_path}")
+        except OSError as e:
+            utils.error(f"[profiler] failed to save map load profile to {json_path}: {e}")
+
+# drops the active profile without reporting it, used when a map load fails
+def abort_map_profile() -> None:
+    global active_profile, report_next_load
+
+    active_profile = None
+    report_next_load = False
+
+# records an asset load into the active profile (if a map is being loaded)
+def record_asset(type_name: str, path: str, dt: float) -> None:
+    if active_profile is not None:
+        active_profile.record_asset(type_name, path, dt)
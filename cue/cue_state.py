@@ -7,6 +7,7 @@ if TYPE_CHECKING:
     from .rendering import cue_renderer as ren, cue_scene as ren_sc, cue_camera as ren_cam
     from . import cue_sequence as seq, cue_entity_storage as en, cue_assets as ast
     from .phys import cue_phys_scene as phys
+    from . import cue_bake as bake
 
 # == Cue Game State ==
 
@@ -30,6 +31,9 @@ class GameState:
     collider_scene: 'phys.PhysScene'
     trigger_scene: 'phys.PhysScene'
 
+    # the static world bake of the current map (only present if the map was baked)
+    map_bake: 'bake.MapBake'
+
     # == global vars ==
 
     delta_time: float
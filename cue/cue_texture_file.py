@@ -0,0 +1,201 @@
+import os, sys, struct, time
+from dataclasses import dataclass
+
+import numpy as np
+import pygame as pg
+
+# == Cue Cooked Texture Files ==
+
+# `.ctex` is the cooked runtime texture format, it contains the full mip chain of a texture already in an upload-ready
+# layout (rgba8, rows in the same order as GPUTexture.write_to uploads them), so loading a texture is just a memory-map
+# and a glTexImage2D per level, with no image decoding and no runtime mip generation
+#
+# cooked files are written next to their source image (as `<image path>.ctex`) by the texture cooker and are preferred by
+# AssetManager.load_texture as long as they're not older than the source (a missing source is fine, eg. in shipped builds)
+#
+# the file is formated as follows (all little endian):
+#  - 32 byte header: 8 byte magic, uint32 version, uint32 pixel format, uint32 width, uint32 height, uint32 level count, 4 pad bytes
+#  - level table: (offset, byte size, width, height) uint64, uint64, uint32, uint32 per mip level, offsets are from the file start
+#  - level data, each aligned to CTEX_ALIGN bytes
+
+CTEX_MAGIC = b"CUETEX\0\0"
+CTEX_VERSION = 1
+CTEX_ALIGN = 16
+CTEX_EXT = ".ctex"
+
+CTEX_FORMAT_RGBA8 = 0
+
+ctex_header = struct.Struct("<8sIIIII4x")
+ctex_level = struct.Struct("<QQII")
+
+# source image formats picked up by the cooker
+cook_source_exts = (".png", ".jpg", ".jpeg", ".bmp", ".tga")
+
+def _align(offset: int) -> int:
+    return (offset + CTEX_ALIGN - 1) & ~(CTEX_ALIGN - 1)
+
+@dataclass(slots=True)
+class CookedTexture:
+    width: int
+    height: int
+
+    # rgba8 pixel data of each mip level, [height, width, 4] views into the memory-mapped file
+    levels: list[np.ndarray]
+
+# == mip generation ==
+
+# halves one axis with a box filter, odd sizes fold the leftover row / column into the last texel so the level sizes match gl's floor(size / 2)
+def _halve_axis(img: np.ndarray, axis: int) -> np.ndarray:
+    size = img.shape[axis]
+    if size == 1:
+        return img
+
+    half = size // 2
+
+    even = np.take(img, np.arange(half * 2), axis=axis)
+    out = even.reshape(img.shape[:axis] + (half, 2) + img.shape[axis + 1:]).mean(axis=axis + 1)
+
+    if size % 2:
+        last = [slice(None)] * img.ndim
+        last[axis] = slice(half - 1, half)
+
+        extra = np.take(img, [size - 1], axis=axis)
+        out[tuple(last)] = (out[tuple(last)] * 2 + extra) / 3
+
+    return out
+
+# generates the full mip chain of [rgba] ([height, width, 4] uint8), averaging in linear space if [srgb] (alpha is always linear)
+def gen_mip_chain(rgba: np.ndarray, srgb: bool = True) -> list[np.ndarray]:
+    levels = [np.ascontiguousarray(rgba, dtype=np.uint8)]
+
+    img = rgba.astype(np.float32) / 255.
+    if srgb:
+        img[..., :3] **= 2.2
+
+    while img.shape[0] > 1 or img.shape[1] > 1:
+        img = _halve_axis(_halve_axis(img, 0), 1)
+
+        level = img.copy()
+        if srgb:
+            level[..., :3] **= 1. / 2.2
+
+        levels.append(np.clip(level * 255. + .5, 0., 255.).astype(np.uint8))
+
+    return levels
+
+# == file io ==
+
+def write_ctex(path: str, levels: list[np.ndarray]) -> None:
+    height, width = levels[0].shape[:2]
+
+    offset = _align(ctex_header.size + ctex_level.size * len(levels))
+    level_table = []
+
+    for l in levels:
+        level_table.append((offset, l.nbytes, l.shape[1], l.shape[0]))
+        offset = _align(offset + l.nbytes)
+
+    with open(path, 'wb') as f:
+        f.write(ctex_header.pack(CTEX_MAGIC, CTEX_VERSION, CTEX_FORMAT_RGBA8, width, height, len(levels)))
+
+        for lt in level_table:
+            f.write(ctex_level.pack(*lt))
+
+        for lt, l in zip(level_table, levels):
+            f.seek(lt[0])
+            f.write(np.ascontiguousarray(l).tobytes())
+
+        f.truncate(offset)
+
+def read_ctex(path: str) -> CookedTexture:
+    return parse_ctex(np.memmap(path, dtype=np.uint8, mode='r'), path)
+
+# same as read_ctex, but with the file already in memory as a uint8 array (eg. a slice of an asset pack)
+def parse_ctex(file_data: np.ndarray, path: str) -> CookedTexture:
+    if len(file_data) < ctex_header.size:
+        raise ValueError(f"{path} is not a cooked cue texture")
+
+    magic, version, pixel_format, width, height, level_count = ctex_header.unpack(file_data[:ctex_header.size])
+
+    if magic != CTEX_MAGIC:
+        raise ValueError(f"{path} is not a cooked cue texture")
+
+    if version != CTEX_VERSION:
+        raise ValueError(f"incompatible cooked texture version in {path} (texture file: {version}; supported: {CTEX_VERSION})")
+
+    if pixel_format != CTEX_FORMAT_RGBA8:
+        raise ValueError(f"unsupported cooked texture format in {path} (format: {pixel_format})")
+
+    levels = []
+
+    for i in range(level_count):
+        l_offset, l_size, l_width, l_height = ctex_level.unpack_from(file_data, ctex_header.size + ctex_level.size * i)
+
+        if l_size != l_width * l_height * 4 or l_offset + l_size > len(file_data):
+            raise ValueError(f"corrupted cooked texture {path}")
+
+        levels.append(file_data[l_offset:l_offset + l_size].reshape((l_height, l_width, 4)))
+
+    return CookedTexture(width, height, levels)
+
+# returns the cooked file of a source image if it's usable (exists and is not older than the source)
+def cooked_path_for(src_path: str) -> str | None:
+    cooked_path = src_path + CTEX_EXT
+
+    try:
+        cooked_mtime = os.stat(cooked_path).st_mtime_ns
+    except OSError:
+        return None
+
+    try:
+        if os.stat(src_path).st_mtime_ns > cooked_mtime:
+            return None # stale
+    except OSError:
+        pass # no source, only the cooked file is shipped
+
+    return cooked_path
+
+# == texture cooker ==
+
+def cook_texture(src_path: str, dst_path: str | None = None, srgb: bool = True) -> None:
+    surf = pg.image.load(src_path)
+    rgba = np.frombuffer(pg.image.tobytes(surf, "RGBA", False), dtype=np.uint8).reshape((surf.get_height(), surf.get_width(), 4))
+
+    write_ctex(dst_path if dst_path is not None else src_path + CTEX_EXT, gen_mip_chain(rgba, srgb))
+
+# cooks all source images under [asset_dir] which don't have an up-to-date cooked file, returns (cooked count, skipped count)
+def cook_dir(asset_dir: str, force: bool = False) -> tuple[int, int]:
+    cooked_count, skipped_count = 0, 0
+
+    for dirpath, _, filenames in os.walk(asset_dir):
+        for name in filenames:
+            if not name.lower().endswith(cook_source_exts):
+                continue
+
+            src_path = os.path.join(dirpath, name)
+
+            if not force and cooked_path_for(src_path) is not None:
+                skipped_count += 1
+                continue
+
+            try:
+                cook_texture(src_path)
+                cooked_count += 1
+
+                print(f"[cook] {os.path.relpath(src_path, asset_dir)}")
+
+            except (OSError, ValueError, pg.error) as e:
+                print(f"[cook] failed to cook {src_path}: {e}", file=sys.stderr)
+
+    return (cooked_count, skipped_count)
+
+# usage: python -m cue.cue_texture_file [asset dir] [--force]
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python -m cue.cue_texture_file [asset dir] [--force]", file=sys.stderr)
+        sys.exit(1)
+
+    t = time.perf_counter()
+    cooked_count, skipped_count = cook_dir(sys.argv[1], "--force" in sys.argv[2:])
+
+    print(f"[cook] cooked {cooked_count} textures ({skipped_count} up-to-date) in {time.perf_counter() - t:.2f}s")
@@ -209,4 +209,6 @@ def show_perf_overlay(corner: int = 0):
 
         imgui.spacing(); imgui.spacing()
 
-        imgui.text(f"Draw call count: {GameState.renderer.draw_call_count}")
\ No newline at end of file
+        imgui.text(f"Draw call count: {GameState.renderer.draw_call_count}")
+        imgui.text(f"Retained draw count: {GameState.renderer.retained_draw_count}")
+        imgui.text(f"Visible / culled instances: {GameState.renderer.visible_instance_count} / {GameState.renderer.culled_instance_count}")
\ No newline at end of file
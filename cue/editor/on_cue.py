@@ -23,11 +23,15 @@ from ..im2d.imgui_integ import CueImguiContext
 
 from .. import cue_utils as utils
 from .. import cue_cmds
+from ..cue_asset_watcher import asset_watcher
+from ..cue_asset_stats import asset_stats
 from ..rendering import cue_resources as res
 from ..rendering import cue_batch as bat
 from ..rendering import cue_gizmos as gizmo
 
 from .. import cue_map as map
+from .. import cue_mesh_file as mesh_file
+from .. import cue_mesh_opt as mesh_opt
 from .. import cue_sequence as seq
 
 from ..components.cue_freecam import FreecamController
@@ -75,6 +79,7 @@ class EditorState:
     is_collider_tool_open: bool = False
 
     is_perf_overlay_open: bool = False
+    is_asset_stats_open: bool = False
     is_dev_con_open: bool = False
 
     on_ensure_saved_success: Callable[[], None] | None = None
@@ -91,6 +96,10 @@ class EditorState:
     assimp_sel_mesh: int = 0
     assimp_mesh_scale: np.ndarray = np.array([1., 1., 1.], dtype=np.float32)
     assimp_saved_msg: str | None = None
+    assimp_export_cmesh: bool = True
+    assimp_optimize_mesh: bool = True
+    assimp_pack_vertices: bool = True
+    assimp_opt_stats: dict | None = None
 
     # == tool states ==
 
@@ -107,6 +116,13 @@ class EditorState:
     map_file_path: str | None = None
     has_unsaved_changes: bool = False
 
+    # bake the static world (static meshes and aabb colliders) when saving the map
+    bake_on_save: bool = False
+
+    # also compute a pvs for the baked static world
+    bake_pvs: bool = False
+    bake_pvs_cell_size: float = 8.
+
     # == entity state ==
 
     # stores the maps entity datas; dict[en_name, tuple[en_type, en_data]]
@@ -215,7 +231,7 @@ def editor_save_map(path: str | None = None) -> None:
 
     # compile map file
 
-    map.compile_map(path, entity_export_buf)
+    map.compile_map(path, entity_export_buf, EditorState.bake_on_save, EditorState.bake_pvs_cell_size if EditorState.bake_pvs else None)
 
     EditorState.has_unsaved_changes = False
 
@@ -743,6 +759,7 @@ def model_import_ui() -> None:
                 EditorState.assimp_scene = None
 
             EditorState.assimp_saved_msg = None
+            EditorState.assimp_opt_stats = None
             EditorState.assimp_sel_mesh = 0
             EditorState.assimp_mesh_scale = np.array([1., 1., 1.], dtype=np.float32)
             
@@ -778,10 +795,17 @@ def model_import_ui() -> None:
 
                 if reload_model:
                     EditorState.assimp_saved_msg = None
+                    EditorState.assimp_opt_stats = None
                     EditorState.assimp_mesh_scale = np.array([1., 1., 1.], dtype=np.float32)
 
                 imgui.spacing(); imgui.spacing()
 
+                _, EditorState.assimp_export_cmesh = imgui.checkbox("save as a raw .cmesh (faster loads, larger files)", EditorState.assimp_export_cmesh)
+                _, EditorState.assimp_optimize_mesh = imgui.checkbox("optimize mesh (weld vertices, vertex cache and fetch order)", EditorState.assimp_optimize_mesh)
+
+                if EditorState.assimp_export_cmesh:
+                    _, EditorState.assimp_pack_vertices = imgui.checkbox("pack vertices (10 bit normals, half float uvs)", EditorState.assimp_pack_vertices)
+
                 if imgui.button("Save as a Cue Mesh") and not EditorState.assimp_path is None and not EditorState.assimp_scene is None:
                     save_path = filedialpy.saveFile(os.path.splitext(os.path.basename(EditorState.assimp_path))[0])
                     
@@ -816,8 +840,19 @@ def model_import_ui() -> None:
                     # fill elem_buf
                     elem_buf[:] = mesh.faces.flatten()
 
-                    # export to a game ready numpy archive
-                    np.savez(save_path, vert_data=vert_buf, norm_data=norm_buf, uv_data=uv_buf, elem_data=elem_buf)
+                    if EditorState.assimp_optimize_mesh:
+                        (vert_buf, norm_buf, uv_buf, elem_buf), EditorState.assimp_opt_stats = mesh_opt.optimize_mesh(vert_buf, norm_buf, uv_buf, elem_buf)
+                    else:
+                        EditorState.assimp_opt_stats = None
+
+                    # export to a game ready raw mesh file or a numpy archive
+                    if EditorState.assimp_export_cmesh:
+                        if not save_path.endswith(mesh_file.CMESH_EXT):
+                            save_path += mesh_file.CMESH_EXT
+
+                        mesh_file.write_cmesh(save_path, vert_buf, norm_buf, uv_buf, elem_buf, interleaved=True, packed=EditorState.assimp_pack_vertices)
+                    else:
+                        np.savez(save_path, vert_data=vert_buf, norm_data=norm_buf, uv_data=uv_buf, elem_data=elem_buf)
 
                     utils.info(f"[editor] Saved a new mesh file to {save_path}!")
                     EditorState.assimp_saved_msg = f"Saved to {os.path.basename(save_path)}!"
@@ -826,6 +861,12 @@ def model_import_ui() -> None:
                     imgui.same_line()
                     imgui.text(EditorState.assimp_saved_msg)
 
+                if EditorState.assimp_opt_stats is not None:
+                    st = EditorState.assimp_opt_stats
+
+                    imgui.text(f"vertices: {st['vertex_count_before']} -> {st['vertex_count_after']}")
+                    imgui.text(f"ACMR (fifo cache of 16): {st['acmr_before']:.3f} -> {st['acmr_after']:.3f}")
+
                 imgui.end_tab_item()
 
 # == specific editor tool ui ==
@@ -837,9 +878,9 @@ def compute_model_bounds(en_data: dict) -> tuple[Vec3, Vec3]:
     
     vert_data = EditorState.coll_tool_mesh_cache.get(en_data["a_model_mesh"], None)
     if vert_data is None:
-        with np.load(os.path.join(GameState.asset_manager.asset_dir, en_data["a_model_mesh"])) as mesh_data:
-            vert_data = mesh_data["vert_data"]
-            EditorState.coll_tool_mesh_cache[en_data["a_model_mesh"]] = vert_data
+        # flattened, interleaved `.cmesh` files return [vertex_count, 3] views
+        vert_data = np.ravel(mesh_file.read_mesh_file(os.path.join(GameState.asset_manager.asset_dir, en_data["a_model_mesh"]))[0])
+        EditorState.coll_tool_mesh_cache[en_data["a_model_mesh"]] = vert_data
 
     vert_count = vert_data.shape[0] // 3
     axis_bins = np.zeros((3, vert_count))
@@ -1006,6 +1047,7 @@ def collider_tool_ui():
 # == ui defs ==
 
 asset_preview_tex = None
+asset_preview_ref = None # held while previewed, so the texture isn't evicted under the tooltip
 
 def asset_browser_item(name: str, path: str):
     imgui.bullet(); imgui.same_line()
@@ -1030,8 +1072,19 @@ def asset_browser_item(name: str, path: str):
 
         if fileext in image_formats:
             with imgui.begin_tooltip():
-                global asset_preview_tex
-                asset_preview_tex = GameState.asset_manager.load_texture(EDITOR_ASSET_DIR + "/" + path)
+                global asset_preview_tex, asset_preview_ref
+
+                asset_mgr = GameState.asset_manager
+                preview_key = EDITOR_ASSET_DIR + "/" + path
+
+                asset_preview_tex = asset_mgr.load_texture(preview_key)
+
+                if asset_preview_ref is None or asset_preview_ref.asset is not asset_preview_tex:
+                    # acquire before releasing, the release might trim the cache
+                    old_ref, asset_preview_ref = asset_preview_ref, asset_mgr.acquire(preview_key)
+
+                    if old_ref is not None:
+                        asset_mgr.release(old_ref)
 
                 imgui.image(asset_preview_tex.texture_handle, 256 * (asset_preview_tex.texture_size[0] / asset_preview_tex.texture_size[1]), 256)
 
@@ -1087,6 +1140,9 @@ def editor_process_ui():
             if imgui.menu_item("Save map as..")[0]:
                 editor_save_map()
 
+            _, EditorState.bake_on_save = imgui.menu_item("Bake static world on save", selected=EditorState.bake_on_save)
+            _, EditorState.bake_pvs = imgui.menu_item("Bake pvs", selected=EditorState.bake_pvs, enabled=EditorState.bake_on_save)
+
             imgui.separator()
 
             if imgui.menu_item("Test play", "Ctrl+t")[0] and EditorState.map_file_path:
@@ -1113,6 +1169,7 @@ def editor_process_ui():
             imgui.separator()
 
             _, EditorState.is_perf_overlay_open = imgui.menu_item("Perf overlay", selected=EditorState.is_perf_overlay_open)
+            _, EditorState.is_asset_stats_open = imgui.menu_item("Asset Stats", selected=EditorState.is_asset_stats_open)
 
             imgui.end_menu()
         
@@ -1145,6 +1202,9 @@ def editor_process_ui():
     if EditorState.is_perf_overlay_open:
         utils.show_perf_overlay()
 
+    if EditorState.is_asset_stats_open:
+        EditorState.is_asset_stats_open = asset_stats.show_panel(GameState.asset_manager)
+
     if EditorState.edit_mode > 0:
         with utils.begin_dev_overlay("edit_mode_info", 1):
             imgui.text("Editing Mode")
@@ -1288,6 +1348,8 @@ def start_editor():
     editor_new_map()
     editor_freecam_speed_tick()
 
+    asset_watcher.start() # hot reload edited assets
+
     try:
         while True:
             # == event poll ==
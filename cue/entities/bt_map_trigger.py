@@ -7,6 +7,7 @@ from ..phys.cue_phys_types import PhysAABB
 
 from ..rendering import cue_gizmos as gizmo
 from .. import cue_map
+from .. import cue_sequence as seq
 
 from pygame.math import Vector3 as Vec3
 from .cue_entity_utils import handle_transform_edit_mode
@@ -22,6 +23,10 @@ class BtMapTrigger:
         self.next_map = en_data["next_map"]
         self.is_enabled = en_data["enabled_at_start"]
 
+        # start loading the next map in the background, deferred so it's started after the current map load finishes
+        if self.is_enabled and en_data.get("prefetch_next_map", True) and self.next_map:
+            seq.next(cue_map.prefetch_map, self.next_map)
+
     def on_triggered(self) -> None:
         if self.is_enabled:
             cue_map.load_map_when_safe(self.next_map)
@@ -76,6 +81,7 @@ def gen_def_data() -> dict:
         "t_scale": Vec3(2., 2., 2.),
         "next_map": "",
         "enabled_at_start": True,
+        "prefetch_next_map": True,
     }
 
 en.create_entity_type("bt_map_trigger", BtMapTrigger.spawn, BtMapTrigger.despawn, BtMapTrigger.dev_tick, gen_def_data)
\ No newline at end of file
@@ -59,6 +59,8 @@ def gen_def_data():
         "a_model_fshader": "shaders/unlit.frag",
         "a_model_albedo": "textures/def_white.png",
         "a_model_transparent": False,
+        "a_model_async": False,
+        "a_model_texture_array": False,
         "a_model_uniforms": {},
     }
 
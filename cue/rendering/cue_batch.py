@@ -1,17 +1,23 @@
+import sys, ctypes, weakref
 from dataclasses import dataclass
 from typing import Any, Callable
 import OpenGL.GL as gl
 import numpy as np
-from .cue_resources import GPUMesh, GPUTexture, ShaderPipeline
+from .cue_resources import GPUMesh, GPUTexture, GPUTextureArray, ShaderPipeline
+from .cue_cull import SphereBVH, BVH_MIN_INSTANCES, transform_spheres, cull_spheres, enclosing_sphere
 
 from ..components.cue_transform import Transform
 from .. import cue_utils as utils
+from .. import cue_sequence as seq
 
 # == cue rendering instances ==
 
 # perf counters
 
 perfc_submit_count = 0
+perfc_retained_count = 0 # draws reissued from already uploaded instance data (see DrawBatch.draw_retained)
+perfc_visible_count = 0 # retained instances drawn after frustum culling
+perfc_culled_count = 0
 
 # represents the opengl state that can differ between DrawBatches, ideally
 # if two DrawInstances have the same DrawState, they should be valid to merge
@@ -20,13 +26,14 @@ perfc_submit_count = 0
 class DrawState:
     draw_pipeline: ShaderPipeline
     draw_mesh: GPUMesh
-    draw_texture_binds: tuple[GPUTexture]
+    draw_texture_binds: tuple[GPUTexture | GPUTextureArray]
 
     draw_batch_setup_cb: None | Callable[[], None]
     draw_batch_restore_cb: None | Callable[[], None]
 
     # draw_count will mostly be the same as mesh.vertex_count / mesh.element_count, but can differ (eg. with vertex shaders generating their own data)
-    draw_count: int
+    # None means the mesh counts are used, they're read at draw time so meshes can be (re)written in-place (async loads, hot reloads)
+    draw_count: int | None
     draw_mode: np.uint32
 
 class UniformBindTypes:
@@ -40,26 +47,53 @@ class UniformBindTypes:
     SINT3 = 6
     SINT4 = 7
 
-@dataclass(slots=True)
+# note: change the value by assigning bind_value, retained batches (see DrawBatch.draw_retained) only pick up assigned
+#       values, not in-place changes of a value array
+@dataclass(init=False, slots=True)
 class UniformBind:
+    def __init__(self, bind_type: int, bind_loc: np.uint32, bind_value: Any, bind_attrib: int = -1) -> None:
+        self.bind_type = bind_type
+        self.bind_loc = bind_loc
+        self.bind_attrib = bind_attrib
+
+        self.value = bind_value
+        self.retained_batch = None
+
+    @property
+    def bind_value(self) -> Any:
+        return self.value
+
+    @bind_value.setter
+    def bind_value(self, v: Any) -> None:
+        self.value = v
+
+        batch = self.retained_batch() if self.retained_batch is not None else None
+        if batch is not None:
+            batch._on_bind_change(self)
+
     bind_type: int
     bind_loc: np.uint32
-    bind_value: Any
+
+    # the location of the value as a per-instance vertex attribute, when the shader declares it as an attribute instead of
+    # a uniform (only used with instance buffers, see DrawBatch), -1 otherwise
+    bind_attrib: int
+
+    value: Any
+    retained_batch: 'weakref.ref[DrawBatch] | None' # the batch which retained the value in it's instance data, if any
 
 # an instance of a mesh (or other) in the RenderScene tree, these can be created and added to RenderScenes
 # by external code to add new draws to the frame
 
 @dataclass(init=False, slots=True)
 class DrawInstance:
-    def __init__(self, mesh: GPUMesh, pipeline: ShaderPipeline, texture_binds: tuple[GPUTexture], is_opaque: bool, uniform_data: list[UniformBind], trans: Transform | None, batch_setup_cb: None | Callable[[], None] = None, batch_restore_cb: None | Callable[[], None] = None, draw_mode: np.uint32 = gl.GL_TRIANGLES, draw_count_override: int | None = None) -> None:
-        has_elements = mesh.mesh_ebo is not None
-        draw_count = draw_count_override if draw_count_override is not None else (mesh.element_count if has_elements else mesh.vertex_count)
-        self.draw_state = DrawState(pipeline, mesh, texture_binds, batch_setup_cb, batch_restore_cb, draw_count, draw_mode)
+    def __init__(self, mesh: GPUMesh, pipeline: ShaderPipeline, texture_binds: tuple[GPUTexture | GPUTextureArray], is_opaque: bool, uniform_data: list[UniformBind], trans: Transform | None, batch_setup_cb: None | Callable[[], None] = None, batch_restore_cb: None | Callable[[], None] = None, draw_mode: np.uint32 = gl.GL_TRIANGLES, draw_count_override: int | None = None) -> None:
+        self.draw_state = DrawState(pipeline, mesh, texture_binds, batch_setup_cb, batch_restore_cb, draw_count_override, draw_mode)
 
         self.model_transform = trans
         self.is_opaque = is_opaque
 
         self.uniform_data = uniform_data
+        self.pvs_mask = None
 
     def __hash__(self) -> int:
         return id(self)
@@ -78,6 +112,9 @@ class DrawInstance:
     draw_state: DrawState
     is_opaque: bool
 
+    # the pvs cells this instance touches (see cue_pvs.py), None if not culled by the pvs
+    pvs_mask: int | None
+
 # rendering batch contain semi-local runtime buffers
 # for each object being instanced (mesh, point, etc.)
 
@@ -93,27 +130,110 @@ UNIFORM_BIND_SET_TYPE = {
     UniformBindTypes.SINT4: gl.glUniform4iv,
 }
 
-@dataclass(init=False, slots=True)
+# (component count, is integer) of the uniform bind types, used for per-instance attributes
+UNIFORM_BIND_COMPONENTS = {
+    UniformBindTypes.FLOAT1: (1, False),
+    UniformBindTypes.FLOAT2: (2, False),
+    UniformBindTypes.FLOAT3: (3, False),
+    UniformBindTypes.FLOAT4: (4, False),
+
+    UniformBindTypes.SINT1: (1, True),
+    UniformBindTypes.SINT2: (2, True),
+    UniformBindTypes.SINT3: (3, True),
+    UniformBindTypes.SINT4: (4, True),
+}
+
+# per-instance data is passed to the shaders in one of two ways, picked per DrawBatch by the shader's declarations:
+#  - uniform arrays: `uniform mat4 cue_model_mat[256]` (and per-instance uniform arrays) indexed by gl_InstanceID, batches
+#    are limited by the uniform array sizes and are flushed every UNIFORM_ARRAY_INSTANCES instances
+#  - instance buffers: `in mat4 cue_model_mat` (and per-instance `in` attributes, see UniformBind.bind_attrib) sourced
+#    from a per-batch vertex buffer with an attribute divisor of 1, batches are only flushed every INSTANCE_BUFFER_INSTANCES
+#    instances. the attributes must not overlap the mesh attributes (locations 0 - 2)
+#
+# per-instance uniforms not declared as attributes still use uniform arrays with instance buffers (and so limit the batch size)
+
+UNIFORM_ARRAY_INSTANCES = 256
+INSTANCE_BUFFER_INSTANCES = 1 << 16
+
+_IDENTITY_MAT = np.identity(4, dtype=np.float32)
+
+# the transform change subscriptions of a batch only hold a weak ref to it, so a dropped batch (with it's instance data and
+# buffers) isn't kept alive by the sequencer until all of it's transforms change again
+def _notify_transform_change(batch_ref: weakref.ref, trans: Transform) -> None:
+    batch = batch_ref()
+    if batch is not None:
+        batch._on_transform_change(trans)
+
+@dataclass(init=False, slots=True, weakref_slot=True)
 class DrawBatch:
     def __init__(self, state: DrawState) -> None:
         self.instance_count = 0
-        self.instance_capacity = 0
-        self.max_instance_capacity = 256
 
         self.batch_vao = state.draw_mesh.mesh_vao
+        self.batch_mesh = state.draw_mesh
 
-        self.has_elements = state.draw_mesh.mesh_ebo is not None
         self.draw_count = state.draw_count
         self.draw_mode = state.draw_mode
         self.draw_batch_setup_cb = state.draw_batch_setup_cb
         self.draw_batch_restore_cb = state.draw_batch_restore_cb
         self.draw_state = state
 
-        self.model_mat_buffer = []
-        self.uniform_instance_data_buffer = {}
         self.model_mat_loc = gl.glGetUniformLocation(state.draw_pipeline.shader_program, "cue_model_mat")
+        self.model_mat_attrib = gl.glGetAttribLocation(state.draw_pipeline.shader_program, "cue_model_mat")
+
+        if self.model_mat_attrib != -1:
+            self.max_instance_capacity = INSTANCE_BUFFER_INSTANCES
+            self.instance_vbo = gl.glGenBuffers(1)
+        else:
+            self.max_instance_capacity = UNIFORM_ARRAY_INSTANCES
+            self.instance_vbo = None
+
+        self.instance_buffer_size = 0
+
+        # persistent per-instance data, instances write into the rows of their slot in the batch, so a frame only does
+        # the row writes and a single upload (no per-frame lists or concatenation). a row is the column-major model matrix
+        # followed by the per-instance attributes (instance buffers only), per-instance uniforms have their own typed arrays
+
+        self.instance_data = None
+        self.instance_attribs = {}
+        self.instance_uniforms = {}
+
+        self._alloc_instance_data(16, 16)
+
+        # retained drawing state (see draw_retained)
+
+        self.is_dirty = True
+        self.is_updated = False
+        self.is_uploaded = False
+        self.uploaded_rows = None
+        self.retained_count = 0
+
+        self.watched_transforms = set()
+        self.moved_transforms = set()
+        self.transform_rows = {}
+        self.retained_binds = {}
+        self.changed_binds = []
+
+        self.instance_spheres = None
+        self.instance_bvh = None
+        self.sphere_bounds = None
+        self.batch_sphere = None
+
+        self.change_set = None
+
+    def __del__(self) -> None:
+        if self.instance_vbo is None or sys.meta_path is None: # no buffer or python is likely shuting down
+            return
+
+        gl.glDeleteBuffers(1, [self.instance_vbo])
 
     def draw_instance(self, ins: DrawInstance) -> None:
+        if self.instance_vbo is not None:
+            # the instance attributes are only sourced from the instance buffer, draw as a single instance batch
+            self.append_instance(ins)
+            self.draw_batch()
+            return
+
         gl.glBindVertexArray(self.batch_vao)
 
         if self.draw_batch_setup_cb is not None:
@@ -128,31 +248,244 @@ class DrawBatch:
         for b in ins.uniform_data:
             UNIFORM_BIND_SET_TYPE[b.bind_type](b.bind_loc, 1, b.bind_value)
 
-        if self.has_elements:
-            gl.glDrawElements(self.draw_mode, self.draw_count, gl.GL_UNSIGNED_INT, None)
+        mesh = self.batch_mesh
+        if mesh.mesh_ebo is not None:
+            gl.glDrawElements(self.draw_mode, mesh.element_count if self.draw_count is None else self.draw_count, mesh.element_type, None)
         else:
-            gl.glDrawArrays(self.draw_mode, 0, self.draw_count)
+            gl.glDrawArrays(self.draw_mode, 0, mesh.vertex_count if self.draw_count is None else self.draw_count)
 
         if self.draw_batch_restore_cb is not None:
             self.draw_batch_restore_cb()
 
     # *hot* function, make fast as possible
     def append_instance(self, ins: DrawInstance) -> None:
-        if ins.model_transform is not None:
-            self.model_mat_buffer.append(ins.model_transform._trans_matrix)
-
-        for b in ins.uniform_data:
-            self.uniform_instance_data_buffer.setdefault(b.bind_loc, (b.bind_type, []))[1].append(b.bind_value)
+        self._write_instance(ins)
 
-        self.instance_count += 1
-
-        if self.instance_count == self.max_instance_capacity:
+        if self.instance_count == self.max_instance_capacity or (self.instance_count == UNIFORM_ARRAY_INSTANCES and self.instance_uniforms):
             self.draw_batch() # reached instance/uniform buffer capacity, dispatch batch and reset
 
     def draw_batch(self) -> None:
         if not self.instance_count:
             return
 
+        n = self.instance_count
+        self._dispatch(self.instance_data[:n], [(loc, t, values[:n]) for loc, (t, values) in self.instance_uniforms.items()], 0, n, True)
+
+        self.instance_count = 0
+
+        # the rows and the instance buffer of draw_retained were overwritten
+        self.is_dirty = True
+        self.is_uploaded = False
+
+    # == retained drawing ==
+
+    # draws [instances] (the whole instance set of the batch), the instance data is only rebuilt when the batch is dirty and
+    # only uploaded when it changed, otherwise the last upload is drawn again. batches are dirty after mark_dirty() (eg. when
+    # instances are added or removed), instances with a changed transform (via the transform change events) only rewrite their rows
+    # and assigned per-instance values (UniformBind.bind_value) are rewritten in their rows only
+    #
+    # if frustum [planes] are given (see cue_cull.frustum_planes), instances outside of the frustum are culled first with a single
+    # test of all instance bounding spheres (or with the bvh of larger batches), only the visible rows are uploaded (batches which
+    # are fully visible keep their upload). whole batches are culled before this by their scene (see batch_sphere)
+    def draw_retained(self, instances: set[DrawInstance], planes: np.ndarray | None = None) -> None:
+        global perfc_retained_count, perfc_visible_count, perfc_culled_count
+
+        # batches updated ahead of the draw (eg. by the scene's batch culling) weren't redrawn for free either
+        if not self.update_retained(instances) and not self.is_updated:
+            perfc_retained_count += 1
+
+        self.is_updated = False
+
+        n = self.retained_count
+        visible_rows = None
+
+        if planes is not None and self.instance_spheres is not None:
+            if self.instance_bvh is not None:
+                visible_rows = self.instance_bvh.cull(self.instance_spheres, planes)
+            else:
+                visible = cull_spheres(self.instance_spheres, planes)
+                visible_rows = np.flatnonzero(visible) if not visible.all() else None
+
+            if visible_rows is not None:
+                perfc_culled_count += n - len(visible_rows)
+
+                if not len(visible_rows):
+                    return
+
+                n = len(visible_rows)
+
+        perfc_visible_count += n
+
+        # the instance buffer is only uploaded again if the visible set changed since the last upload
+
+        if visible_rows is None:
+            upload = not self.is_uploaded or self.uploaded_rows is not None
+        else:
+            upload = not self.is_uploaded or self.uploaded_rows is None or not np.array_equal(visible_rows, self.uploaded_rows)
+
+        self.is_uploaded = True
+        self.uploaded_rows = visible_rows
+
+        if visible_rows is None:
+            rows = self.instance_data[:n]
+            uniforms = [(loc, t, values[:n]) for loc, (t, values) in self.instance_uniforms.items()]
+        else:
+            # the visible rows are only gathered when they're uploaded (uniforms are set on each draw)
+            rows = self.instance_data[visible_rows] if upload or self.instance_vbo is None else None
+            uniforms = [(loc, t, values[visible_rows]) for loc, (t, values) in self.instance_uniforms.items()]
+
+        # batches over the instance capacity are split into multiple draws (from the same instance buffer upload)
+        draw_capacity = UNIFORM_ARRAY_INSTANCES if self.instance_uniforms else self.max_instance_capacity
+
+        for start in range(0, n, draw_capacity):
+            self._dispatch(rows, uniforms, start, min(draw_capacity, n - start), upload and start == 0)
+
+    # brings the retained rows and bounds up to date with [instances] (without drawing), returns False if nothing changed
+    def update_retained(self, instances: set[DrawInstance]) -> bool:
+        if self.is_dirty:
+            self._rebuild(instances)
+            self.is_updated = True
+            return True
+
+        changed = False
+
+        if self.moved_transforms:
+            self._update_moved()
+            changed = True
+        elif self.batch_mesh.bounds_radius is not None and self.sphere_bounds is not self.batch_mesh.bounds_min:
+            self._update_spheres() # the mesh was rewritten since the rebuild
+            changed = True
+
+        if self.changed_binds:
+            self._refresh_binds()
+            changed = True
+
+        self.is_updated |= changed
+        return changed
+
+    def mark_dirty(self) -> None:
+        self.is_dirty = True
+
+        if self.change_set is not None:
+            self.change_set.add(self.draw_state)
+
+    def _on_transform_change(self, trans: Transform) -> None:
+        self.moved_transforms.add(trans)
+        self.watched_transforms.discard(trans)
+
+        if self.change_set is not None:
+            self.change_set.add(self.draw_state)
+
+    def _on_bind_change(self, b: UniformBind) -> None:
+        self.changed_binds.append(b)
+
+        if self.change_set is not None:
+            self.change_set.add(self.draw_state)
+
+    # note: the change events only fire once per subscription, so the transforms are watched again after each change
+    def _watch_transform(self, t: Transform) -> None:
+        seq.on_event(t._change_event, _notify_transform_change, weakref.ref(self))
+        self.watched_transforms.add(t)
+
+    # rewrites the instance data rows with all [instances]
+    def _rebuild(self, instances: set[DrawInstance]) -> None:
+        watched = self.watched_transforms
+        transform_rows = {}
+        retained_binds = {}
+        batch_ref = weakref.ref(self)
+
+        self.instance_count = 0
+
+        for ins in instances:
+            t = ins.model_transform
+            if t is not None:
+                transform_rows.setdefault(t, []).append(self.instance_count)
+
+                if t not in watched:
+                    self._watch_transform(t)
+
+            for b in ins.uniform_data:
+                key = (True, b.bind_attrib) if b.bind_attrib != -1 and self.instance_vbo is not None else (False, b.bind_loc)
+
+                retained_binds.setdefault(id(b), (key, []))[1].append(self.instance_count)
+                b.retained_batch = batch_ref
+
+            self._write_instance(ins)
+
+        self.retained_count = self.instance_count
+        self.instance_count = 0
+        self.transform_rows = transform_rows
+        watched.intersection_update(transform_rows) # don't keep the transforms of removed instances
+        self.retained_binds = retained_binds
+        self.changed_binds.clear() # written with their current values
+        self.moved_transforms.clear()
+
+        self.is_dirty = False
+        self.is_uploaded = False
+
+        if self.batch_mesh.bounds_radius is not None:
+            self._update_spheres()
+
+    # rewrites only the model matrices of the moved instances and refits their bounds
+    def _update_moved(self) -> None:
+        moved_rows = []
+
+        for t in self.moved_transforms:
+            rows = self.transform_rows.get(t, None)
+            if rows is None:
+                continue # a removed instance, the batch is rebuilt anyway
+
+            for i in rows:
+                self.instance_mats[i] = t._trans_matrix
+
+            moved_rows += rows
+            self._watch_transform(t)
+
+        self.moved_transforms.clear()
+        self.is_uploaded = False
+
+        if moved_rows and self.instance_spheres is not None:
+            mesh = self.batch_mesh
+
+            self.instance_spheres[moved_rows] = transform_spheres(self.instance_mats[moved_rows], mesh.bounds_center(), mesh.bounds_radius)
+
+            if self.instance_bvh is not None:
+                self.instance_bvh.update(self.instance_spheres, np.array(moved_rows, dtype=np.intp))
+                self.batch_sphere = self.instance_bvh.bounding_sphere()
+            else:
+                self.batch_sphere = enclosing_sphere(self.instance_spheres)
+
+    # rewrites the rows of the per-instance values assigned since they were written (see UniformBind.bind_value), so changing
+    # a value doesn't rebuild the batch
+    def _refresh_binds(self) -> None:
+        for b in self.changed_binds:
+            retained = self.retained_binds.get(id(b), None)
+            if retained is None:
+                continue # the instance was removed, the batch is rebuilt anyway
+
+            (is_attrib, key), rows = retained
+            (self.instance_attribs[key][2] if is_attrib else self.instance_uniforms[key][1])[rows] = b.bind_value
+
+            if is_attrib:
+                self.is_uploaded = False # uniforms are set from the arrays on each draw, attributes live in the instance buffer
+
+        self.changed_binds.clear()
+
+    def _update_spheres(self) -> None:
+        mesh = self.batch_mesh
+
+        self.instance_spheres = transform_spheres(self.instance_mats[:self.retained_count], mesh.bounds_center(), mesh.bounds_radius)
+        self.instance_bvh = SphereBVH(self.instance_spheres) if self.retained_count >= BVH_MIN_INSTANCES else None
+        self.sphere_bounds = mesh.bounds_min
+
+        if self.instance_bvh is not None:
+            self.batch_sphere = self.instance_bvh.bounding_sphere()
+        else:
+            self.batch_sphere = enclosing_sphere(self.instance_spheres) if self.retained_count else None
+
+    # draws [n] instances starting at [start] of the instance data [rows] (and the matching per-instance [uniforms]),
+    # the rows are uploaded into the instance buffer first if [upload]
+    def _dispatch(self, rows: np.ndarray | None, uniforms: list[tuple[np.uint32, int, np.ndarray]], start: int, n: int, upload: bool) -> None:
         gl.glBindVertexArray(self.batch_vao)
 
         if self.draw_batch_setup_cb is not None:
@@ -163,40 +496,182 @@ class DrawBatch:
         
         # update instance data
 
-        if self.model_mat_loc != -1:
-            gl.glUniformMatrix4fv(self.model_mat_loc, self.instance_count, True, np.concat(self.model_mat_buffer))
+        if self.instance_vbo is not None:
+            instance_attribs = self._bind_instance_buffer(rows, start, upload)
+        elif self.model_mat_loc != -1:
+            gl.glUniformMatrix4fv(self.model_mat_loc, n, False, rows[start:start + n]) # the rows are only matrices without instance buffers
 
-        for loc, data in self.uniform_instance_data_buffer.items():
-            t, v = data
-            UNIFORM_BIND_SET_TYPE[t](loc, self.instance_count, v)
+        # note: uniforms are program state shared with other batches, so they're set on each draw (from the kept arrays)
+        for loc, t, values in uniforms:
+            UNIFORM_BIND_SET_TYPE[t](loc, n, values[start:start + n])
 
         # dispatch instanced draw
 
-        if self.has_elements:
-            gl.glDrawElementsInstanced(self.draw_mode, self.draw_count, gl.GL_UNSIGNED_INT, None, self.instance_count)
+        mesh = self.batch_mesh
+        if mesh.mesh_ebo is not None:
+            gl.glDrawElementsInstanced(self.draw_mode, mesh.element_count if self.draw_count is None else self.draw_count, mesh.element_type, None, n)
         else:
-            gl.glDrawArraysInstanced(self.draw_mode, 0, self.draw_count, self.instance_count)
+            gl.glDrawArraysInstanced(self.draw_mode, 0, mesh.vertex_count if self.draw_count is None else self.draw_count, n)
 
-        # reset batch
+        if self.instance_vbo is not None:
+            # the vao is the mesh's and is shared with batches of other pipelines, don't leave the instance attributes enabled
+            # or instanced (another pipeline might source the same locations per-vertex)
+            for a in instance_attribs:
+                gl.glVertexAttribDivisor(a, 0)
+                gl.glDisableVertexAttribArray(a)
 
         if self.draw_batch_restore_cb is not None:
             self.draw_batch_restore_cb()
 
-        self.instance_count = 0
-        self.model_mat_buffer = []
-        self.uniform_instance_data_buffer = {}
+    # == instance data ==
+
+    # writes an instance into the next instance data row, growing the instance data if needed
+    def _write_instance(self, ins: DrawInstance) -> None:
+        i = self.instance_count
+        if i == self.instance_capacity:
+            self._alloc_instance_data(self.instance_capacity * 2, self.instance_stride)
+
+        self.instance_mats[i] = ins.model_transform._trans_matrix if ins.model_transform is not None else _IDENTITY_MAT
+
+        for b in ins.uniform_data:
+            if b.bind_attrib != -1 and self.instance_vbo is not None:
+                attrib = self.instance_attribs.get(b.bind_attrib, None)
+                (attrib[2] if attrib is not None else self._add_instance_attrib(b))[i] = b.bind_value
+            else:
+                uniform = self.instance_uniforms.get(b.bind_loc, None)
+                (uniform[1] if uniform is not None else self._add_instance_uniform(b))[i] = b.bind_value
+
+        self.instance_count = i + 1
+
+    # (re)allocates the instance data for [capacity] instances of [stride] floats, keeping the current rows and layout
+    def _alloc_instance_data(self, capacity: int, stride: int) -> None:
+        data = np.zeros((capacity, stride), dtype=np.float32)
+
+        if self.instance_data is not None:
+            old_capacity, old_stride = self.instance_data.shape
+            data[:old_capacity, :old_stride] = self.instance_data
+
+        self.instance_data = data
+        self.instance_capacity = capacity
+        self.instance_stride = stride
+
+        # row-major model matrices written into the transposed view are stored column-major, as expected by gl
+        self.instance_mats = data[:, 0:16].reshape((capacity, 4, 4)).transpose((0, 2, 1))
+
+        int_data = data.view(np.int32)
+
+        for attrib, (t, offset, _) in self.instance_attribs.items():
+            comps, is_int = UNIFORM_BIND_COMPONENTS[t]
+            self.instance_attribs[attrib] = (t, offset, (int_data if is_int else data)[:, offset:offset + comps])
+
+        for loc, (t, values) in self.instance_uniforms.items():
+            grown = np.zeros((capacity,) + values.shape[1:], dtype=values.dtype)
+            grown[:len(values)] = values
+
+            self.instance_uniforms[loc] = (t, grown)
+
+    # adds a column for a new per-instance attribute to the instance data rows, returns the column
+    def _add_instance_attrib(self, b: UniformBind) -> np.ndarray:
+        self.instance_attribs[b.bind_attrib] = (b.bind_type, self.instance_stride, None)
+        self._alloc_instance_data(self.instance_capacity, self.instance_stride + UNIFORM_BIND_COMPONENTS[b.bind_type][0])
+
+        return self.instance_attribs[b.bind_attrib][2]
+
+    def _add_instance_uniform(self, b: UniformBind) -> np.ndarray:
+        comps, is_int = UNIFORM_BIND_COMPONENTS[b.bind_type]
+
+        values = np.zeros((self.instance_capacity, comps), dtype=np.int32 if is_int else np.float32)
+        self.instance_uniforms[b.bind_loc] = (b.bind_type, values)
+
+        return values
+
+    # sets up the instance attributes from the instance buffer starting at row [start], [upload]s the instance data [rows] into it
+    # first if requested. returns the enabled attribute locations, expects the batch vao to be bound
+    def _bind_instance_buffer(self, rows: np.ndarray | None, start: int, upload: bool) -> list[int]:
+        stride = self.instance_stride
+        base = start * stride * 4
+
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.instance_vbo)
+
+        if upload:
+            # orphan the old storage (so the driver doesn't stall on draws still reading it) and upload
+
+            if rows.nbytes > self.instance_buffer_size:
+                self.instance_buffer_size = max(rows.nbytes, self.instance_buffer_size * 2)
+
+            gl.glBufferData(gl.GL_ARRAY_BUFFER, self.instance_buffer_size, None, gl.GL_STREAM_DRAW)
+            gl.glBufferSubData(gl.GL_ARRAY_BUFFER, 0, rows.nbytes, rows)
+
+        # a mat4 attribute is 4 vec4 column attributes
+
+        enabled = []
+
+        for col in range(4):
+            a = self.model_mat_attrib + col
+
+            gl.glEnableVertexAttribArray(a)
+            gl.glVertexAttribPointer(a, 4, gl.GL_FLOAT, False, stride * 4, ctypes.c_void_p(base + col * 4 * 4))
+            gl.glVertexAttribDivisor(a, 1)
+
+            enabled.append(a)
+
+        for attrib, (t, offset, _) in self.instance_attribs.items():
+            comps, is_int = UNIFORM_BIND_COMPONENTS[t]
+
+            gl.glEnableVertexAttribArray(attrib)
+
+            if is_int:
+                gl.glVertexAttribIPointer(attrib, comps, gl.GL_INT, stride * 4, ctypes.c_void_p(base + offset * 4))
+            else:
+                gl.glVertexAttribPointer(attrib, comps, gl.GL_FLOAT, False, stride * 4, ctypes.c_void_p(base + offset * 4))
+
+            gl.glVertexAttribDivisor(attrib, 1)
+            enabled.append(attrib)
+
+        return enabled
 
     instance_count: int
     instance_capacity: int
     max_instance_capacity: int
     batch_vao: np.uint32
 
-    model_mat_buffer: list[np.ndarray]
     model_mat_loc: int
-    uniform_instance_data_buffer: dict[np.uint32, tuple[int, Any]]
+
+    # instance buffer, only used if the pipeline declares `cue_model_mat` as an attribute (None otherwise)
+    model_mat_attrib: int
+    instance_vbo: np.uint32 | None
+    instance_buffer_size: int
+
+    instance_data: np.ndarray # [instance_capacity, instance_stride] float32
+    instance_stride: int
+    instance_mats: np.ndarray # [instance_capacity, 4, 4] transposed view into instance_data
+    instance_attribs: dict[int, tuple[int, int, np.ndarray]] # dict[attrib, tuple[bind_type, row_offset, column view]]
+    instance_uniforms: dict[np.uint32, tuple[int, np.ndarray]] # dict[uniform_loc, tuple[bind_type, values]]
+
+    # retained drawing, [retained_count] instance data rows are left from the last rebuild
+    is_dirty: bool
+    is_updated: bool # if update_retained() changed anything since the last draw_retained()
+    is_uploaded: bool # if the instance buffer holds the retained rows (all, or the ones in uploaded_rows)
+    uploaded_rows: np.ndarray | None # the visible rows in the instance buffer, None if all rows were uploaded
+    retained_count: int
+
+    watched_transforms: set[Transform] # transforms with a subscribed change event
+    moved_transforms: set[Transform] # transforms changed since the last draw
+    transform_rows: dict[Transform, list[int]] # the instance data rows of each transform
+    retained_binds: dict[int, tuple[tuple[bool, int], list[int]]] # dict[id(bind), tuple[(is_attrib, attrib | loc), rows]]
+    changed_binds: list[UniformBind] # binds assigned a new value since the last draw
+
+    # world-space bounding spheres of the retained instances (see cue_cull.py), None if the mesh has no bounds
+    instance_spheres: np.ndarray | None
+    instance_bvh: SphereBVH | None # only for batches of at least BVH_MIN_INSTANCES
+    sphere_bounds: np.ndarray | None # the mesh bounds the spheres were computed from
+    batch_sphere: np.ndarray | None # a bounding sphere of all instance spheres, for culling whole batches
+
+    # the draw states of changed batches (dirty or with moved transforms) are added to this set of the owning scene, if any
+    change_set: set[DrawState] | None
     
-    has_elements: bool
-    draw_count: int
+    batch_mesh: GPUMesh
+    draw_count: int | None
     draw_mode: np.uint32
     draw_batch_setup_cb: None | Callable[[], None]
     draw_batch_restore_cb: None | Callable[[], None]
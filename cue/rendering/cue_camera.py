@@ -126,7 +126,7 @@ class Camera:
         gl.glEnable(gl.GL_CULL_FACE)
         gl.glCullFace(gl.GL_BACK)
 
-        scene.frame(self.cam_view_proj_matrix)
+        scene.frame(self.cam_view_proj_matrix, self.cam_pos)
 
         # == imgui/im2d overlays ==
 
@@ -0,0 +1,264 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+# == Cue Render Culling ==
+
+# cpu-side view frustum culling of scene instances, instances are tested as bounding spheres (the mesh bounds, see
+# GPUMesh.bounds_radius, transformed by the instance model matrices), all instances of a batch in a single vectorized test
+# or through a bvh for larger batches (see SphereBVH)
+
+# extracts the frustum planes of a [view_proj] matrix (Gribb / Hartmann), returns a [6, 4] array of normalized planes
+# (normal.xyz, dist) facing into the frustum (left, right, bottom, top, near, far)
+def frustum_planes(view_proj: np.ndarray) -> np.ndarray:
+    m = np.asarray(view_proj, dtype=np.float32)
+
+    planes = np.stack((m[3] + m[0], m[3] - m[0], m[3] + m[1], m[3] - m[1], m[3] + m[2], m[3] - m[2]))
+    return planes / np.linalg.norm(planes[:, 0:3], axis=1)[:, None]
+
+# transforms a mesh bounding sphere ([center], [radius]) by the model matrices [mats] ([n, 4, 4], row-major), returns the
+# world-space spheres as a [n, 4] array of (center.xyz, radius), the radius is scaled by the largest axis scale
+def transform_spheres(mats: np.ndarray, center: np.ndarray, radius: float) -> np.ndarray:
+    basis = mats[:, 0:3, 0:3]
+
+    spheres = np.empty((len(mats), 4), dtype=np.float32)
+    spheres[:, 0:3] = basis @ center + mats[:, 0:3, 3]
+    spheres[:, 3] = radius * np.sqrt((basis ** 2).sum(axis=1).max(axis=1))
+
+    return spheres
+
+# returns a sphere (center.xyz, radius) enclosing all [spheres] (through their aabb)
+def enclosing_sphere(spheres: np.ndarray) -> np.ndarray:
+    return _aabb_sphere((spheres[:, 0:3] - spheres[:, 3:4]).min(axis=0), (spheres[:, 0:3] + spheres[:, 3:4]).max(axis=0))
+
+def _aabb_sphere(lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    return np.append((lo + hi) * .5, np.linalg.norm(hi - lo) * .5).astype(np.float32)
+
+# returns a bool mask of the [spheres] ([n, 4]) which are (at least partially) inside the frustum [planes]
+def cull_spheres(spheres: np.ndarray, planes: np.ndarray) -> np.ndarray:
+    return ((spheres[:, 0:3] @ planes[:, 0:3].T + planes[:, 3]) >= -spheres[:, 3:4]).all(axis=1)
+
+# == bounding volume hierarchy ==
+
+# a bvh over the bounding spheres of a batch, so culling cost scales with the visible part of the batch instead of it's size
+#
+# the tree is built once over the instances (median splits along the largest axis) with the instances reordered so every
+# node covers a contiguous range of `order`. moving instances only refit the leaves they're in and the ancestors of those
+# (bottom-up, a level at a time), so static instances cost nothing. the tree is only rebuilt when the instance set changes
+# or when the refit tree got too loose (see update())
+#
+# the traversal is vectorized per tree level: all nodes of a level are tested against the frustum at once, nodes fully
+# inside accept their whole range, nodes fully outside are dropped and only the partially visible nodes are descended
+
+BVH_LEAF_SIZE = 16
+BVH_MIN_INSTANCES = 64 # smaller batches are culled with a single flat test
+BVH_REBUILD_AREA_RATIO = 2. # rebuild once the leaf surface area grew by this much since the build
+
+def _expand_ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    total = int(counts.sum())
+    if not total:
+        return np.empty(0, dtype=np.intp)
+
+    return np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+
+@dataclass(init=False, slots=True)
+class SphereBVH:
+    def __init__(self, spheres: np.ndarray) -> None:
+        self.build(spheres)
+
+    def build(self, spheres: np.ndarray) -> None:
+        centers = spheres[:, 0:3]
+        order = np.arange(len(spheres))
+
+        node_start, node_count, node_left, node_right, node_depth = [], [], [], [], []
+
+        def split(start: int, count: int, depth: int) -> int:
+            node = len(node_start)
+
+            node_start.append(start)
+            node_count.append(count)
+            node_left.append(-1)
+            node_right.append(-1)
+            node_depth.append(depth)
+
+            if count > BVH_LEAF_SIZE:
+                idx = order[start:start + count]
+                c = centers[idx]
+
+                axis = int(np.argmax(c.max(axis=0) - c.min(axis=0)))
+                half = count // 2
+
+                order[start:start + count] = idx[np.argpartition(c[:, axis], half)]
+
+                node_left[node] = split(start, half, depth + 1)
+                node_right[node] = split(start + half, count - half, depth + 1)
+
+            return node
+
+        split(0, len(spheres), 0)
+
+        self.order = order
+        self.node_start = np.array(node_start, dtype=np.intp)
+        self.node_count = np.array(node_count, dtype=np.intp)
+        self.node_left = np.array(node_left, dtype=np.intp)
+        self.node_right = np.array(node_right, dtype=np.intp)
+        self.node_depth = np.array(node_depth, dtype=np.intp)
+
+        inner = self.node_left != -1
+
+        self.node_parent = np.full(len(node_start), -1, dtype=np.intp)
+        self.node_parent[self.node_left[inner]] = np.flatnonzero(inner)
+        self.node_parent[self.node_right[inner]] = np.flatnonzero(inner)
+
+        self.node_lo = np.empty((len(node_start), 3), dtype=np.float32)
+        self.node_hi = np.empty((len(node_start), 3), dtype=np.float32)
+
+        leaves = np.flatnonzero(~inner)
+        self.leaf_nodes = leaves[np.argsort(self.node_start[leaves])] # in range order, for reduceat
+        self.position_leaf = np.repeat(self.leaf_nodes, self.node_count[self.leaf_nodes])
+
+        self.row_position = np.empty_like(order)
+        self.row_position[order] = np.arange(len(order))
+
+        self.inner_levels = [np.flatnonzero((self.node_depth == d) & inner) for d in range(int(self.node_depth.max()) + 1)]
+
+        self.refit(spheres)
+        self.built_area = self.area
+
+    # recomputes the node bounds from the (moved) [spheres], keeps the tree topology
+    def refit(self, spheres: np.ndarray) -> None:
+        self._refit_leaves(spheres, self.leaf_nodes)
+
+        for level in reversed(self.inner_levels):
+            self._refit_inner(level)
+
+        self.area = float(self._node_area(self.leaf_nodes).sum())
+
+    # recomputes only the bounds of the leaves holding the moved [rows] of [spheres] and of their ancestors
+    def refit_rows(self, spheres: np.ndarray, rows: np.ndarray) -> None:
+        leaves = np.unique(self.position_leaf[self.row_position[rows]])
+        old_area = self._node_area(leaves).sum()
+
+        self._refit_leaves(spheres, leaves)
+
+        # collect the ancestors, then refit them a level at a time from the deepest one
+
+        ancestors = []
+        nodes = leaves
+
+        while True:
+            nodes = np.unique(self.node_parent[nodes])
+            nodes = nodes[nodes != -1]
+
+            if not len(nodes):
+                break
+
+            ancestors.append(nodes)
+
+        if ancestors:
+            ancestors = np.unique(np.concatenate(ancestors))
+            depth = self.node_depth[ancestors]
+
+            for d in np.unique(depth)[::-1]:
+                self._refit_inner(ancestors[depth == d])
+
+        self.area += float(self._node_area(leaves).sum() - old_area)
+
+    # refits the tree to the moved [spheres] (only the moved [rows], if given), rebuilds it when the refit made it too loose
+    def update(self, spheres: np.ndarray, rows: np.ndarray | None = None) -> None:
+        if rows is None:
+            self.refit(spheres)
+        elif len(rows):
+            self.refit_rows(spheres, rows)
+
+        if self.area > self.built_area * BVH_REBUILD_AREA_RATIO:
+            self.build(spheres)
+
+    # the aabb of the whole tree as a bounding sphere (center.xyz, radius)
+    def bounding_sphere(self) -> np.ndarray:
+        return _aabb_sphere(self.node_lo[0], self.node_hi[0])
+
+    def _refit_leaves(self, spheres: np.ndarray, leaves: np.ndarray) -> None:
+        counts = self.node_count[leaves]
+        s = spheres[self.order[_expand_ranges(self.node_start[leaves], counts)]]
+
+        lo = s[:, 0:3] - s[:, 3:4]
+        hi = s[:, 0:3] + s[:, 3:4]
+
+        offsets = np.cumsum(counts) - counts
+        self.node_lo[leaves] = np.minimum.reduceat(lo, offsets, axis=0)
+        self.node_hi[leaves] = np.maximum.reduceat(hi, offsets, axis=0)
+
+    def _refit_inner(self, nodes: np.ndarray) -> None:
+        left, right = self.node_left[nodes], self.node_right[nodes]
+
+        self.node_lo[nodes] = np.minimum(self.node_lo[left], self.node_lo[right])
+        self.node_hi[nodes] = np.maximum(self.node_hi[left], self.node_hi[right])
+
+    # the surface areas of the aabbs of [nodes]
+    def _node_area(self, nodes: np.ndarray) -> np.ndarray:
+        e = self.node_hi[nodes] - self.node_lo[nodes]
+        return (e[:, 0] * e[:, 1] + e[:, 1] * e[:, 2] + e[:, 2] * e[:, 0]) * 2.
+
+    # returns the (sorted) indices of the [spheres] inside the frustum [planes], or None if all of them are
+    def cull(self, spheres: np.ndarray, planes: np.ndarray) -> np.ndarray | None:
+        normals, dists = planes[:, 0:3], planes[:, 3]
+        abs_normals = np.abs(normals)
+
+        frontier = np.zeros(1, dtype=np.intp)
+        accepted, partial_leaves = [], []
+
+        while len(frontier):
+            lo, hi = self.node_lo[frontier], self.node_hi[frontier]
+
+            d = ((lo + hi) * .5) @ normals.T + dists
+            r = ((hi - lo) * .5) @ abs_normals.T
+
+            keep = ~(d < -r).any(axis=1)
+            inside = (d >= r).all(axis=1)
+
+            if not accepted and inside[0]:
+                return None # the root is fully inside
+
+            accepted.append(frontier[keep & inside])
+
+            partial = frontier[keep & ~inside]
+            is_leaf = self.node_left[partial] == -1
+
+            partial_leaves.append(partial[is_leaf])
+
+            inner = partial[~is_leaf]
+            frontier = np.concatenate((self.node_left[inner], self.node_right[inner]))
+
+        # accept whole ranges of the inside nodes, test the spheres of the partially visible leaves
+
+        accepted = np.concatenate(accepted)
+        positions = [_expand_ranges(self.node_start[accepted], self.node_count[accepted])]
+
+        partial_leaves = np.concatenate(partial_leaves)
+        if len(partial_leaves):
+            candidates = _expand_ranges(self.node_start[partial_leaves], self.node_count[partial_leaves])
+            positions.append(candidates[cull_spheres(spheres[self.order[candidates]], planes)])
+
+        return np.sort(self.order[np.concatenate(positions)])
+
+    # the instances reordered so each node covers the contiguous range [node_start, node_start + node_count) of it
+    order: np.ndarray
+
+    node_start: np.ndarray
+    node_count: np.ndarray
+    node_left: np.ndarray # -1 for leaves
+    node_right: np.ndarray
+    node_lo: np.ndarray # [nodes, 3] aabb of the node spheres
+    node_hi: np.ndarray
+    node_depth: np.ndarray
+    node_parent: np.ndarray # -1 for the root
+
+    leaf_nodes: np.ndarray
+    inner_levels: list[np.ndarray] # inner nodes by depth, for the bottom-up refits
+
+    position_leaf: np.ndarray # the leaf of each position in `order`
+    row_position: np.ndarray # the position of each sphere in `order` (the inverse of it)
+
+    area: float # the summed leaf surface area
+    built_area: float
@@ -45,5 +45,10 @@ class SinglePassPostPass(PostPass):
 
 class BlitPostPass(SinglePassPostPass):
     def __init__(self) -> None:
-        pipeline = GameState.asset_manager.load_shader("shaders/post/fs_trig.vert", "shaders/post/blit.frag")
-        super().__init__(pipeline)
\ No newline at end of file
+        asset_mgr = GameState.asset_manager
+
+        pipeline = asset_mgr.load_shader("shaders/post/fs_trig.vert", "shaders/post/blit.frag")
+        super().__init__(pipeline)
+
+        # held for the lifetime of the pass, so the cached pipeline isn't evicted while in use
+        self.pass_pipe_ref = asset_mgr.acquire(asset_mgr.shader_key("shaders/post/fs_trig.vert", "shaders/post/blit.frag"))
\ No newline at end of file
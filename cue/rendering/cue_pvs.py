@@ -0,0 +1,203 @@
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+# == Cue Potentially Visible Sets ==
+
+# a pvs splits a map into a uniform grid of cells and stores which cells can be seen from each cell, it's computed offline
+# as part of a map bake (see cue_bake.py) by sampling rays between cells against the map's static occluders (the baked aabb
+# colliders which are covered by visible geometry, see visible_occluders)
+#
+# at runtime the RenderScene looks up the camera's cell and skips all batches tagged with a cell mask not visible from it,
+# cell masks are plain python ints used as bitsets (bit [i] set == cell [i] is visible / touched)
+
+PVS_MAX_CELLS = 4096
+PVS_CELL_SAMPLES = 16
+
+@dataclass(init=False, slots=True)
+class PVSData:
+    def __init__(self, origin: np.ndarray, cell_size: float, dims: tuple[int, int, int], vis_bits: np.ndarray) -> None:
+        self.origin = np.array(origin, dtype=np.float32)
+        self.cell_size = cell_size
+        self.dims = tuple(dims)
+        self.vis_bits = vis_bits
+
+        self.last_cell = -1
+        self.last_mask = -1
+
+    def cell_at(self, pos) -> int:
+        x = math.floor((pos[0] - self.origin[0]) / self.cell_size)
+        y = math.floor((pos[1] - self.origin[1]) / self.cell_size)
+        z = math.floor((pos[2] - self.origin[2]) / self.cell_size)
+
+        nx, ny, nz = self.dims
+        if x < 0 or y < 0 or z < 0 or x >= nx or y >= ny or z >= nz:
+            return -1
+
+        return x + nx * (y + ny * z)
+
+    # returns the visible cell mask from [pos], or -1 (all bits set) when outside of the pvs grid
+    def visible_mask(self, pos) -> int:
+        cell = self.cell_at(pos)
+
+        if cell != self.last_cell:
+            self.last_cell = cell
+            self.last_mask = -1 if cell == -1 else int.from_bytes(self.vis_bits[cell].tobytes(), 'little')
+
+        return self.last_mask
+
+    origin: np.ndarray
+    cell_size: float
+    dims: tuple[int, int, int]
+
+    # packed (little bit order) visibility rows, [cell_count, ceil(cell_count / 8)]
+    vis_bits: np.ndarray
+
+    # the mask lookup is cached until the camera changes cells
+    last_cell: int
+    last_mask: int
+
+# == pvs compiler ==
+
+def pvs_grid(bounds_min: np.ndarray, bounds_max: np.ndarray, cell_size: float) -> tuple[np.ndarray, float, tuple[int, int, int]]:
+    extent = np.maximum(bounds_max - bounds_min, 1e-3)
+
+    # grow cells until under the cell limit
+    while True:
+        dims = tuple(int(d) for d in np.ceil(extent / cell_size))
+        if math.prod(dims) <= PVS_MAX_CELLS:
+            break
+
+        cell_size *= 1.25
+
+    return (bounds_min.astype(np.float32), cell_size, dims)
+
+def clamped_cell(origin: np.ndarray, cell_size: float, dims: tuple[int, int, int], pos: np.ndarray) -> int:
+    x, y, z = np.clip(np.floor((pos - origin) / cell_size).astype(int), 0, np.array(dims) - 1)
+    return int(x + dims[0] * (y + dims[1] * z))
+
+def cell_range_mask(origin: np.ndarray, cell_size: float, dims: tuple[int, int, int], aabb_min: np.ndarray, aabb_max: np.ndarray) -> int:
+    lo = np.clip(np.floor((aabb_min - origin) / cell_size).astype(int), 0, np.array(dims) - 1)
+    hi = np.clip(np.floor((aabb_max - origin) / cell_size).astype(int), 0, np.array(dims) - 1)
+
+    mask = 0
+    for z in range(lo[2], hi[2] + 1):
+        for y in range(lo[1], hi[1] + 1):
+            for x in range(lo[0], hi[0] + 1):
+                mask |= 1 << (x + dims[0] * (y + dims[1] * z))
+
+    return mask
+
+def _inside_any(points: np.ndarray, occluders: np.ndarray) -> np.ndarray:
+    if not len(occluders):
+        return np.zeros(len(points), dtype=bool)
+
+    inside = np.all((points[:, None, :] > occluders[None, :, 0]) & (points[:, None, :] < occluders[None, :, 1]), axis=2)
+    return np.any(inside, axis=1)
+
+@np.errstate(all='ignore')
+def _segments_blocked(seg_a: np.ndarray, seg_b: np.ndarray, occluders: np.ndarray) -> np.ndarray:
+    d = seg_b - seg_a
+    d = np.where(np.abs(d) < 1e-9, 1e-9, d)
+
+    t1 = (occluders[None, :, 0] - seg_a[:, None]) / d[:, None]
+    t2 = (occluders[None, :, 1] - seg_a[:, None]) / d[:, None]
+
+    t_near = np.max(np.minimum(t1, t2), axis=2)
+    t_far = np.min(np.maximum(t1, t2), axis=2)
+
+    return np.any((t_near < t_far) & (t_far > 0.) & (t_near < 1.), axis=1)
+
+# returns a bool mask of the aabb [occluders] ([n, 2, 3]) which have visible geometry on their surface, judged by the world-space
+# vertex [positions] of the opaque static meshes: a box with at least 3 vertices on it's faces is treated as the collider
+# of a wall or a floor, boxes without any are invisible volumes (clip brushes, triggers, ...) and must not occlude anything
+def visible_occluders(occluders: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    if not len(occluders) or not len(positions):
+        return np.zeros(len(occluders), dtype=bool)
+
+    size = occluders[:, 1] - occluders[:, 0]
+    eps = (np.max(size, axis=1) * 1e-3 + 1e-4)[:, None]
+
+    visible = np.zeros(len(occluders), dtype=bool)
+    chunk = max(1, 2_000_000 // len(positions))
+
+    for i in range(0, len(occluders), chunk):
+        lo, hi, e = occluders[i:i + chunk, 0, None], occluders[i:i + chunk, 1, None], eps[i:i + chunk, None]
+        p = positions[None]
+
+        # inside the grown box, but not inside the shrunk one
+        near = np.all((p >= lo - e) & (p <= hi + e), axis=2) & ~np.all((p > lo + e) & (p < hi - e), axis=2)
+        visible[i:i + chunk] = near.sum(axis=1) >= 3
+
+    return visible
+
+# computes the cell to cell visibility, [target_mask] limits the tested target cells to cells which contain baked geometry
+# returns a bool array [cell_count, cell_count]
+def compute_pvs(origin: np.ndarray, cell_size: float, dims: tuple[int, int, int], occluders: np.ndarray, target_mask: np.ndarray) -> np.ndarray:
+    nx, ny, nz = dims
+    cell_count = nx * ny * nz
+
+    rng = np.random.default_rng(0)
+    occluders = occluders.astype(np.float32)
+
+    # sample points in each cell, rejecting points inside of occluders
+
+    cell_coords = np.stack(np.meshgrid(np.arange(nx), np.arange(ny), np.arange(nz), indexing='ij'), axis=-1).transpose(2, 1, 0, 3).reshape((-1, 3))
+    cell_min = origin + cell_coords * cell_size
+
+    samples = np.empty((cell_count, PVS_CELL_SAMPLES, 3), dtype=np.float32)
+    is_solid = np.zeros(cell_count, dtype=bool)
+
+    for c in range(cell_count):
+        cand = cell_min[c] + rng.random((PVS_CELL_SAMPLES * 4, 3)) * cell_size
+        cand = np.vstack((cell_min[c] + cell_size / 2, cand))
+        cand = cand[~_inside_any(cand, occluders)]
+
+        if not len(cand):
+            is_solid[c] = True
+            continue
+
+        samples[c] = cand[np.arange(PVS_CELL_SAMPLES) % len(cand)]
+
+    # trace sample pairs between cells
+
+    vis = np.zeros((cell_count, cell_count), dtype=bool)
+    targets = np.nonzero(target_mask)[0]
+
+    # keep the [segments, occluders, 3] temporaries in a reasonable size (a target cell is traced with all sample pairs)
+    pair_count = PVS_CELL_SAMPLES * PVS_CELL_SAMPLES
+    chunk = max(1, 2_000_000 // max(1, len(occluders) * pair_count))
+
+    for a in range(cell_count):
+        if is_solid[a]:
+            vis[a, :] = True # camera is inside of a wall (noclip), don't cull anything
+            continue
+
+        a_coord = cell_coords[a]
+
+        for i in range(0, len(targets), chunk):
+            tgt = targets[i:i + chunk]
+
+            # neighbouring and solid cells are always visible
+            near = np.max(np.abs(cell_coords[tgt] - a_coord), axis=1) <= 1
+            vis[a, tgt[near | is_solid[tgt]]] = True
+
+            tgt = tgt[~(near | is_solid[tgt])]
+            if not len(tgt):
+                continue
+
+            if not len(occluders):
+                vis[a, tgt] = True
+                continue
+
+            # every sample of [a] against every sample of each target
+            seg_a = np.broadcast_to(np.repeat(samples[a], PVS_CELL_SAMPLES, axis=0), (len(tgt), pair_count, 3)).reshape((-1, 3))
+            seg_b = np.tile(samples[tgt], (1, PVS_CELL_SAMPLES, 1)).reshape((-1, 3))
+
+            blocked = _segments_blocked(seg_a, seg_b, occluders).reshape((len(tgt), pair_count))
+            vis[a, tgt] = ~np.all(blocked, axis=1)
+
+        vis[a, a] = True
+
+    return vis
@@ -63,6 +63,9 @@ class CueRenderer:
         self.post_passes = []
         self.cpu_frame_time = 0.
         self.draw_call_count = 0
+        self.retained_draw_count = 0
+        self.visible_instance_count = 0
+        self.culled_instance_count = 0
 
         GameState.static_sequencer.on_event(pg.VIDEORESIZE, self._on_resize)
         init_gizmos()
@@ -85,6 +88,14 @@ class CueRenderer:
         self.draw_call_count = cue_batch.perfc_submit_count
         cue_batch.perfc_submit_count = 0
 
+        self.retained_draw_count = cue_batch.perfc_retained_count
+        cue_batch.perfc_retained_count = 0
+
+        self.visible_instance_count = cue_batch.perfc_visible_count
+        self.culled_instance_count = cue_batch.perfc_culled_count
+        cue_batch.perfc_visible_count = 0
+        cue_batch.perfc_culled_count = 0
+
         # cam stack draw
 
         main_pass_fb = self.offscreen_fbs[0].fb_handle if self.offscreen_fbs else np.uint32(0)
@@ -147,4 +158,7 @@ class CueRenderer:
     post_passes: list[PostPass]
 
     cpu_frame_time: float
-    draw_call_count: int
\ No newline at end of file
+    draw_call_count: int
+    retained_draw_count: int # draws of batches with unchanged instance data
+    visible_instance_count: int # opaque instances which passed frustum culling
+    culled_instance_count: int
\ No newline at end of file
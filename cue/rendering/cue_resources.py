@@ -1,67 +1,145 @@
-import sys
+import sys, os, ctypes, hashlib
 import pygame as pg
 import OpenGL.GL as gl
+from OpenGL.error import GLError
 import numpy as np
 
 from .. import cue_utils as utils
 
 # == Cue Resource Types (mostly rendering related) ==
 
+# vertex layouts of a GPUMesh:
+#  - streams: separate position, normal and uv buffers, allows updating single streams (eg. only positions)
+#  - interleaved: a single buffer of (pos.xyz, norm.xyz, uv.xy) vertices, better vertex fetch locality and less buffers for static meshes
+#
+# interleaved meshes also take packed vertices (see pack_vertices), the vertex format follows the data written into the mesh
+# element buffers can be uint32 or uint16 (for meshes with up to 65536 vertices), the draw path uses `element_type`
+
+MESH_VERTEX_STRIDE = 8 * 4
+MESH_PACKED_VERTEX_STRIDE = 3 * 4 + 4 + 2 * 2
+
+# a packed vertex: pos f32 x3, norm as a normalized GL_INT_2_10_10_10_REV (w unused) and uv f16 x2, 20 instead of 32 bytes
+packed_vertex_dtype = np.dtype([("pos", "<f4", 3), ("norm", "<u4"), ("uv", "<f2", 2)])
+
 class GPUMesh:
-    __slots__ = ["mesh_vao", "mesh_ebo", "mesh_pos_vbo", "mesh_norm_vbo", "mesh_uv_vbo", "vertex_count", "element_count"]
+    __slots__ = ["mesh_vao", "mesh_ebo", "mesh_pos_vbo", "mesh_norm_vbo", "mesh_uv_vbo", "mesh_vertex_vbo", "is_interleaved", "is_packed", "vertex_count", "element_count", "element_type", "bounds_min", "bounds_max", "bounds_radius"]
 
-    def __init__(self) -> None:
+    def __init__(self, interleaved: bool = False) -> None:
         # gen opengl buffers
 
         self.mesh_vao = gl.glGenVertexArrays(1)
-        self.mesh_pos_vbo, self.mesh_norm_vbo, self.mesh_uv_vbo = gl.glGenBuffers(3)
         self.mesh_ebo = None
 
+        self.is_interleaved = interleaved
+        self.is_packed = False
+
         self.vertex_count = 0
         self.element_count = 0
+        self.element_type = gl.GL_UNSIGNED_INT
+
+        self.bounds_min = None
+        self.bounds_max = None
+        self.bounds_radius = None
+
+        # setup the vertex attributes, only done once as they don't depend on the buffer contents
+
+        gl.glBindVertexArray(self.mesh_vao)
+
+        if interleaved:
+            self.mesh_vertex_vbo = gl.glGenBuffers(1)
+            self.mesh_pos_vbo, self.mesh_norm_vbo, self.mesh_uv_vbo = None, None, None
+
+            self._set_interleaved_format(False)
+
+        else:
+            self.mesh_vertex_vbo = None
+            self.mesh_pos_vbo, self.mesh_norm_vbo, self.mesh_uv_vbo = gl.glGenBuffers(3)
+
+            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.mesh_pos_vbo)
+            gl.glVertexAttribPointer(0, 3, gl.GL_FLOAT, False, 3 * 4, None)
+
+            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.mesh_norm_vbo)
+            gl.glVertexAttribPointer(1, 3, gl.GL_FLOAT, False, 3 * 4, None)
+
+            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.mesh_uv_vbo)
+            gl.glVertexAttribPointer(2, 2, gl.GL_FLOAT, False, 2 * 4, None)
+
+        gl.glEnableVertexAttribArray(0)
+        gl.glEnableVertexAttribArray(1)
+        gl.glEnableVertexAttribArray(2)
+
+        gl.glBindVertexArray(0)
 
     def __del__(self) -> None:
-        bufs = [self.mesh_pos_vbo, self.mesh_norm_vbo, self.mesh_uv_vbo]
-        
-        if self.mesh_ebo is not None:
-            bufs += [self.mesh_ebo]
+        bufs = [b for b in (self.mesh_pos_vbo, self.mesh_norm_vbo, self.mesh_uv_vbo, self.mesh_vertex_vbo, self.mesh_ebo) if b is not None]
 
         gl.glDeleteBuffers(len(bufs), np.array(bufs))
 
+    # (re)specifies the attributes of an interleaved mesh for float or packed vertices, expects the vao to be bound
+    def _set_interleaved_format(self, packed: bool) -> None:
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.mesh_vertex_vbo)
+
+        if packed:
+            gl.glVertexAttribPointer(0, 3, gl.GL_FLOAT, False, MESH_PACKED_VERTEX_STRIDE, ctypes.c_void_p(0))
+            gl.glVertexAttribPointer(1, 4, gl.GL_INT_2_10_10_10_REV, True, MESH_PACKED_VERTEX_STRIDE, ctypes.c_void_p(3 * 4))
+            gl.glVertexAttribPointer(2, 2, gl.GL_HALF_FLOAT, False, MESH_PACKED_VERTEX_STRIDE, ctypes.c_void_p(4 * 4))
+        else:
+            gl.glVertexAttribPointer(0, 3, gl.GL_FLOAT, False, MESH_VERTEX_STRIDE, ctypes.c_void_p(0))
+            gl.glVertexAttribPointer(1, 3, gl.GL_FLOAT, False, MESH_VERTEX_STRIDE, ctypes.c_void_p(3 * 4))
+            gl.glVertexAttribPointer(2, 2, gl.GL_FLOAT, False, MESH_VERTEX_STRIDE, ctypes.c_void_p(6 * 4))
+
+        self.is_packed = packed
+
     # mutator funcs
 
+    # note: for interleaved meshes all of pos, norm and uv data must be provided at once, packed streams (see is_packed_streams)
+    #       switch the mesh to the packed vertex format, float streams back to the float format
+    # note: [ebo_data] is uploaded as uint16 if it already is uint16, as uint32 otherwise
     def write_to(self, pos_data = None, norm_data = None, uv_data = None, vertex_count: int = 0, ebo_data = None, element_count: int = 0, gl_usage: np.uint32 = gl.GL_STATIC_DRAW) -> None:
+        if pos_data is not None:
+            self._update_bounds(pos_data)
+
         gl.glBindVertexArray(self.mesh_vao)
 
-        # pos
+        if self.is_interleaved:
+            if pos_data is not None:
+                if norm_data is None or uv_data is None:
+                    raise ValueError("interleaved meshes can only be written with all vertex streams at once")
 
-        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.mesh_pos_vbo)
-        if pos_data is not None:
-            gl.glBufferData(gl.GL_ARRAY_BUFFER, pos_data, gl_usage)
-            self.vertex_count = vertex_count
-        
-        gl.glVertexAttribPointer(0, 3, gl.GL_FLOAT, False, 3 * 4, None)
-        gl.glEnableVertexAttribArray(0)
+                packed = is_packed_streams(norm_data, uv_data)
+                if packed != self.is_packed:
+                    self._set_interleaved_format(packed)
 
-        # norm
+                gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.mesh_vertex_vbo)
 
-        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.mesh_norm_vbo)
-        if norm_data is not None:
-            gl.glBufferData(gl.GL_ARRAY_BUFFER, norm_data, gl_usage)
-            self.vertex_count = vertex_count
+                if packed:
+                    gl.glBufferData(gl.GL_ARRAY_BUFFER, pack_vertices(pos_data, norm_data, uv_data).view(np.uint8), gl_usage)
+                else:
+                    gl.glBufferData(gl.GL_ARRAY_BUFFER, interleave_vertices(pos_data, norm_data, uv_data), gl_usage)
 
-        gl.glVertexAttribPointer(1, 3, gl.GL_FLOAT, False, 3 * 4, None)
-        gl.glEnableVertexAttribArray(1)
+                self.vertex_count = vertex_count
 
-        # uvs
+        else:
+            # pos
 
-        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.mesh_uv_vbo)
-        if uv_data is not None:
-            gl.glBufferData(gl.GL_ARRAY_BUFFER, uv_data, gl_usage)
-            self.vertex_count = vertex_count
+            if pos_data is not None:
+                gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.mesh_pos_vbo)
+                gl.glBufferData(gl.GL_ARRAY_BUFFER, pos_data, gl_usage)
+                self.vertex_count = vertex_count
 
-        gl.glVertexAttribPointer(2, 2, gl.GL_FLOAT, False, 2 * 4, None)
-        gl.glEnableVertexAttribArray(2)
+            # norm
+
+            if norm_data is not None:
+                gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.mesh_norm_vbo)
+                gl.glBufferData(gl.GL_ARRAY_BUFFER, norm_data, gl_usage)
+                self.vertex_count = vertex_count
+
+            # uvs
+
+            if uv_data is not None:
+                gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.mesh_uv_vbo)
+                gl.glBufferData(gl.GL_ARRAY_BUFFER, uv_data, gl_usage)
+                self.vertex_count = vertex_count
 
         # elems
 
@@ -69,24 +147,135 @@ class GPUMesh:
             if self.mesh_ebo is None:
                 self.mesh_ebo = gl.glGenBuffers(1)
 
+            if getattr(ebo_data, "dtype", None) == np.uint16:
+                self.element_type = gl.GL_UNSIGNED_SHORT
+            else:
+                ebo_data = np.asarray(ebo_data, dtype=np.uint32)
+                self.element_type = gl.GL_UNSIGNED_INT
+
             gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.mesh_ebo)
             gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, ebo_data, gl_usage)
             self.element_count = element_count
 
         gl.glBindVertexArray(0)
 
-    mesh_pos_vbo: np.uint32
-    mesh_norm_vbo: np.uint32
-    mesh_uv_vbo: np.uint32
+    # recomputes the mesh bounds (used for culling) from the vertex positions
+    def _update_bounds(self, pos_data) -> None:
+        pos = np.asarray(pos_data, dtype=np.float32).reshape((-1, 3))
+
+        if not len(pos):
+            self.bounds_min, self.bounds_max, self.bounds_radius = None, None, None
+            return
+
+        self.bounds_min = pos.min(axis=0)
+        self.bounds_max = pos.max(axis=0)
+
+        # the sphere is centered on the aabb, so the radius is tighter than half the aabb diagonal
+        self.bounds_radius = float(np.sqrt(((pos - self.bounds_center()) ** 2).sum(axis=1).max()))
+
+    def bounds_center(self) -> np.ndarray:
+        return (self.bounds_min + self.bounds_max) * .5
+
+    # None for interleaved meshes
+    mesh_pos_vbo: np.uint32 | None
+    mesh_norm_vbo: np.uint32 | None
+    mesh_uv_vbo: np.uint32 | None
+
+    # None for stream meshes
+    mesh_vertex_vbo: np.uint32 | None
+    is_interleaved: bool
+    is_packed: bool # interleaved meshes only
 
     mesh_ebo: np.uint32 | None
     mesh_vao: np.uint32
 
     vertex_count: int
     element_count: int
+    element_type: np.uint32 # GL_UNSIGNED_INT or GL_UNSIGNED_SHORT
+
+    # object-space aabb and bounding sphere (centered on the aabb) of the vertex positions, None if no vertices were written
+    bounds_min: np.ndarray | None
+    bounds_max: np.ndarray | None
+    bounds_radius: float | None
+
+def _data_addr(arr: np.ndarray) -> int:
+    return arr.__array_interface__["data"][0]
+
+# packs vertex streams into interleaved (pos.xyz, norm.xyz, uv.xy) vertices, if the streams are already
+# strided views into an interleaved buffer (eg. from an interleaved .cmesh), that buffer is returned without a copy
+def interleave_vertices(pos_data: np.ndarray, norm_data: np.ndarray, uv_data: np.ndarray) -> np.ndarray:
+    pos = np.asarray(pos_data, dtype=np.float32).reshape((-1, 3))
+    norm = np.asarray(norm_data, dtype=np.float32).reshape((-1, 3))
+    uv = np.asarray(uv_data, dtype=np.float32).reshape((-1, 2))
+
+    if pos.strides == (MESH_VERTEX_STRIDE, 4) and norm.strides == (MESH_VERTEX_STRIDE, 4) and uv.strides == (MESH_VERTEX_STRIDE, 4) \
+            and _data_addr(norm) == _data_addr(pos) + 3 * 4 and _data_addr(uv) == _data_addr(pos) + 6 * 4:
+        return np.lib.stride_tricks.as_strided(pos, shape=(len(pos), 8), strides=(MESH_VERTEX_STRIDE, 4), writeable=False)
+
+    verts = np.empty((len(pos), 8), dtype=np.float32)
+    verts[:, 0:3] = pos
+    verts[:, 3:6] = norm
+    verts[:, 6:8] = uv
+
+    return verts
+
+# == packed vertices ==
+
+# packed vertex streams are (pos f32 [n, 3], norm u32 [n], uv f16 [n, 2]), usually the fields of a `packed_vertex_dtype` array
+# note: half float uvs keep ~3 significant digits, uvs far outside of [-1, 1] (eg. heavily tiled textures) lose precision
+
+def is_packed_streams(norm_data: np.ndarray, uv_data: np.ndarray) -> bool:
+    return getattr(norm_data, "dtype", None) == np.uint32 and getattr(uv_data, "dtype", None) == np.float16
+
+# packs unit normals into GL_INT_2_10_10_10_REV values (snorm 10 bit x, y, z, w = 0)
+def pack_normals(norm_data: np.ndarray) -> np.ndarray:
+    norm = np.clip(np.asarray(norm_data, dtype=np.float32).reshape((-1, 3)), -1., 1.)
+    q = np.round(norm * 511.).astype(np.int32) & 0x3ff
+
+    return (q[:, 0] | (q[:, 1] << 10) | (q[:, 2] << 20)).astype(np.uint32)
+
+def unpack_normals(packed_norm: np.ndarray) -> np.ndarray:
+    packed = np.asarray(packed_norm, dtype=np.uint32)
+    q = np.stack([(packed >> shift) & 0x3ff for shift in (0, 10, 20)], axis=1).astype(np.int32)
+    q = np.where(q >= 512, q - 1024, q) # sign extend
+
+    return np.maximum(q / 511., -1.).astype(np.float32)
+
+# packs vertex streams into a `packed_vertex_dtype` array, float streams are converted and already packed streams
+# which are fields of a packed vertex array (eg. from a packed .cmesh) return that array without a copy
+def pack_vertices(pos_data: np.ndarray, norm_data: np.ndarray, uv_data: np.ndarray) -> np.ndarray:
+    pos = np.asarray(pos_data, dtype=np.float32).reshape((-1, 3))
+
+    if is_packed_streams(norm_data, uv_data) and pos.strides == (MESH_PACKED_VERTEX_STRIDE, 4) and norm_data.strides == (MESH_PACKED_VERTEX_STRIDE,) and uv_data.strides == (MESH_PACKED_VERTEX_STRIDE, 2) \
+            and _data_addr(norm_data) == _data_addr(pos) + 3 * 4 and _data_addr(uv_data) == _data_addr(pos) + 4 * 4:
+        vert_bytes = np.lib.stride_tricks.as_strided(pos.view(np.uint8), shape=(len(pos), MESH_PACKED_VERTEX_STRIDE), strides=(MESH_PACKED_VERTEX_STRIDE, 1), writeable=False)
+        return vert_bytes.view(packed_vertex_dtype).reshape(-1)
+
+    verts = np.empty((len(pos),), dtype=packed_vertex_dtype)
+
+    verts["pos"] = pos
+    verts["norm"] = norm_data if is_packed_streams(norm_data, uv_data) else pack_normals(norm_data)
+    verts["uv"] = np.asarray(uv_data).reshape((-1, 2)).astype(np.float16)
+
+    return verts
+
+# unpacks packed vertex streams back into float (pos, norm, uv) streams of [n, 3], [n, 3] and [n, 2]
+def unpack_vertices(pos_data: np.ndarray, norm_data: np.ndarray, uv_data: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    return (
+        np.asarray(pos_data, dtype=np.float32).reshape((-1, 3)),
+        unpack_normals(norm_data),
+        np.asarray(uv_data, dtype=np.float32).reshape((-1, 2)),
+    )
+
+# returns [elem_data] as uint16 if all indices fit (meshes with up to 65536 vertices), uint32 otherwise
+def compact_elements(elem_data: np.ndarray, vertex_count: int) -> np.ndarray:
+    if vertex_count <= 0x10000:
+        return np.ascontiguousarray(elem_data, dtype=np.uint16)
+
+    return np.ascontiguousarray(elem_data, dtype=np.uint32)
 
 class GPUTexture:
-    __slots__ = ["texture_handle", "texture_format", "texture_size"]
+    __slots__ = ["texture_handle", "texture_format", "texture_size", "texture_levels"]
 
     def __init__(self, mag_filter: np.uint32 = gl.GL_LINEAR, min_filter: np.uint32 = gl.GL_LINEAR, wrap: np.uint32 = gl.GL_CLAMP_TO_EDGE) -> None:
         self.texture_handle = gl.glGenTextures(1)
@@ -119,6 +308,7 @@ class GPUTexture:
 
         self.texture_format = gl_format
         self.texture_size = size
+        self.texture_levels = 1
 
     def write_to(self, surf: pg.Surface, gl_format: np.uint32 = gl.GL_RGBA, gl_type: np.uint32 = gl.GL_UNSIGNED_BYTE, pg_format: str = "RGBA") -> None:
         gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture_handle)
@@ -126,8 +316,32 @@ class GPUTexture:
 
         # gl.glGenerateMipmap(gl.GL_TEXTURE_2D)
 
+        if getattr(self, "texture_levels", 1) > 1:
+            # previously had a mip chain (eg. an in-place reload from a cooked texture), don't sample the stale levels
+            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAX_LEVEL, 0)
+            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR)
+
         self.texture_format = gl_format
         self.texture_size = surf.get_size()
+        self.texture_levels = 1
+
+    # uploads a full mip chain of rgba8 [height, width, 4] levels (eg. from a cooked texture), enables mipmapped minification
+    def write_mips(self, levels: list[np.ndarray]) -> None:
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture_handle)
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
+
+        for i, l in enumerate(levels):
+            gl.glTexImage2D(gl.GL_TEXTURE_2D, i, gl.GL_RGBA, l.shape[1], l.shape[0], 0, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE, l)
+
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 4)
+
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAX_LEVEL, len(levels) - 1)
+        if len(levels) > 1:
+            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR_MIPMAP_LINEAR)
+
+        self.texture_format = gl.GL_RGBA
+        self.texture_size = (levels[0].shape[1], levels[0].shape[0])
+        self.texture_levels = len(levels)
 
     def read_back(self) -> pg.Surface:
         raise NotImplemented # would always be a performace hit, should not be generally required
@@ -136,11 +350,183 @@ class GPUTexture:
 
     texture_format: np.uint32
     texture_size: tuple[int, int]
+    texture_levels: int
+
+# == texture arrays ==
+
+# a GL_TEXTURE_2D_ARRAY of same sized rgba8 textures (with the same mip level count), one texture per layer
+# draws which only differ by their texture can bind the shared array instead and so share a DrawState (and an instanced
+# draw), the layer index is then passed to the shader as per-instance data (see ModelRenderer's `a_model_texture_array`)
+#
+# arrays have a fixed layer count, as growing one would mean copying all of it's layers, more arrays are created when full
+
+TEXTURE_ARRAY_LAYERS = 16
+
+class GPUTextureArray:
+    __slots__ = ["texture_handle", "texture_size", "texture_levels", "layer_count", "free_layers"]
+
+    def __init__(self, size: tuple[int, int], levels: int, layer_count: int = TEXTURE_ARRAY_LAYERS, mag_filter: np.uint32 = gl.GL_LINEAR, wrap: np.uint32 = gl.GL_CLAMP_TO_EDGE) -> None:
+        self.texture_handle = gl.glGenTextures(1)
+
+        self.texture_size = size
+        self.texture_levels = levels
+        self.layer_count = layer_count
+        self.free_layers = list(range(layer_count - 1, -1, -1)) # popped from the end, so the lowest layers are used first
+
+        gl.glBindTexture(gl.GL_TEXTURE_2D_ARRAY, self.texture_handle)
+
+        gl.glTexParameteri(gl.GL_TEXTURE_2D_ARRAY, gl.GL_TEXTURE_MAG_FILTER, mag_filter)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D_ARRAY, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR_MIPMAP_LINEAR if levels > 1 else gl.GL_LINEAR)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D_ARRAY, gl.GL_TEXTURE_WRAP_S, wrap)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D_ARRAY, gl.GL_TEXTURE_WRAP_T, wrap)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D_ARRAY, gl.GL_TEXTURE_MAX_LEVEL, levels - 1)
+
+        for i in range(levels):
+            gl.glTexImage3D(gl.GL_TEXTURE_2D_ARRAY, i, gl.GL_RGBA8, max(size[0] >> i, 1), max(size[1] >> i, 1), layer_count, 0, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE, None)
+
+    def __del__(self) -> None:
+        if sys.meta_path is None: # python is likely shuting down, pyopengl will fail, just let the resources get freed by the os
+            return
+
+        gl.glDeleteTextures(1, [self.texture_handle])
+
+    # mutator funcs; note: binds to current active texture and leaves it bound
+
+    def bind_to(self, texture_index):
+        gl.glActiveTexture(gl.GL_TEXTURE0 + texture_index)
+        gl.glBindTexture(gl.GL_TEXTURE_2D_ARRAY, self.texture_handle)
+
+    # returns a free layer of this array or None if full
+    def alloc_layer(self) -> 'TextureLayer | None':
+        if not self.free_layers:
+            return None
+
+        return TextureLayer(self, self.free_layers.pop())
+
+    # uploads the rgba8 [levels] (one per mip level of the array, as [height, width, 4] arrays or raw bytes) into [layer]
+    def write_layer(self, layer: int, levels: list) -> None:
+        if len(levels) != self.texture_levels:
+            raise ValueError(f"texture array layers have {self.texture_levels} mip levels, got {len(levels)}")
+
+        gl.glBindTexture(gl.GL_TEXTURE_2D_ARRAY, self.texture_handle)
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
+
+        for i, l in enumerate(levels):
+            gl.glTexSubImage3D(gl.GL_TEXTURE_2D_ARRAY, i, 0, 0, layer, max(self.texture_size[0] >> i, 1), max(self.texture_size[1] >> i, 1), 1, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE, l)
+
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 4)
+
+    texture_handle: int
+
+    texture_size: tuple[int, int]
+    texture_levels: int
+
+    layer_count: int
+    free_layers: list[int]
+
+# a layer allocated in a GPUTextureArray, the layer is freed once the last reference to this is dropped
+class TextureLayer:
+    __slots__ = ["texture_array", "layer"]
+
+    def __init__(self, texture_array: GPUTextureArray, layer: int) -> None:
+        self.texture_array = texture_array
+        self.layer = layer
+
+    def __del__(self) -> None:
+        self.texture_array.free_layers.append(self.layer)
+
+    texture_array: GPUTextureArray
+    layer: int
 
 class CueGLUniformBindings:
     GLOBAL = 0
     CAMERA = 1
 
+# == program binary cache ==
+
+# linked programs are saved to disk with glGetProgramBinary and restored with glProgramBinary on later runs, skipping
+# the glsl compile and link. the cache files are keyed by a hash of the shader sources and the gl vendor, renderer and
+# version strings (driver updates invalidate the binaries), a rejected or corrupted binary falls back to a normal compile
+#
+# the cache is disabled while `program_cache_dir` is None, the AssetManager points it into the asset dir by default
+
+program_cache_dir: str | None = None
+
+PROGRAM_CACHE_EXT = ".cprog"
+
+_gl_driver_id: bytes | None = None
+_program_binary_supported: bool | None = None
+
+def _program_cache_path(vs_src: str, fs_src: str) -> str | None:
+    global _gl_driver_id, _program_binary_supported
+
+    if program_cache_dir is None:
+        return None
+
+    if _program_binary_supported is None:
+        _program_binary_supported = int(gl.glGetIntegerv(gl.GL_NUM_PROGRAM_BINARY_FORMATS)) > 0
+        _gl_driver_id = b"\0".join(gl.glGetString(s) or b"" for s in (gl.GL_VENDOR, gl.GL_RENDERER, gl.GL_VERSION))
+
+        if not _program_binary_supported:
+            utils.warn("[ShaderPipeline] the gl driver doesn't support program binaries, the program cache is disabled")
+
+    if not _program_binary_supported:
+        return None
+
+    key = hashlib.sha1(vs_src.encode() + b"\0" + fs_src.encode() + b"\0" + _gl_driver_id).hexdigest()
+    return os.path.join(program_cache_dir, key + PROGRAM_CACHE_EXT)
+
+# loads a cached program binary into [p], returns False on a cache miss or if the binary was rejected by the driver
+# note: rejected binaries (eg. after a driver update) are deleted, the program is then linked from source and cached again
+def _load_program_binary(p: np.uint32, cache_path: str) -> bool:
+    try:
+        with open(cache_path, 'rb') as f:
+            cache_data = f.read()
+    except OSError:
+        return False
+
+    if len(cache_data) <= 4:
+        return False
+
+    binary_format = int.from_bytes(cache_data[:4], 'little')
+    binary = np.frombuffer(cache_data, dtype=np.uint8, offset=4)
+
+    try:
+        gl.glProgramBinary(p, binary_format, binary, len(binary))
+        if gl.glGetProgramiv(p, gl.GL_LINK_STATUS):
+            return True
+
+    except GLError as e:
+        utils.warn(f"[ShaderPipeline] the cached program binary {cache_path} was rejected by the driver: {e}")
+
+    try:
+        os.remove(cache_path)
+    except OSError:
+        pass
+
+    return False
+
+def _save_program_binary(p: np.uint32, cache_path: str) -> None:
+    binary_len = gl.glGetProgramiv(p, gl.GL_PROGRAM_BINARY_LENGTH)
+    if not binary_len:
+        return
+
+    binary = np.empty(binary_len, dtype=np.uint8)
+    written_len = np.zeros(1, dtype=np.int32)
+    binary_format = np.zeros(1, dtype=np.uint32)
+
+    gl.glGetProgramBinary(p, binary_len, written_len, binary_format, binary)
+
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+
+        with open(cache_path, 'wb') as f:
+            f.write(int(binary_format[0]).to_bytes(4, 'little'))
+            f.write(binary[:written_len[0]].tobytes())
+
+    except OSError as e:
+        utils.warn(f"[ShaderPipeline] failed to save a program binary to {cache_path}: {e}")
+
 # yes, this is a Vulkan approach to a OpenGL api resource (Programs)
 # but it's still more efficient then the conventional OpenGL way
 #
@@ -149,28 +535,99 @@ class ShaderPipeline:
     __slots__ = ["shader_program", "shader_name"]
 
     def __init__(self, vs_src: str, fs_src: str, dbg_name: str) -> None:
-        def load_shader(shader_type, src):
-            s = gl.glCreateShader(shader_type)
+        self.shader_program = gl.glCreateProgram()
+        self.shader_name = dbg_name
+
+        # try the program binary cache first
+
+        cache_path = _program_cache_path(vs_src, fs_src)
+        if cache_path is not None:
+            if _load_program_binary(self.shader_program, cache_path):
+                ShaderPipeline._bind_uniform_blocks(self.shader_program)
+                return
+
+            # the failed binary load might have left the program in a bad state, start over
+            gl.glDeleteProgram(self.shader_program)
+
+            self.shader_program = gl.glCreateProgram()
+            gl.glProgramParameteri(self.shader_program, gl.GL_PROGRAM_BINARY_RETRIEVABLE_HINT, gl.GL_TRUE)
+
+        vs = ShaderPipeline._compile_shader(gl.GL_VERTEX_SHADER, vs_src, dbg_name)
+        fs = ShaderPipeline._compile_shader(gl.GL_FRAGMENT_SHADER, fs_src, dbg_name)
+
+        if self._link(self.shader_program, vs, fs) and cache_path is not None:
+            _save_program_binary(self.shader_program, cache_path)
 
-            gl.glShaderSource(s, src)
-            gl.glCompileShader(s)
+        # only flags them for deletion, they're freed once detached (on relink) or with the program
+        ShaderPipeline._delete_shaders(vs, fs)
 
-            result = gl.glGetShaderiv(s, gl.GL_COMPILE_STATUS)
+    # recompiles and relinks the pipeline from new sources in-place, keeping the same gl program (and so all DrawStates using it valid)
+    # on compile or link errors the old program is kept and False is returned
+    def relink(self, vs_src: str, fs_src: str) -> bool:
+        vs = ShaderPipeline._compile_shader(gl.GL_VERTEX_SHADER, vs_src, self.shader_name)
+        fs = ShaderPipeline._compile_shader(gl.GL_FRAGMENT_SHADER, fs_src, self.shader_name)
 
-            if not result:
-                log = gl.glGetShaderInfoLog(s)
+        if vs is None or fs is None:
+            ShaderPipeline._delete_shaders(vs, fs) # the stage which did compile
+            return False
 
-                utils.error(f"error while compiling a shader {dbg_name}: {str(log)}")
+        # link into a scratch program first, a failed link would leave the real program unusable
 
-            return s
-        
-        vs = load_shader(gl.GL_VERTEX_SHADER, vs_src)
-        fs = load_shader(gl.GL_FRAGMENT_SHADER, fs_src)
+        test_p = gl.glCreateProgram()
+        link_ok = self._link(test_p, vs, fs)
+        gl.glDeleteProgram(test_p)
 
-        p = gl.glCreateProgram()
+        if not link_ok:
+            ShaderPipeline._delete_shaders(vs, fs)
+            return False
 
-        gl.glAttachShader(p, vs)
-        gl.glAttachShader(p, fs)
+        old_locs = self._uniform_locations()
+
+        # the old stages are freed once detached (deleting them again is fine while they're still attached)
+        for s in gl.glGetAttachedShaders(self.shader_program):
+            gl.glDeleteShader(s)
+            gl.glDetachShader(self.shader_program, s)
+
+        self._link(self.shader_program, vs, fs)
+        ShaderPipeline._delete_shaders(vs, fs)
+
+        # uniform locations cached by users (eg. ModelRenderer uniform binds) might be invalid if they moved
+        new_locs = self._uniform_locations()
+        if any(new_locs.get(n, loc) != loc for n, loc in old_locs.items()):
+            utils.warn(f"[ShaderPipeline] uniform locations of {self.shader_name} changed while relinking, a full reload might be required")
+
+        return True
+
+    @staticmethod
+    def _compile_shader(shader_type: np.uint32, src: str, dbg_name: str) -> np.uint32 | None:
+        s = gl.glCreateShader(shader_type)
+
+        gl.glShaderSource(s, src)
+        gl.glCompileShader(s)
+
+        result = gl.glGetShaderiv(s, gl.GL_COMPILE_STATUS)
+
+        if not result:
+            log = gl.glGetShaderInfoLog(s)
+
+            utils.error(f"error while compiling a shader {dbg_name}: {str(log)}")
+            gl.glDeleteShader(s)
+
+            return None
+
+        return s
+
+    @staticmethod
+    def _delete_shaders(*shaders: np.uint32 | None) -> None:
+        for s in shaders:
+            if s is not None:
+                gl.glDeleteShader(s)
+
+    def _link(self, p: np.uint32, vs: np.uint32 | None, fs: np.uint32 | None) -> bool:
+        if vs is not None:
+            gl.glAttachShader(p, vs)
+        if fs is not None:
+            gl.glAttachShader(p, fs)
 
         gl.glLinkProgram(p)
         result = gl.glGetProgramiv(p, gl.GL_LINK_STATUS)
@@ -178,13 +635,15 @@ class ShaderPipeline:
         if not result:
             log = gl.glGetProgramInfoLog(p)
 
-            utils.error(f"error while linking a ShaderPipeline {dbg_name}: {log}")
+            utils.error(f"error while linking a ShaderPipeline {self.shader_name}: {log}")
+            return False
 
-        self.shader_program = p
-        self.shader_name = dbg_name
-    
-        # setup uniform block bindings
+        ShaderPipeline._bind_uniform_blocks(p)
+        return True
 
+    # note: block bindings are program state, so they're also setup after loading a cached program binary
+    @staticmethod
+    def _bind_uniform_blocks(p: np.uint32) -> None:
         g_loc = gl.glGetUniformBlockIndex(p, "cue_global_buf")
         if g_loc != gl.GL_INVALID_INDEX:
             gl.glUniformBlockBinding(p, g_loc, CueGLUniformBindings.GLOBAL)
@@ -193,6 +652,17 @@ class ShaderPipeline:
         if c_loc != gl.GL_INVALID_INDEX:
             gl.glUniformBlockBinding(p, c_loc, CueGLUniformBindings.CAMERA)
 
+    def _uniform_locations(self) -> dict[str, int]:
+        locs = {}
+
+        for i in range(gl.glGetProgramiv(self.shader_program, gl.GL_ACTIVE_UNIFORMS)):
+            name = gl.glGetActiveUniform(self.shader_program, i)[0]
+            name = name.decode() if isinstance(name, bytes) else str(name)
+
+            locs[name] = gl.glGetUniformLocation(self.shader_program, name)
+
+        return locs
+
     def bind(self) -> None:
         gl.glUseProgram(self.shader_program)
 
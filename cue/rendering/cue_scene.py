@@ -2,17 +2,20 @@ from dataclasses import dataclass
 import OpenGL.GL as gl
 import numpy as np
 
-from .cue_resources import GPUTexture, ShaderPipeline
+from .cue_resources import ShaderPipeline
 from .cue_batch import DrawBatch, DrawInstance, DrawState
+from .cue_cull import SphereBVH, BVH_MIN_INSTANCES, frustum_planes, cull_spheres
+from . import cue_batch
 
 # note: non-cycle-causing import only for type hints
-from . import cue_target as tar
+from . import cue_target as tar, cue_pvs as pvs
 
 # an ordered collection of rendering batches, usually represents a "scene"
 
 @dataclass(init=False, slots=True)
 class RenderScene:
     def __init__(self):
+        self.frustum_culling = True
         self.reset()
 
     def reset(self) -> None:
@@ -22,6 +25,12 @@ class RenderScene:
 
         self.attached_render_targets = {}
 
+        self.pvs = None
+        self.pvs_state_masks = {}
+
+        self.changed_opaque_states = set()
+        self.opaque_bounds_dirty = True
+
     # == batch api ==
 
     def append(self, ins: DrawInstance) -> None:
@@ -32,13 +41,18 @@ class RenderScene:
             if scene_batch_buf == None:
                 scene_batch_buf = (DrawBatch(ins.draw_state), set())
                 scene_batch_buf[1].add(ins)
+                scene_batch_buf[0].change_set = self.changed_opaque_states
 
                 scene_batches[ins.draw_state] = scene_batch_buf
-                return
+                self.opaque_bounds_dirty = True
+            else:
+                # note: no KeyError raised / no check when instance already present
+                #       if two instances are hash equivalent, the override should also be equivalent
+                scene_batch_buf[1].add(ins)
+                scene_batch_buf[0].mark_dirty()
 
-            # note: no KeyError raised / no check when instance already present
-            #       if two instances are hash equivalent, the override should also be equivalent
-            scene_batch_buf[1].add(ins)
+            if ins.pvs_mask is not None:
+                self.pvs_state_masks[ins.draw_state] = self.pvs_state_masks.get(ins.draw_state, 0) | ins.pvs_mask
         else:
             scene_batches = self.non_opaque_batch_buf
             scene_batch = scene_batches.get(ins.draw_state, None)
@@ -55,9 +69,12 @@ class RenderScene:
 
             scene_batch_buf = scene_batches[ins.draw_state]
             scene_batch_buf[1].remove(ins)
+            scene_batch_buf[0].mark_dirty()
 
             if not scene_batch_buf[1]:
                 scene_batches.pop(ins.draw_state)
+                self.pvs_state_masks.pop(ins.draw_state, None)
+                self.opaque_bounds_dirty = True
         else:
             self.attached_non_opaque_instances.remove(ins)
 
@@ -74,19 +91,33 @@ class RenderScene:
         for target in self.attached_render_targets:
             target.try_view_frame()
 
-    def frame(self, cam_mat: np.ndarray) -> None:
+    # [view_pos] is only required for pvs culling
+    def frame(self, cam_mat: np.ndarray, view_pos = None) -> None:
         pipe_bind = ShaderPipeline.bind
-        bind_tex = GPUTexture.bind_to
 
         draw_instance = DrawBatch.draw_instance
         draw_batch = DrawBatch.draw_batch
         draw_append = DrawBatch.append_instance
+        draw_retained = DrawBatch.draw_retained
 
-        def process_batch(state, batch, ins_buf):
+        def bind_state(state):
             pipe_bind(state.draw_pipeline)
 
             for i, tex in enumerate(state.draw_texture_binds):
-                bind_tex(tex, i)
+                tex.bind_to(i) # a GPUTexture or a GPUTextureArray
+
+        # opaque batches keep their instance data between frames, it's only rebuilt when an instance is added, removed or moved
+        # batches outside of the view frustum are culled as a whole first (see _cull_opaque_batches), the instances of the
+        # remaining ones are culled by the batches (before any instance data is uploaded)
+        planes = frustum_planes(cam_mat) if self.frustum_culling else None
+        opaque_batches = self._cull_opaque_batches(planes) if planes is not None else self.attached_opaque_batches.items()
+
+        def process_opaque_batch(state, batch, ins_buf):
+            bind_state(state)
+            draw_retained(batch, ins_buf, planes)
+
+        def process_batch(state, batch, ins_buf):
+            bind_state(state)
 
             if len(ins_buf) == 1:
                 draw_instance(batch, *ins_buf) # only a single instance, do a normal draw call
@@ -99,13 +130,19 @@ class RenderScene:
 
         # opaque pass
 
-        # PERF TODO: not rebind pipeline / vao for multiple different texture binds
-        #            not sure how much it would improve perf / how common different skins are
-
         gl.glDisable(gl.GL_BLEND)
 
-        for state, instances in self.attached_opaque_batches.items():
-            process_batch(state, *instances)
+        if self.pvs is not None and view_pos is not None:
+            # skip batches in cells not visible from the camera's cell
+            pvs_vis = self.pvs.visible_mask(view_pos)
+            pvs_masks = self.pvs_state_masks
+
+            for state, instances in opaque_batches:
+                if pvs_masks.get(state, -1) & pvs_vis:
+                    process_opaque_batch(state, *instances)
+        else:
+            for state, instances in opaque_batches:
+                process_opaque_batch(state, *instances)
 
         # non-opaque pass
 
@@ -141,6 +178,83 @@ class RenderScene:
         if batch_state is not None:
             process_batch(batch_state, non_opaque_batches[batch_state], batched_ins)
 
+    # == batch culling ==
+
+    # returns the opaque batches (as (state, (batch, instances)) pairs) with bounds intersecting the frustum [planes]
+    #
+    # the bounding spheres of all batches (see DrawBatch.batch_sphere) are kept in a single array, with a bvh over them in
+    # scenes with many batches, so culling a batch costs nothing on the python side. only the changed batches (the ones in
+    # changed_opaque_states) are updated and refit each frame, adding or removing a batch rebuilds the arrays
+    def _cull_opaque_batches(self, planes: np.ndarray) -> list[tuple[DrawState, tuple[DrawBatch, set[DrawInstance]]]]:
+        scene_batches = self.attached_opaque_batches
+        changed = self.changed_opaque_states
+
+        if not self.opaque_bounds_dirty and changed:
+            index = self.opaque_bounds_index
+            rows = []
+
+            for state in changed:
+                batch, instances = scene_batches[state]
+                batch.update_retained(instances)
+
+                i = index.get(state, None)
+                if i is None or batch.batch_sphere is None:
+                    self.opaque_bounds_dirty = True # the batch gained or lost it's bounds
+                    break
+
+                self.opaque_bounds_spheres[i] = batch.batch_sphere
+                self.opaque_bounds_counts[i] = batch.retained_count
+                rows.append(i)
+            else:
+                changed.clear()
+
+                if self.opaque_bounds_bvh is not None:
+                    self.opaque_bounds_bvh.update(self.opaque_bounds_spheres, np.array(rows, dtype=np.intp))
+
+        if self.opaque_bounds_dirty:
+            self._rebuild_opaque_bounds()
+
+        # cull the bounded batches, batches without bounds are always drawn
+
+        states = self.opaque_bounds_states
+        counts = self.opaque_bounds_counts
+
+        if self.opaque_bounds_bvh is not None:
+            visible = self.opaque_bounds_bvh.cull(self.opaque_bounds_spheres, planes)
+        else:
+            visible = cull_spheres(self.opaque_bounds_spheres, planes)
+            visible = np.flatnonzero(visible) if not visible.all() else None
+
+        if visible is None:
+            visible_states = list(states)
+        else:
+            visible_states = [states[i] for i in visible]
+            cue_batch.perfc_culled_count += int(counts.sum() - counts[visible].sum())
+
+        return [(state, scene_batches[state]) for state in visible_states + self.opaque_unbounded_states]
+
+    def _rebuild_opaque_bounds(self) -> None:
+        scene_batches = self.attached_opaque_batches
+
+        for batch, instances in scene_batches.values():
+            batch.update_retained(instances)
+
+        self.changed_opaque_states.clear()
+
+        batches = [(state, batch) for state, (batch, _) in scene_batches.items()]
+
+        self.opaque_bounds_states = [state for state, batch in batches if batch.batch_sphere is not None]
+        self.opaque_unbounded_states = [state for state, batch in batches if batch.batch_sphere is None]
+        self.opaque_bounds_index = {state: i for i, state in enumerate(self.opaque_bounds_states)}
+
+        bounded = [scene_batches[state][0] for state in self.opaque_bounds_states]
+
+        self.opaque_bounds_spheres = np.array([b.batch_sphere for b in bounded], dtype=np.float32).reshape((-1, 4))
+        self.opaque_bounds_counts = np.array([b.retained_count for b in bounded], dtype=np.intp)
+        self.opaque_bounds_bvh = SphereBVH(self.opaque_bounds_spheres) if len(bounded) >= BVH_MIN_INSTANCES else None
+
+        self.opaque_bounds_dirty = False
+
     # note on perf: raw dicts with raw .items() access consistently performed
     #               the best (other than list iteration, which can't be used
     #               because .index() would vastly outweigh any perf benefits)
@@ -156,4 +270,23 @@ class RenderScene:
     non_opaque_batch_buf: dict[DrawState, DrawBatch]
 
     attached_render_targets: dict['tar.RenderTarget', int] # key: render target, value: ref count
+
+    # the potentially visible set of the current map, only present if the map was baked with a pvs
+    pvs: 'pvs.PVSData | None'
+    pvs_state_masks: dict[DrawState, int] # OR-ed pvs masks of all instances with the same DrawState
+
+    # cpu frustum culling of opaque instances (see cue_cull.py)
+    frustum_culling: bool
+
+    # the bounds of the opaque batches for culling them as a whole (see _cull_opaque_batches)
+    changed_opaque_states: set[DrawState] # batches changed since their bounds were last read, shared with the batches
+    opaque_bounds_dirty: bool # if the set of batches changed since the bounds were built
+
+    opaque_bounds_states: list[DrawState]
+    opaque_bounds_index: dict[DrawState, int]
+    opaque_bounds_spheres: np.ndarray # [batches, 4] the batch spheres, in the order of opaque_bounds_states
+    opaque_bounds_counts: np.ndarray # the instance count of each batch
+    opaque_bounds_bvh: SphereBVH | None # only with at least BVH_MIN_INSTANCES batches
+
+    opaque_unbounded_states: list[DrawState] # batches of meshes without bounds
     